@@ -9,6 +9,7 @@ from account_service.app.schemas import (
     LoginResponse,
     AccountResponse,
     DeductionRequest,
+    TopUpRequest,
     BalanceOperationResponse,
 )
 from account_service.app.security import verify_password_hash
@@ -30,7 +31,8 @@ def login(req: LoginRequest, db: Session = Depends(get_db)) -> LoginResponse:
     )
     row = db.execute(sql, {"username": req.username}).mappings().first()
     if not row:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+        # 404 (not 401) lets authentication_service negative-cache unknown usernames
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     if not verify_password_hash(row["password_hash"], req.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
@@ -101,4 +103,46 @@ def deduct_balance(req: DeductionRequest, db: Session = Depends(get_db)):
         "ok": True, 
         "new_balance": float(result["balance"]), 
         "message": "Transaction successful"
-    }
\ No newline at end of file
+    }
+
+#refunds (e.g. fare capping in journey_service)
+@router.post("/internal/post/account/credit", response_model=BalanceOperationResponse)
+def credit_balance(req: TopUpRequest, db: Session = Depends(get_db)):
+    """
+    credits are recorded in balance_credits; a repeated `reference` is applied only once
+    """
+    sql = text(
+        """
+        WITH credit AS (
+            INSERT INTO balance_credits (reference, user_id, amount, description)
+            SELECT :reference, user_id, :amount, :description FROM accounts WHERE user_id = :user_id
+            ON CONFLICT (reference) DO NOTHING
+            RETURNING user_id
+        )
+        UPDATE accounts
+        SET balance = balance + :amount
+        WHERE user_id = (SELECT user_id FROM credit)
+        RETURNING balance
+        """
+    )
+    params = {"amount": req.amount, "user_id": req.user_id,
+              "reference": req.reference, "description": req.description}
+    result = db.execute(sql, params).mappings().first()
+    db.commit()
+
+    if not result:
+        #if any failure for result = 1: user not exists, 2: reference already credited
+        row = db.execute(text("SELECT balance FROM accounts WHERE user_id = :uid"), {"uid": req.user_id}).mappings().first()
+        if not row:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        return {
+            "ok": True,
+            "new_balance": float(row["balance"]),
+            "message": "Already credited"
+        }
+
+    return {
+        "ok": True,
+        "new_balance": float(result["balance"]),
+        "message": "Transaction successful"
+    }
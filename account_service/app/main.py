@@ -1,6 +1,7 @@
 import logging
 from fastapi import FastAPI
 
+from libs.metrics import instrument_app
 from account_service.app.api import router as api_router
 
 logging.basicConfig(level=logging.INFO)
@@ -9,6 +10,7 @@ logging.basicConfig(level=logging.INFO)
 def create_app() -> FastAPI:
     app = FastAPI(title="account_service")
     app.include_router(api_router)
+    instrument_app(app)
 
     return app
 
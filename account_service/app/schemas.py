@@ -30,6 +30,8 @@ class DeductionRequest(BaseModel):
 class TopUpRequest(BaseModel):
     user_id: str
     amount: float = Field(..., gt=0, description="Số tiền nạp")
+    description: str | None = "Hoàn tiền"
+    reference: str | None = Field(None, max_length=100, description="Idempotency key: credited once per reference")
 
 class BalanceOperationResponse(BaseModel):
     ok: bool
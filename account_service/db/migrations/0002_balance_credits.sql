@@ -0,0 +1,10 @@
+-- Wallet credits (refunds). `reference` is the caller's idempotency key:
+-- a retried credit with the same reference is applied once.
+CREATE TABLE IF NOT EXISTS balance_credits (
+    credit_id      bigserial     PRIMARY KEY,
+    reference      varchar(100)  UNIQUE,
+    user_id        uuid          NOT NULL REFERENCES accounts(user_id),
+    amount         numeric(12,2) NOT NULL,
+    description    text,
+    created_at     timestamptz   DEFAULT NOW()
+);
@@ -1,34 +1,108 @@
-from fastapi import APIRouter, HTTPException, status
+import time
 
-from authentication_service.app.schemas import LoginRequest, LoginResponse
+import httpx
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from authentication_service.app import cache, sessions
+from authentication_service.app.schemas import LoginRequest, LoginResponse, RefreshRequest
 from authentication_service.app.security.jwt import create_access_token, hash_password
 from authentication_service.app.settings import settings
-from authentication_service.app.clients.account_client import AccountClient
+from authentication_service.app.clients.account_client import get_async_account_client
 
 
 router = APIRouter()
 
 
+def _client_ip(request: Request) -> str | None:
+    # The gateway sets X-Forwarded-For to the peer it accepted the connection from.
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip() or None
+    return request.client.host if request.client else None
+
+
+def _invalid_credentials() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+
 @router.post("/post/authentication/login", response_model=LoginResponse)
-def login(body: LoginRequest) -> LoginResponse:
+async def login(body: LoginRequest, request: Request) -> LoginResponse:
+    if await cache.is_rate_limited(body.username, _client_ip(request)):
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts")
+
+    # Known-unknown usernames never reach account_service.
+    if await cache.is_unknown_username(body.username):
+        await cache.record_failure(body.username)
+        raise _invalid_credentials()
+
     # hash password
     pwd_hash = hash_password(body.password, settings.PASSWORD_SALT)
 
-    try:
-        client = AccountClient()
-        user_data = client.verify_credentials(body.username, pwd_hash)
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    user_data = await cache.get_credentials(body.username, pwd_hash)
+    if user_data is None:
+        try:
+            user_data = await get_async_account_client().verify_credentials(body.username, pwd_hash)
+        except httpx.HTTPStatusError as ex:
+            if ex.response.status_code == status.HTTP_404_NOT_FOUND:
+                await cache.mark_unknown_username(body.username)
+            await cache.record_failure(body.username)
+            raise _invalid_credentials()
+        except Exception:
+            raise _invalid_credentials()
+        await cache.set_credentials(body.username, pwd_hash, user_data)
+
+    await cache.reset_failures(body.username)
 
     user_id = user_data.get("userId")
     claims = user_data.get("claims", {})
-    token = create_access_token(subject=str(user_id or body.username), extra_claims=claims)
-    
-    import time
+    subject = str(user_id or body.username)
+
+    session = await sessions.create_session(subject, claims)
+    refresh_token = refresh_expire_time = None
+    if session is not None:
+        sid, refresh_token, refresh_expire_time = session
+        claims = {**claims, "sid": sid}
+
+    token = create_access_token(subject=subject, extra_claims=claims)
+
     expire_time = int(time.time()) + settings.JWT_EXPIRES_MIN * 60
 
     return LoginResponse(
         user_id=str(user_id),
         access_token=token,
-        expire_time=expire_time
+        expire_time=expire_time,
+        refresh_token=refresh_token,
+        refresh_expire_time=refresh_expire_time,
     )
+
+
+@router.post("/post/authentication/refresh", response_model=LoginResponse)
+async def refresh(body: RefreshRequest) -> LoginResponse:
+    """Rotate a refresh token into a new access/refresh pair (one Redis round trip)."""
+    try:
+        rotated = await sessions.rotate(body.refresh_token)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Session store unavailable")
+    if rotated is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+
+    record, refresh_token, refresh_expire_time = rotated
+    claims = {**record.get("c", {}), "sid": record["s"]}
+    token = create_access_token(subject=record["u"], extra_claims=claims)
+
+    return LoginResponse(
+        user_id=record["u"],
+        access_token=token,
+        expire_time=int(time.time()) + settings.JWT_EXPIRES_MIN * 60,
+        refresh_token=refresh_token,
+        refresh_expire_time=refresh_expire_time,
+    )
+
+
+@router.post("/post/authentication/logout", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
+async def logout(body: RefreshRequest) -> Response:
+    try:
+        await sessions.revoke(body.refresh_token)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Session store unavailable")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
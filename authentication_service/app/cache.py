@@ -0,0 +1,147 @@
+"""Redis helpers for the login fast path.
+
+Holds three kinds of short-lived keys:
+- negative cache of usernames account_service reported as unknown,
+- verified-credential cache so repeated logins skip account_service,
+- fixed-window counters used for brute-force rate limiting.
+
+Redis is an optimisation here, never a dependency: every helper degrades to
+"no cache / not limited" when Redis is unreachable.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import redis.asyncio as redis
+
+from libs.metrics import cache_lookup
+from authentication_service.app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache()
+def _redis() -> redis.Redis:
+    return redis.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        max_connections=settings.REDIS_POOL_SIZE,
+        socket_connect_timeout=1,
+        socket_timeout=1,
+    )
+
+
+def _unknown_key(username: str) -> str:
+    return f"auth:unknown:{username}"
+
+
+def _cred_key(username: str) -> str:
+    return f"auth:cred:{username}"
+
+
+def _fail_user_key(username: str) -> str:
+    return f"auth:fail:user:{username}"
+
+
+def _attempt_ip_key(ip: str) -> str:
+    return f"auth:attempt:ip:{ip}"
+
+
+def _hash_fingerprint(password_hash: str) -> str:
+    # Never store the password hash itself; keep a keyed digest of it instead.
+    return hmac.new(settings.JWT_SECRET.encode("utf-8"), password_hash.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+async def is_rate_limited(username: str, ip: Optional[str]) -> bool:
+    """Count this attempt against the IP and report whether either limit is exceeded."""
+    window = settings.LOGIN_RATE_WINDOW_SEC
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.get(_fail_user_key(username))
+        if ip:
+            pipe.incr(_attempt_ip_key(ip))
+            pipe.expire(_attempt_ip_key(ip), window, nx=True)
+        res = await pipe.execute()
+    except Exception as ex:
+        logger.warning("login rate limiter unavailable: %s", ex)
+        return False
+
+    user_failures = int(res[0] or 0)
+    if user_failures >= settings.LOGIN_MAX_FAILURES_PER_USER:
+        return True
+    if ip and int(res[1]) > settings.LOGIN_MAX_ATTEMPTS_PER_IP:
+        return True
+    return False
+
+
+async def record_failure(username: str) -> None:
+    key = _fail_user_key(username)
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, settings.LOGIN_RATE_WINDOW_SEC, nx=True)
+        await pipe.execute()
+    except Exception as ex:
+        logger.warning("failed to record login failure: %s", ex)
+
+
+async def reset_failures(username: str) -> None:
+    try:
+        await _redis().delete(_fail_user_key(username))
+    except Exception as ex:
+        logger.warning("failed to reset login failures: %s", ex)
+
+
+async def is_unknown_username(username: str) -> bool:
+    try:
+        return bool(await _redis().exists(_unknown_key(username)))
+    except Exception:
+        return False
+
+
+async def mark_unknown_username(username: str) -> None:
+    try:
+        await _redis().setex(_unknown_key(username), settings.LOGIN_NEGATIVE_CACHE_TTL_SEC, "1")
+    except Exception as ex:
+        logger.warning("failed to cache unknown username: %s", ex)
+
+
+async def get_credentials(username: str, password_hash: str) -> Optional[Dict[str, Any]]:
+    """Return cached account_service login data if `password_hash` matches the verified one."""
+    if settings.LOGIN_CREDENTIAL_CACHE_TTL_SEC <= 0:
+        return None
+    try:
+        raw = await _redis().get(_cred_key(username))
+    except Exception:
+        return None
+    cache_lookup("login_credentials", raw is not None)
+    if raw is None:
+        return None
+    try:
+        record = json.loads(raw)
+    except Exception:
+        return None
+    if not hmac.compare_digest(record.get("fp", ""), _hash_fingerprint(password_hash)):
+        return None
+    return record.get("data")
+
+
+async def set_credentials(username: str, password_hash: str, data: Dict[str, Any]) -> None:
+    if settings.LOGIN_CREDENTIAL_CACHE_TTL_SEC <= 0:
+        return
+    record = {"fp": _hash_fingerprint(password_hash), "data": data}
+    try:
+        await _redis().setex(
+            _cred_key(username),
+            settings.LOGIN_CREDENTIAL_CACHE_TTL_SEC,
+            json.dumps(record, separators=(",", ":")),
+        )
+    except Exception as ex:
+        logger.warning("failed to cache credentials: %s", ex)
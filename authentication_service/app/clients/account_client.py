@@ -1,6 +1,6 @@
 from typing import Optional, Dict, Any
 
-from libs.http import HttpClient
+from libs.http import HttpClient, AsyncHttpClient
 from authentication_service.app.settings import settings
 
 
@@ -26,3 +26,45 @@ class AccountClient:
             headers = {"Authorization": f"Bearer {token}"}
         resp = self._client.get("/internal/get/account/me", headers=headers)
         return resp.json()
+
+
+class AsyncAccountClient:
+    """Pooled async client for the login hot path; one instance is shared per process."""
+
+    def __init__(self, base_url: Optional[str] = None) -> None:
+        self._client = AsyncHttpClient(
+            base_url or settings.ACCOUNT_SERVICE_URL,
+            timeout=settings.ACCOUNT_HTTP_TIMEOUT,
+        )
+
+    async def verify_credentials(self, username: str, password_hash: str) -> Dict[str, Any]:
+        """
+        Calls account service to verify credentials.
+        Raises httpx.HTTPStatusError: 404 for unknown username, 401 for a wrong password.
+        """
+        payload = {"username": username, "password_hash": password_hash}
+        # 4xx answers are final; do not retry them.
+        resp = await self._client.post("/internal/post/account/login", json=payload, retries=1)
+        return resp.json()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_async_client: Optional[AsyncAccountClient] = None
+
+
+def get_async_account_client() -> AsyncAccountClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncAccountClient()
+    return _async_client
+
+
+async def close_async_account_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        try:
+            await _async_client.aclose()
+        finally:
+            _async_client = None
@@ -1,10 +1,22 @@
+import logging
 from fastapi import FastAPI
+from libs.metrics import instrument_app
 from authentication_service.app.api import router as api_router
+from authentication_service.app.clients.account_client import close_async_account_client
+
+
+logging.basicConfig(level=logging.INFO)
 
 
 def create_app() -> FastAPI:
     app = FastAPI(title="authentication_service")
     app.include_router(api_router)
+    instrument_app(app)
+
+    @app.on_event("shutdown")
+    async def _shutdown() -> None:
+        await close_async_account_client()
+
     return app
 
 
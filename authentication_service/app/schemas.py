@@ -11,3 +11,9 @@ class LoginResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
     expire_time: int
+    refresh_token: str | None = None
+    refresh_expire_time: int | None = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
@@ -0,0 +1,118 @@
+"""Refresh-token session store backed by Redis.
+
+Each refresh token maps to a compact record
+``{"s": session_id, "u": subject, "c": claims, "a": absolute_expiry}``
+stored under ``auth:rt:<sha256(token)>``. Tokens are single use: refreshing
+rotates the token inside one Lua script, so renewal is a single Redis round
+trip and never touches account_service. Presenting an already-rotated token
+revokes the whole session (reuse detection).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import secrets
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from authentication_service.app.cache import _redis
+from authentication_service.app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# KEYS[1] = current token key, KEYS[2] = "used" marker for it, KEYS[3] = new token key
+# ARGV[1] = now (epoch s), ARGV[2] = sliding refresh TTL (s)
+_ROTATE_LUA = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then
+    local sid = redis.call('GET', KEYS[2])
+    if sid then
+        redis.call('SET', 'auth:revoked:' .. sid, '1', 'EX', ARGV[2])
+    end
+    return false
+end
+local data = cjson.decode(raw)
+redis.call('DEL', KEYS[1])
+if redis.call('EXISTS', 'auth:revoked:' .. data.s) == 1 then
+    return false
+end
+local ttl = math.min(tonumber(ARGV[2]), tonumber(data.a) - tonumber(ARGV[1]))
+if ttl <= 0 then
+    return false
+end
+redis.call('SET', KEYS[2], data.s, 'EX', ttl)
+redis.call('SET', KEYS[3], raw, 'EX', ttl)
+return raw
+"""
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _token_key(token: str) -> str:
+    return f"auth:rt:{_digest(token)}"
+
+
+def _used_key(token: str) -> str:
+    return f"auth:rt:used:{_digest(token)}"
+
+
+def _revoked_key(sid: str) -> str:
+    return f"auth:revoked:{sid}"
+
+
+def _refresh_ttl() -> int:
+    return settings.REFRESH_TOKEN_EXPIRES_DAYS * 86400
+
+
+async def create_session(subject: str, claims: Dict[str, Any]) -> Optional[Tuple[str, str, int]]:
+    """Start a session; returns (session_id, refresh_token, refresh_expire_time) or None if Redis is down."""
+    now = int(time.time())
+    sid = secrets.token_urlsafe(12)
+    token = secrets.token_urlsafe(32)
+    record = {"s": sid, "u": subject, "c": claims, "a": now + settings.SESSION_MAX_DAYS * 86400}
+    ttl = min(_refresh_ttl(), record["a"] - now)
+    try:
+        await _redis().setex(_token_key(token), ttl, json.dumps(record, separators=(",", ":")))
+    except Exception as ex:
+        logger.warning("failed to create refresh session: %s", ex)
+        return None
+    return sid, token, now + ttl
+
+
+async def rotate(token: str) -> Optional[Tuple[Dict[str, Any], str, int]]:
+    """Consume `token` and issue its successor; returns (record, new_token, refresh_expire_time)."""
+    now = int(time.time())
+    new_token = secrets.token_urlsafe(32)
+    raw = await _redis().eval(
+        _ROTATE_LUA,
+        3,
+        _token_key(token),
+        _used_key(token),
+        _token_key(new_token),
+        now,
+        _refresh_ttl(),
+    )
+    if not raw:
+        return None
+    record = json.loads(raw)
+    return record, new_token, min(now + _refresh_ttl(), int(record["a"]))
+
+
+async def revoke(token: str) -> None:
+    """Revoke the session that `token` belongs to."""
+    r = _redis()
+    raw = await r.get(_token_key(token))
+    if raw is None:
+        return
+    record = json.loads(raw)
+    ttl = max(1, int(record["a"]) - int(time.time()))
+    pipe = r.pipeline(transaction=True)
+    pipe.setex(_revoked_key(record["s"]), ttl, "1")
+    pipe.delete(_token_key(token))
+    await pipe.execute()
@@ -12,8 +12,22 @@ class Settings(BaseSettings):
     JWT_SECRET: str = Field(..., description="JWT HMAC secret (read from ENV)")
     JWT_ALG: str = Field(default="HS256", description="JWT algorithm")
     JWT_EXPIRES_MIN: int = Field(default=60, description="Access token expiry in minutes")
+    REFRESH_TOKEN_EXPIRES_DAYS: int = Field(default=7, description="Sliding refresh-token lifetime in days")
+    SESSION_MAX_DAYS: int = Field(default=30, description="Absolute session lifetime in days")
     PASSWORD_SALT: str = Field(default="dev-salt", description="Salt for password hashing")
 
+    # Redis (login caches and rate limiting)
+    REDIS_URL: str = Field(default="redis://redis:6379/0")
+    REDIS_POOL_SIZE: int = Field(default=20)
+
+    # Login fast path
+    LOGIN_NEGATIVE_CACHE_TTL_SEC: int = Field(default=60, description="How long an unknown username is remembered")
+    LOGIN_CREDENTIAL_CACHE_TTL_SEC: int = Field(default=300, description="How long a verified login is reused; 0 disables")
+    LOGIN_RATE_WINDOW_SEC: int = Field(default=300, description="Rate-limit window in seconds")
+    LOGIN_MAX_FAILURES_PER_USER: int = Field(default=5, description="Failed logins per username per window")
+    LOGIN_MAX_ATTEMPTS_PER_IP: int = Field(default=100, description="Login attempts per client IP per window")
+    ACCOUNT_HTTP_TIMEOUT: float = Field(default=3.0, description="Timeout for account_service calls")
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,4 +1,4 @@
-import { api } from "./client";
+import { api, setSessionRefresher } from "./client";
 
 function setCookie(name: string, value: string, days = 7, sameSite: "Lax" | "Strict" | "None" = "Lax") {
   if (typeof document === "undefined") return;
@@ -19,6 +19,26 @@ export interface LoginRequest {
 
 export interface LoginResponse {
   access_token: string;
+  refresh_token?: string | null;
+  refresh_expire_time?: number | null;
+}
+
+function storeSession(data: LoginResponse) {
+  if (data.access_token) {
+    setCookie("access_token", data.access_token, 7, "Lax");
+  }
+  if (data.refresh_token) {
+    const days = data.refresh_expire_time
+      ? Math.max(1, Math.ceil((data.refresh_expire_time * 1000 - Date.now()) / 864e5))
+      : 7;
+    setCookie("refresh_token", data.refresh_token, days, "Strict");
+  }
+}
+
+function getCookieValue(name: string): string | null {
+  if (typeof document === "undefined") return null;
+  const match = document.cookie.match(new RegExp("(?:^|; )" + name + "=([^;]*)"));
+  return match ? decodeURIComponent(match[1]) : null;
 }
 
 export async function login(req: LoginRequest): Promise<LoginResponse> {
@@ -28,20 +48,42 @@ export async function login(req: LoginRequest): Promise<LoginResponse> {
     requireAuth: false,
   });
 
-  if (data.access_token) {
-    setCookie("access_token", data.access_token, 7, "Lax");
-  }
+  storeSession(data);
   return data;
 }
 
+// Renew the access token with the stored refresh token (does not hit the account service).
+export async function refreshSession(): Promise<LoginResponse | null> {
+  const refresh_token = getCookieValue("refresh_token");
+  if (!refresh_token) return null;
+  try {
+    const data = await api<LoginResponse>("/auth/refresh", {
+      method: "POST",
+      body: { refresh_token },
+      requireAuth: false,
+    });
+    storeSession(data);
+    return data;
+  } catch (e) {
+    deleteCookie("refresh_token");
+    return null;
+  }
+}
+
+// the shared api() wrapper refreshes and retries once on 401
+setSessionRefresher(async () => (await refreshSession()) !== null);
+
 export function logout(): void {
+  const refresh_token = getCookieValue("refresh_token");
+  if (refresh_token) {
+    api("/auth/logout", { method: "POST", body: { refresh_token }, requireAuth: false }).catch(() => { });
+  }
   deleteCookie("access_token");
+  deleteCookie("refresh_token");
 }
 
 export function getToken(): string | null {
-  if (typeof document === "undefined") return null;
-  const match = document.cookie.match(/(?:^|; )access_token=([^;]*)/);
-  return match ? decodeURIComponent(match[1]) : null;
+  return getCookieValue("access_token");
 }
 
 export async function getMe(): Promise<any> {
@@ -48,12 +48,30 @@ export class ApiError extends Error {
   }
 }
 
-export async function api<T = any>(path: string, opts: RequestOptions = {}): Promise<T> {
+// Renews the access token; registered by auth.ts (which imports this module).
+let sessionRefresher: (() => Promise<boolean>) | null = null;
+let refreshing: Promise<boolean> | null = null;
+
+export function setSessionRefresher(fn: () => Promise<boolean>) {
+  sessionRefresher = fn;
+}
+
+// Concurrent 401s share one refresh: refresh tokens are single use.
+function refreshOnce(): Promise<boolean> {
+  if (!sessionRefresher) return Promise.resolve(false);
+  if (!refreshing) {
+    refreshing = sessionRefresher().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+}
+
+async function request(path: string, opts: RequestOptions): Promise<Response> {
   const { method = "GET", headers, query, body, requireAuth = true } = opts;
   const url = buildUrl(path, query);
   const h: Record<string, string> = {
     "Content-Type": "application/json",
-    ...authHeader(requireAuth),
     ...(headers || {}),
   };
 
@@ -61,11 +79,18 @@ export async function api<T = any>(path: string, opts: RequestOptions = {}): Pro
     h["Idempotency-Key"] = crypto.randomUUID();
   }
 
-  const resp = await fetch(url, {
-    method,
-    headers: h,
-    body: body !== undefined ? JSON.stringify(body) : undefined,
-  });
+  const send = () =>
+    fetch(url, {
+      method,
+      headers: { ...authHeader(requireAuth), ...h },
+      body: body !== undefined ? JSON.stringify(body) : undefined,
+    });
+
+  let resp = await send();
+  // expired access token: renew it once and replay (same Idempotency-Key)
+  if (resp.status === 401 && requireAuth && (await refreshOnce())) {
+    resp = await send();
+  }
 
   if (!resp.ok) {
     let detail: any = undefined;
@@ -79,9 +104,25 @@ export async function api<T = any>(path: string, opts: RequestOptions = {}): Pro
     } catch (e) { }
     throw new ApiError(resp.status, resp.statusText, detail);
   }
+  return resp;
+}
+
+export async function api<T = any>(path: string, opts: RequestOptions = {}): Promise<T> {
+  const resp = await request(path, opts);
   const ct = resp.headers.get("content-type") || "";
   if (ct.includes("application/json")) return (await resp.json()) as T;
   return (await resp.text()) as unknown as T;
 }
 
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null; // pass back as `cursor` for the next page; null on the last one
+}
+
+// Keyset-paginated list endpoints return the next page's cursor in X-Next-Cursor.
+export async function apiPage<T = any>(path: string, cursor?: string | null, opts: RequestOptions = {}): Promise<Page<T>> {
+  const resp = await request(path, { ...opts, query: { ...(opts.query || {}), cursor: cursor || undefined } });
+  return { items: (await resp.json()) as T[], nextCursor: resp.headers.get("X-Next-Cursor") };
+}
+
 export const apiBase = API_BASE;
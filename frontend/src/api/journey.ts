@@ -1,4 +1,4 @@
-import { api } from "./client";
+import { api, apiPage, Page } from "./client";
 
 export interface Station {
     station_id: string;
@@ -36,12 +36,13 @@ export async function purchaseTicket(fromStation: string, toStation: string, tic
     });
 }
 
-export async function getJourneyHistory(): Promise<any[]> {
-    return api<any[]>('/booking/history');
+// Both lists are paginated (newest first); pass the previous page's nextCursor to continue.
+export async function getJourneyHistory(cursor?: string | null): Promise<Page<any>> {
+    return apiPage<any>('/booking/history', cursor);
 }
 
-export async function getMyTickets(): Promise<any[]> {
-    return api<any[]>('/booking/tickets');
+export async function getMyTickets(cursor?: string | null): Promise<Page<any>> {
+    return apiPage<any>('/booking/tickets', cursor);
 }
 
 export async function gateCheckIn(journeyCode: string, stationId: string): Promise<any> {
@@ -6,18 +6,23 @@ export default function TicketHistory({ onClose }) {
     const [activeTab, setActiveTab] = useState("wallet"); // wallet | history
     const [history, setHistory] = useState([]);
     const [tickets, setTickets] = useState([]);
+    const [historyCursor, setHistoryCursor] = useState(null);
+    const [ticketsCursor, setTicketsCursor] = useState(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     useEffect(() => {
         async function load() {
             setLoading(true);
             try {
-                const [hData, tData] = await Promise.all([
+                const [hPage, tPage] = await Promise.all([
                     getJourneyHistory(),
                     getMyTickets()
                 ]);
-                setHistory(hData || []);
-                setTickets(tData || []);
+                setHistory(hPage.items || []);
+                setHistoryCursor(hPage.nextCursor);
+                setTickets(tPage.items || []);
+                setTicketsCursor(tPage.nextCursor);
             } catch (e) {
                 console.error(e);
             } finally {
@@ -27,6 +32,27 @@ export default function TicketHistory({ onClose }) {
         load();
     }, []);
 
+    async function loadMore() {
+        setLoadingMore(true);
+        try {
+            if (activeTab === 'wallet') {
+                const page = await getMyTickets(ticketsCursor);
+                setTickets((prev) => [...prev, ...page.items]);
+                setTicketsCursor(page.nextCursor);
+            } else {
+                const page = await getJourneyHistory(historyCursor);
+                setHistory((prev) => [...prev, ...page.items]);
+                setHistoryCursor(page.nextCursor);
+            }
+        } catch (e) {
+            console.error(e);
+        } finally {
+            setLoadingMore(false);
+        }
+    }
+
+    const hasMore = activeTab === 'wallet' ? ticketsCursor : historyCursor;
+
     return (
         <div className={styles.overlay}>
             <div className={styles.modal}>
@@ -59,6 +85,13 @@ export default function TicketHistory({ onClose }) {
                             {activeTab === 'history' && (
                                 <HistoryView history={history} />
                             )}
+                            {hasMore && (
+                                <div className={styles.more}>
+                                    <button onClick={loadMore} className={styles.backBtn} disabled={loadingMore}>
+                                        {loadingMore ? "Loading..." : "Load more"}
+                                    </button>
+                                </div>
+                            )}
                         </>
                     )}
                 </div>
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import time
 import uuid
 from typing import Dict, Iterable, Optional
 
 import httpx
+import redis.asyncio as redis
 from fastapi import FastAPI, Request, Response, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 
+from libs.metrics import instrument_app, observe_upstream
 from libs.security.jwt import verify_and_decode
 from gateway.app.settings import settings
 
@@ -42,19 +45,26 @@ app.add_middleware(
     allow_origins=origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 from gateway.app.middleware import IdempotencyMiddleware
 app.add_middleware(IdempotencyMiddleware, redis_url=settings.REDIS_URL)
 
+# latency per route + /metrics (outermost, so idempotent replays are timed too)
+instrument_app(app)
+
 
 _client: httpx.AsyncClient | None = None
+# session revocation list, written by authentication_service on logout / token reuse
+_sessions: redis.Redis | None = None
 
 
 @app.on_event("startup")
 async def _startup() -> None:
-    global _client
+    global _client, _sessions
     _client = httpx.AsyncClient(timeout=httpx.Timeout(settings.HTTP_TIMEOUT))
+    _sessions = redis.from_url(settings.REDIS_URL, decode_responses=True)
 
 
 @app.on_event("shutdown")
@@ -89,9 +99,21 @@ async def _require_user(request: Request) -> str:
     user_id = str(claims.get("sub") or "").strip()
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token subject")
+    if await _session_revoked(claims.get("sid")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session revoked")
     return user_id
 
 
+async def _session_revoked(sid: Optional[str]) -> bool:
+    # access tokens outlive logout otherwise; fail open when Redis is down (the token is still signed)
+    if not sid or _sessions is None:
+        return False
+    try:
+        return bool(await _sessions.exists(f"auth:revoked:{sid}"))
+    except Exception:
+        return False
+
+
 async def _proxy(request: Request, base_url: str, tail: str, *, require_auth: bool = True, method: Optional[str] = None) -> Response:
     global _client
     assert _client is not None
@@ -126,11 +148,18 @@ async def _proxy(request: Request, base_url: str, tail: str, *, require_auth: bo
     upstream_url = f"{base_url}/{normalized_tail}"
     headers = _filtered_headers(request.headers.items()) 
     headers["correlation-id"] = cid
+    # the gateway is the edge: a client-supplied X-Forwarded-For is never passed on
+    for k in [k for k in headers if k.lower() == "x-forwarded-for"]:
+        del headers[k]
+    if request.client:
+        headers["X-Forwarded-For"] = request.client.host
     if x_user_id:
         headers["X-User-Id"] = x_user_id
     if x_user_email:
         headers["X-User-Email"] = x_user_email
 
+    upstream = httpx.URL(base_url).netloc.decode()
+    started = time.perf_counter()
     try:
         body_bytes = await request.body()
         resp = await _client.request(
@@ -141,8 +170,10 @@ async def _proxy(request: Request, base_url: str, tail: str, *, require_auth: bo
             content=body_bytes,
             timeout=None,
         )
-    except httpx.RequestError:
+    except httpx.RequestError as ex:
+        observe_upstream(upstream, request.method, type(ex).__name__, time.perf_counter() - started)
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Upstream unavailable")
+    observe_upstream(upstream, request.method, str(resp.status_code), time.perf_counter() - started)
 
     resp_headers = {k: v for k, v in resp.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
     return Response(content=resp.content, status_code=resp.status_code, headers=resp_headers, media_type=resp.headers.get("content-type"))
@@ -162,6 +193,14 @@ async def health() -> Dict[str, str]:
 async def get_stations(request: Request) -> Response:
     return await _proxy(request, SCHEDULER_URL, "stations", require_auth=False)
 
+@app.get("/scheduler/stations/nearby")
+async def nearby_stations(request: Request) -> Response:
+    return await _proxy(request, SCHEDULER_URL, "stations/nearby", require_auth=False)
+
+@app.get("/scheduler/stations/search")
+async def search_stations(request: Request) -> Response:
+    return await _proxy(request, SCHEDULER_URL, "stations/search", require_auth=False)
+
 @app.get("/scheduler/lines")
 async def get_lines(request: Request) -> Response:
     return await _proxy(request, SCHEDULER_URL, "lines", require_auth=False)
@@ -174,11 +213,19 @@ async def search_route(request: Request) -> Response:
 async def next_trains(station_id: str, request: Request) -> Response:
     return await _proxy(request, SCHEDULER_URL, f"stations/{station_id}/next-trains", require_auth=True)
 
+@app.get("/scheduler/stations/{station_id}/departures")
+async def station_departures(station_id: str, request: Request) -> Response:
+    return await _proxy(request, SCHEDULER_URL, f"stations/{station_id}/departures", require_auth=False)
+
 # 2. Journey & Ticket (Thay thế Booking cũ)
 @app.post("/booking/ticket/purchase")
 async def purchase_ticket(request: Request) -> Response:
     return await _proxy(request, JOURNEY_URL, "ticket/purchase", require_auth=True)
 
+@app.post("/booking/ticket/purchase/batch")
+async def purchase_tickets_batch(request: Request) -> Response:
+    return await _proxy(request, JOURNEY_URL, "ticket/purchase/batch", require_auth=True)
+
 @app.get("/booking/history")
 async def journey_history(request: Request) -> Response:
     return await _proxy(request, JOURNEY_URL, "history", require_auth=True)
@@ -200,6 +247,14 @@ async def gate_check_out(request: Request) -> Response:
 async def pay_penalty(request: Request) -> Response:
     return await _proxy(request, JOURNEY_URL, "gate/pay-penalty", require_auth=False)
 
+@app.post("/booking/gate/events/batch")
+async def gate_events_batch(request: Request) -> Response:
+    return await _proxy(request, JOURNEY_URL, "gate/events/batch", require_auth=False)
+
+@app.post("/booking/gate/offline/reconcile")
+async def reconcile_offline(request: Request) -> Response:
+    return await _proxy(request, JOURNEY_URL, "gate/offline/reconcile", require_auth=False)
+
 # 4. Payment & Account
 @app.get("/payment/transactions")
 async def get_transactions(request: Request) -> Response:
@@ -211,4 +266,12 @@ async def account_me(request: Request) -> Response:
 
 @app.post("/auth/login")
 async def auth_login(request: Request) -> Response:
-    return await _proxy(request, AUTH_URL, "post/authentication/login", require_auth=False)
\ No newline at end of file
+    return await _proxy(request, AUTH_URL, "post/authentication/login", require_auth=False)
+
+@app.post("/auth/refresh")
+async def auth_refresh(request: Request) -> Response:
+    return await _proxy(request, AUTH_URL, "post/authentication/refresh", require_auth=False)
+
+@app.post("/auth/logout")
+async def auth_logout(request: Request) -> Response:
+    return await _proxy(request, AUTH_URL, "post/authentication/logout", require_auth=False)
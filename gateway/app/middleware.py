@@ -5,6 +5,8 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 import redis.asyncio as redis
 
+from libs.metrics import cache_lookup
+
 class IdempotencyMiddleware(BaseHTTPMiddleware):
     def __init__(self, app, redis_url: str):
         super().__init__(app)
@@ -21,6 +23,7 @@ class IdempotencyMiddleware(BaseHTTPMiddleware):
         # Check cache
         cache_key = f"idempotency:{key}"
         cached_data = await self.redis.get(cache_key)
+        cache_lookup("idempotency", bool(cached_data))
         
         if cached_data:
             data = json.loads(cached_data)
@@ -0,0 +1,258 @@
+"""
+Ridership analytics over a columnar snapshot of journeys.
+
+A day of journeys (hot table + archive) is exported once into flat NumPy arrays
+(`JourneyFrame`, saved as .npz); every aggregation afterwards is a
+handful of vectorized passes (bincount / histogram) over those arrays, with no
+per-row Python and no load on the production tables.
+
+Stations are dictionary-encoded: `frame.stations[i]` is the station id behind
+code i in the *_station arrays. Timestamps are epoch seconds; -1 marks a missing
+check-out. Hours are reported in local time (ANALYTICS_UTC_OFFSET_HOURS).
+
+Benchmark:
+    python -m journey_service.app.analytics --count 10000000
+"""
+import os
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from journey_service.app.settings import settings
+
+
+STATUS_CODES = ("IN_PROGRESS", "COMPLETED", "PENALTY_DUE", "CANCELLED", "CLOSED")
+_STATUS_INDEX = {s: i for i, s in enumerate(STATUS_CODES)}
+TICKET_TYPES = ("SINGLE", "RETURN", "DAY", "MONTH")
+_TICKET_TYPE_INDEX = {t: i for i, t in enumerate(TICKET_TYPES)}
+
+_FETCH_SIZE = 100_000
+
+_EXPORT_SQL = text("""
+    SELECT j.check_in_station_id, j.check_out_station_id,
+           CAST(EXTRACT(EPOCH FROM j.check_in_time) AS bigint),
+           CAST(EXTRACT(EPOCH FROM j.check_out_time) AS bigint),
+           j.status, t.ticket_type
+    FROM journeys j
+    LEFT JOIN tickets t ON t.ticket_id = j.ticket_id
+    WHERE j.created_at >= :start AND j.created_at < :end
+    UNION ALL
+    SELECT j.check_in_station_id, j.check_out_station_id,
+           CAST(EXTRACT(EPOCH FROM j.check_in_time) AS bigint),
+           CAST(EXTRACT(EPOCH FROM j.check_out_time) AS bigint),
+           j.status, t.ticket_type
+    FROM journeys_archive j
+    LEFT JOIN tickets t ON t.ticket_id = j.ticket_id
+    WHERE j.created_at >= :start AND j.created_at < :end
+""")
+
+
+@dataclass
+class JourneyFrame:
+    stations: np.ndarray            # station ids (unicode), indexed by station code
+    check_in_station: np.ndarray    # int16 station code
+    check_out_station: np.ndarray   # int16 station code, -1 = no check-out
+    check_in: np.ndarray            # int64 epoch seconds
+    check_out: np.ndarray           # int64 epoch seconds, -1 = no check-out
+    status: np.ndarray              # int8 index into STATUS_CODES
+    ticket_type: np.ndarray = None  # int8 index into TICKET_TYPES, -1 = unknown (exports before it existed)
+
+    def __len__(self) -> int:
+        return len(self.check_in)
+
+
+# --- export -----------------------------------------------------------------
+
+def _day_bounds(day: date):
+    offset = timedelta(hours=settings.ANALYTICS_UTC_OFFSET_HOURS)
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc) - offset
+    return start, start + timedelta(days=1)
+
+
+def build_frame(db: Session, start: datetime, end: datetime) -> JourneyFrame:
+    """Stream journeys created in [start, end) into a JourneyFrame."""
+    station_codes: Dict[str, int] = {}
+
+    def code(station: Optional[str]) -> int:
+        if station is None:
+            return -1
+        if station not in station_codes:
+            station_codes[station] = len(station_codes)
+        return station_codes[station]
+
+    chunks = []
+    result = db.execute(_EXPORT_SQL, {"start": start, "end": end},
+                        execution_options={"stream_results": True, "yield_per": _FETCH_SIZE})
+    for rows in result.partitions():
+        ins, outs, t_in, t_out, status, ticket_type = zip(*rows)
+        chunks.append((
+            np.fromiter((code(s) for s in ins), dtype=np.int16, count=len(rows)),
+            np.fromiter((code(s) for s in outs), dtype=np.int16, count=len(rows)),
+            np.fromiter((-1 if t is None else t for t in t_in), dtype=np.int64, count=len(rows)),
+            np.fromiter((-1 if t is None else t for t in t_out), dtype=np.int64, count=len(rows)),
+            np.fromiter((_STATUS_INDEX.get(s, 0) for s in status), dtype=np.int8, count=len(rows)),
+            np.fromiter((_TICKET_TYPE_INDEX.get(t, -1) for t in ticket_type), dtype=np.int8, count=len(rows)),
+        ))
+
+    stations = np.array(sorted(station_codes, key=station_codes.get), dtype=np.str_)
+    if not chunks:
+        empty = np.empty(0, dtype=np.int16)
+        return JourneyFrame(stations, empty, empty, np.empty(0, np.int64), np.empty(0, np.int64),
+                            np.empty(0, np.int8), np.empty(0, np.int8))
+    cols = [np.concatenate(parts) for parts in zip(*chunks)]
+    return JourneyFrame(stations, *cols)
+
+
+def export_path(day: date) -> str:
+    return os.path.join(settings.ANALYTICS_EXPORT_DIR, f"journeys_{day.isoformat()}.npz")
+
+
+def save_frame(frame: JourneyFrame, path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(path, **asdict(frame))
+
+
+def load_frame(path: str) -> JourneyFrame:
+    with np.load(path, allow_pickle=False) as data:
+        frame = JourneyFrame(**{name: data[name] for name in data.files})
+    if frame.ticket_type is None:
+        frame.ticket_type = np.full(len(frame), -1, dtype=np.int8)
+    return frame
+
+
+def export_day(db: Session, day: date) -> Dict[str, Any]:
+    frame = build_frame(db, *_day_bounds(day))
+    path = export_path(day)
+    save_frame(frame, path)
+    return {"day": day.isoformat(), "path": path, "journeys": len(frame), "stations": len(frame.stations)}
+
+
+def frame_for_day(db: Session, day: date) -> JourneyFrame:
+    """The exported snapshot of `day` if there is one, otherwise a fresh read."""
+    path = export_path(day)
+    if os.path.exists(path):
+        return load_frame(path)
+    return build_frame(db, *_day_bounds(day))
+
+
+# --- aggregations -----------------------------------------------------------
+
+def od_matrix(frame: JourneyFrame) -> np.ndarray:
+    """counts[i, j] = journeys that entered at station i and left at station j."""
+    n = len(frame.stations)
+    done = frame.check_out_station >= 0
+    flat = frame.check_in_station[done].astype(np.int64) * n + frame.check_out_station[done]
+    return np.bincount(flat, minlength=n * n).reshape(n, n)
+
+
+def _per_station_hour(station: np.ndarray, ts: np.ndarray, n: int, utc_offset_hours: int) -> np.ndarray:
+    valid = (station >= 0) & (ts >= 0)
+    hours = ((ts[valid] + utc_offset_hours * 3600) // 3600) % 24
+    flat = station[valid].astype(np.int64) * 24 + hours
+    return np.bincount(flat, minlength=n * 24).reshape(n, 24)
+
+
+def hourly_counts(frame: JourneyFrame, utc_offset_hours: int = None):
+    """(entries, exits), each [station, local hour]."""
+    if utc_offset_hours is None:
+        utc_offset_hours = settings.ANALYTICS_UTC_OFFSET_HOURS
+    n = len(frame.stations)
+    entries = _per_station_hour(frame.check_in_station, frame.check_in, n, utc_offset_hours)
+    exits = _per_station_hour(frame.check_out_station, frame.check_out, n, utc_offset_hours)
+    return entries, exits
+
+
+def dwell_distribution(frame: JourneyFrame, bin_minutes: int = 5, max_minutes: int = 240) -> Dict[str, Any]:
+    """Histogram of check-in -> check-out minutes; the last bin collects everything longer."""
+    done = (frame.check_out >= 0) & (frame.check_in >= 0)
+    minutes = (frame.check_out[done] - frame.check_in[done]) / 60.0
+    edges = np.arange(0, max_minutes + bin_minutes, bin_minutes)
+    counts, _ = np.histogram(np.clip(minutes, 0, max_minutes), bins=edges)
+    if len(minutes):
+        p50, p90, p99 = np.percentile(minutes, [50, 90, 99])
+        mean = float(minutes.mean())
+    else:
+        p50 = p90 = p99 = mean = None
+    return {
+        "journeys": int(len(minutes)),
+        "bin_minutes": bin_minutes,
+        "bins": edges[:-1].tolist(),
+        "counts": counts.tolist(),
+        "mean": mean,
+        "p50": None if p50 is None else float(p50),
+        "p90": None if p90 is None else float(p90),
+        "p99": None if p99 is None else float(p99),
+    }
+
+
+def station_index(frame: JourneyFrame, station_id: str) -> Optional[int]:
+    hits = np.flatnonzero(frame.stations == station_id)
+    return int(hits[0]) if len(hits) else None
+
+
+# --- benchmark ---------------------------------------------------------------
+
+def _synthetic_frame(count: int, stations: int = 14, seed: int = 0) -> JourneyFrame:
+    rng = np.random.default_rng(seed)
+    day_start = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+    check_in = day_start + rng.integers(0, 86400, count, dtype=np.int64)
+    ride = rng.gamma(4.0, 6.0, count).astype(np.int64) * 60
+    finished = rng.random(count) < 0.98
+    return JourneyFrame(
+        stations=np.array([f"S{i + 1:02d}" for i in range(stations)], dtype=np.str_),
+        check_in_station=rng.integers(0, stations, count, dtype=np.int16),
+        check_out_station=np.where(finished, rng.integers(0, stations, count), -1).astype(np.int16),
+        check_in=check_in,
+        check_out=np.where(finished, check_in + ride, -1),
+        status=np.where(finished, _STATUS_INDEX["COMPLETED"], _STATUS_INDEX["IN_PROGRESS"]).astype(np.int8),
+        ticket_type=rng.choice(len(TICKET_TYPES), count, p=[0.6, 0.2, 0.1, 0.1]).astype(np.int8),
+    )
+
+
+def _benchmark(count: int) -> None:
+    import tempfile
+    import time as _time
+
+    frame = _synthetic_frame(count)
+    timings = {}
+
+    started = _time.perf_counter()
+    od = od_matrix(frame)
+    timings["od_matrix"] = _time.perf_counter() - started
+
+    started = _time.perf_counter()
+    entries, exits = hourly_counts(frame, 7)
+    timings["hourly_counts"] = _time.perf_counter() - started
+
+    started = _time.perf_counter()
+    dwell = dwell_distribution(frame)
+    timings["dwell_distribution"] = _time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "frame.npz")
+        started = _time.perf_counter()
+        save_frame(frame, path)
+        timings["save_npz"] = _time.perf_counter() - started
+        started = _time.perf_counter()
+        loaded = load_frame(path)
+        timings["load_npz"] = _time.perf_counter() - started
+        assert len(loaded) == len(frame)
+
+    assert od.sum() == int((frame.check_out_station >= 0).sum())
+    assert entries.sum() == count
+    print(f"{count:,} journeys ({exits.sum():,} with check-out), median dwell {dwell['p50']:.1f} min")
+    for name, seconds in timings.items():
+        print(f"  {name:<20} {seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the ridership aggregations on synthetic data")
+    parser.add_argument("--count", type=int, default=10_000_000)
+    args = parser.parse_args()
+    _benchmark(args.count)
@@ -1,29 +1,59 @@
-from string import ascii_uppercase
+import logging
 import uuid
-import random
-import string
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Query, Response, status
 from fastapi.responses import JSONResponse
 from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from libs.security import sign_ticket_token
+from journey_service.app import ticket_cache
 from journey_service.app.db import get_db 
+from journey_service.app import analytics, fare_caps, station_load
+from journey_service.app.archiver import archive_journeys
+from journey_service.app.expiry import sweep_expired, sweep_stats
+from journey_service.app.fares import RealFareResolver, apply_discount, fare_rules, price_ticket
+from journey_service.app.gate_batch import process_batch, reconcile_events, tap_time
+from journey_service.app.gate_rules import GateDenied, check_in_rules, check_out_decision
+from journey_service.app.pagination import decode_cursor, encode_cursor
+from journey_service.app.settings import settings
+from journey_service.app.ticket_codes import get_allocator
 from journey_service.app.schemas import (
     GateRequest, GateResponse, PenaltyPaymentRequest,
     JourneyHistoryItem, TicketItem,
-    PurchaseRequest, PurchaseResponse
+    PurchaseRequest, PurchaseResponse,
+    BatchPurchaseRequest, BatchPurchaseResponse,
+    GateReconcileRequest, GateReconcileResponse, GateEventResult,
+    GateBatchRequest, GateBatchResponse
 )
-from journey_service.app.clients.scheduler_client import SchedulerClient
 from journey_service.app.clients.account_client import AccountClient
 from journey_service.app.clients.payment_client import PaymentClient
 from journey_service.app.clients.notification_client import NotificationClient
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-def _generate_code():
-    return ''.join(random.choices(ascii_uppercase + string.digits, k = 6))
+def _generate_code(db: Session) -> str:
+    return get_allocator().allocate(db)
+
+def _ticket_token(ticket) -> str:
+    """Signed compact payload a gate can validate without calling us."""
+    def _epoch(dt):
+        return int(dt.timestamp()) if dt else None
+
+    return sign_ticket_token({
+        "c": ticket["ticket_code"],
+        "t": ticket["ticket_type"],
+        "o": ticket["origin_station_id"],
+        "d": ticket["destination_station_id"],
+        "vf": _epoch(ticket["valid_from"]),
+        "vu": _epoch(ticket["valid_until"]),
+        "n": ticket["max_trips"],
+    }, key=settings.TICKET_SIGNING_KEY)
 
 @router.post("/ticket/purchase", response_model = PurchaseResponse)
 def purchase_ticket(
@@ -34,25 +64,8 @@ def purchase_ticket(
     if not x_user_id:
         raise HTTPException(401, "Unauthorized")
 
-    sch_client= SchedulerClient()
-
     try:
-        if req.ticket_type == "DAY":
-            base_amount = 40000.0
-            usage_limit = 100 #limit base for a Day
-        elif req.ticket_type == "MONTH":
-            base_amount = 200000.0
-            usage_limit = 1000 #limit base for a Month
-        else:
-            # SINGLE / RETURN
-            fare_data = sch_client.calculate_fare(req.from_station, req.to_station)
-            base_amount = float(fare_data["total_amount"])
-            if req.ticket_type == "RETURN":
-                base_amount *= 2
-                usage_limit = 2
-            else:
-                usage_limit = 1
-                
+        base_amount, usage_limit = price_ticket(req.ticket_type, req.from_station, req.to_station, RealFareResolver().base_fare)
     except Exception as e:
         raise HTTPException(400, f"Calculate fare failed: {e}")
 
@@ -61,11 +74,7 @@ def purchase_ticket(
         user_info = acc_client.get_me(x_user_id)
         p_type = user_info.get("passenger_type", "STANDARD")
         
-        final_amount = base_amount
-        if p_type == "STUDENT":
-            final_amount = base_amount * 0.5
-        elif p_type == "ELDERLY":
-            final_amount = 0
+        final_amount = apply_discount(base_amount, p_type)
 
         if final_amount >  0:
             acc_client.deduct_balance(x_user_id, final_amount, f"Buy ticket {req.from_station} -> {req.to_station}")
@@ -74,28 +83,37 @@ def purchase_ticket(
         # check if balance not enough, send message to user, force them to contact supervisor to topup balance
         raise HTTPException(402, detail="Insufficient balance. Please contact supervisor to top up.")
 
-    code = _generate_code()
-    
     #create a ticket, insert the ticket into "tickets" table
     try:
         sql = text("""
             INSERT INTO tickets (ticket_id, user_id, ticket_code, ticket_type, fare_amount, origin_station_id, destination_station_id, status, remaining_trips, max_trips, valid_until)
             VALUES (:tid, :uid, :code, :type, :fare, :origin, :dest, 'ACTIVE', :rem, :max, NOW() + INTERVAL '1 day')
+            ON CONFLICT (ticket_code) DO NOTHING
+            RETURNING ticket_code, ticket_type, origin_station_id, destination_station_id, max_trips, valid_from, valid_until
         """)
         
         ticket_id = str(uuid.uuid4())
         
-        db.execute(sql, {
-            "tid": ticket_id, 
-            "uid": x_user_id,
-            "code": code, 
-            "type": req.ticket_type,
-            "fare": final_amount,
-            "origin": req.from_station if req.ticket_type in ["SINGLE", "RETURN"] else None,
-            "dest": req.to_station if req.ticket_type in ["SINGLE", "RETURN"] else None,
-            "rem": usage_limit,
-            "max": usage_limit
-        })
+        # allocated codes never collide with each other; the retry only skips
+        # codes already taken by the legacy random generator
+        inserted = None
+        for _ in range(5):
+            code = _generate_code(db)
+            inserted = db.execute(sql, {
+                "tid": ticket_id, 
+                "uid": x_user_id,
+                "code": code, 
+                "type": req.ticket_type,
+                "fare": final_amount,
+                "origin": req.from_station if req.ticket_type in ["SINGLE", "RETURN"] else None,
+                "dest": req.to_station if req.ticket_type in ["SINGLE", "RETURN"] else None,
+                "rem": usage_limit,
+                "max": usage_limit
+            }).mappings().first()
+            if inserted:
+                break
+        if not inserted:
+            raise RuntimeError("could not allocate a free ticket code")
         db.commit()
 
         # Log transaction to Payment Service (History)
@@ -107,224 +125,300 @@ def purchase_ticket(
                 ticket_id=ticket_id
             )
         except Exception as e:
-            print(f"Failed to log purchase transaction: {e}")
+            logger.warning("Failed to log purchase transaction: %s", e)
 
     except Exception as e:
         raise HTTPException(500, f"Database error: {e}")
 
     #return ticket code and final fare amount indicate successfully purchased
-    return PurchaseResponse(journey_code = code, fare_amount = final_amount, message="SUCCESS")
+    return PurchaseResponse(journey_code = code, fare_amount = final_amount, message="SUCCESS", ticket_token = _ticket_token(inserted))
+
+
+@router.post("/ticket/purchase/batch", response_model = BatchPurchaseResponse)
+def purchase_tickets_batch(
+    req: BatchPurchaseRequest,
+    x_user_id: str = Header(None, alias= "X-User-Id"),
+    db: Session = Depends(get_db)
+):
+    """
+    Buy many tickets at once (family/group or corporate bulk).
+    Fares are looked up once per distinct station pair, the account is debited
+    once for the total, tickets go in with one multi-row insert and a single
+    aggregated transaction is logged.
+    """
+    if not x_user_id:
+        raise HTTPException(401, "Unauthorized")
+
+    count = sum(item.quantity for item in req.items)
+    if count == 0:
+        raise HTTPException(400, "No tickets requested")
+    if count > settings.PURCHASE_BATCH_MAX_TICKETS:
+        raise HTTPException(413, f"Too many tickets (max {settings.PURCHASE_BATCH_MAX_TICKETS})")
+
+    resolver = RealFareResolver()
+    try:
+        priced = [
+            (item, *price_ticket(item.ticket_type, item.from_station, item.to_station, resolver.base_fare))
+            for item in req.items
+        ]
+    except Exception as e:
+        raise HTTPException(400, f"Calculate fare failed: {e}")
 
+    try:
+        p_type = resolver.passenger_type(x_user_id)
+    except Exception as e:
+        raise HTTPException(402, detail="Insufficient balance. Please contact supervisor to top up.")
+    priced = [(item, apply_discount(base_amount, p_type), usage_limit) for item, base_amount, usage_limit in priced]
+    total_amount = sum(amount * item.quantity for item, amount, _ in priced)
+
+    rows = []
+    for item, amount, usage_limit in priced:
+        is_pair = item.ticket_type in ["SINGLE", "RETURN"]
+        for _ in range(item.quantity):
+            rows.append({
+                "tid": str(uuid.uuid4()),
+                "type": item.ticket_type,
+                "fare": amount,
+                "origin": item.from_station if is_pair else None,
+                "dest": item.to_station if is_pair else None,
+                "lim": usage_limit,
+            })
+
+    sql = text("""
+        INSERT INTO tickets (ticket_id, user_id, ticket_code, ticket_type, fare_amount, origin_station_id, destination_station_id, status, remaining_trips, max_trips, valid_until)
+        SELECT v.tid, :uid, v.code, v.type, v.fare, v.origin, v.dest, 'ACTIVE', v.lim, v.lim, NOW() + INTERVAL '1 day'
+        FROM UNNEST(CAST(:tids AS uuid[]), CAST(:codes AS varchar[]), CAST(:types AS varchar[]), CAST(:fares AS numeric[]),
+                    CAST(:origins AS varchar[]), CAST(:dests AS varchar[]), CAST(:lims AS int[]))
+             AS v(tid, code, type, fare, origin, dest, lim)
+        ON CONFLICT (ticket_code) DO NOTHING
+        RETURNING ticket_id, ticket_code, ticket_type, fare_amount, origin_station_id, destination_station_id, max_trips, valid_from, valid_until
+    """)
+    # tickets go in first (uncommitted), so a failed insert never leaves the rider debited
+    try:
+        inserted = []
+        pending = rows
+        # one statement for the whole batch; reruns only for codes the legacy
+        # random generator already used
+        for _ in range(5):
+            for row in pending:
+                row["code"] = _generate_code(db)
+            result = db.execute(sql, {
+                "uid": x_user_id,
+                "tids": [r["tid"] for r in pending],
+                "codes": [r["code"] for r in pending],
+                "types": [r["type"] for r in pending],
+                "fares": [r["fare"] for r in pending],
+                "origins": [r["origin"] for r in pending],
+                "dests": [r["dest"] for r in pending],
+                "lims": [r["lim"] for r in pending],
+            }).mappings().all()
+            inserted.extend(result)
+            done = {str(r["ticket_id"]) for r in result}
+            pending = [r for r in pending if r["tid"] not in done]
+            if not pending:
+                break
+        if pending:
+            raise RuntimeError("could not allocate free ticket codes")
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(500, f"Database error: {e}")
+
+    acc_client = AccountClient()
+    if total_amount > 0:
+        try:
+            acc_client.deduct_balance(x_user_id, total_amount, f"Buy {count} tickets")
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(402, detail="Insufficient balance. Please contact supervisor to top up.")
+
+    ticket_ids = [str(t["ticket_id"]) for t in inserted]
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        if total_amount > 0:
+            try:
+                acc_client.credit_balance(x_user_id, total_amount, f"Refund failed purchase of {count} tickets",
+                                          reference=f"purchase:{ticket_ids[0]}")
+            except Exception as ex:
+                logger.error("Refund of failed batch purchase failed for %s (%.0f): %s", x_user_id, total_amount, ex)
+        raise HTTPException(500, f"Database error: {e}")
+
+    try:
+        PaymentClient().log_transaction(
+            user_id=x_user_id,
+            amount=total_amount,
+            description=f"Purchase {count} Tickets (batch)",
+            ticket_ids=ticket_ids,
+        )
+    except Exception as e:
+        logger.warning("Failed to log batch purchase transaction: %s", e)
+
+    return BatchPurchaseResponse(
+        tickets=[
+            PurchaseResponse(
+                journey_code=t["ticket_code"],
+                fare_amount=float(t["fare_amount"]),
+                message="SUCCESS",
+                ticket_token=_ticket_token(t),
+            )
+            for t in inserted
+        ],
+        total_amount=total_amount,
+        message="SUCCESS",
+    )
 
 
 @router.post("/gate/check-in", response_model=GateResponse)
 def gate_check_in(req: GateRequest, db: Session = Depends(get_db)):
-    #check if code exists
-    sql_ticket = text("SELECT * FROM tickets WHERE ticket_code = :c")
-    ticket = db.execute(sql_ticket, {"c": req.journey_code}).mappings().first()
+    #check if code exists (hot path served from the ticket cache)
+    ticket = ticket_cache.get_gate_state(db, req.journey_code)
 
     if not ticket: raise HTTPException(404,"Ticket not found")
 
-    #check if code valid?
-    if ticket["status"] != 'ACTIVE':
-         raise HTTPException(400, f"Ticket is {ticket['status']}")
-
-    if ticket["valid_until"] and ticket["valid_until"] < datetime.now(ticket["valid_until"].tzinfo):
-         db.execute(text("UPDATE tickets SET status='EXPIRED' WHERE ticket_id=:id"), {"id": ticket["ticket_id"]})
-         db.commit()
-         raise HTTPException(400, "Ticket EXPIRED")
-    
-    if ticket["remaining_trips"] is not None and ticket["remaining_trips"] <= 0:
-         raise HTTPException(400, "Ticket has no trips left")
-
-    #validate station
-    # SINGLE: Must check-in at Origin
-    # RETURN: Must check-in at Origin or Destination 
-    ticket_type = ticket["ticket_type"]
-    origin = ticket["origin_station_id"]
-    dest = ticket["destination_station_id"]
-
-    if ticket_type == "SINGLE":
-        if origin and req.station_id != origin:
-             raise HTTPException(400, f"Wrong Station! Ticket valid from {origin} only.")
-    
-    elif ticket_type == "RETURN":
-        #bind max_tríp = remaining trips at the first place then minus remaining_trips, 
-        # if the 2 attribute or not the same any more thats means passenger arrived and comeback using the destination 
-        if ticket["max_trips"] == ticket["remaining_trips"]:
-             if origin and req.station_id != origin:
-                 raise HTTPException(400, f"First leg must start at {origin}")
-        else:
-             if dest and req.station_id != dest:
-                 raise HTTPException(400, f"Return leg must start at {dest}")
-
-    #check if code is being used?
-    sql_active = text("SELECT * FROM journeys WHERE ticket_id = :tid AND status = 'IN_PROGRESS'")
-    active_journey = db.execute(sql_active, {"tid": ticket["ticket_id"]}).mappings().first()
-    if active_journey:
-         #deny
-         raise HTTPException(400, "Ticket already used for entry. Please check out first.")
-
-    #create journey now after validation
+    #validate ticket state, station and that the code is not being used
+    try:
+        check_in_rules(ticket, req.station_id, datetime.now(timezone.utc), has_active_journey=ticket["active"] is not None)
+    except GateDenied as denied:
+        if denied.expire_ticket:
+            db.execute(text("UPDATE tickets SET status='EXPIRED' WHERE ticket_id=:id"), {"id": ticket["ticket_id"]})
+            db.commit()
+            ticket_cache.invalidate([req.journey_code])
+        raise HTTPException(denied.status_code, denied.message)
+
+    #create journey now after validation; the conditional UPDATE and the unique
+    #IN_PROGRESS index reject anything a stale cache entry let through
+    journey_id = str(uuid.uuid4())
     try:
         # Decrement usage
         if ticket["remaining_trips"] is not None:
-             db.execute(text("UPDATE tickets SET remaining_trips = remaining_trips - 1 WHERE ticket_id=:id"), {"id": ticket["ticket_id"]})
+            remaining = db.execute(text("""
+                UPDATE tickets SET remaining_trips = remaining_trips - 1
+                WHERE ticket_id = :id AND status = 'ACTIVE' AND remaining_trips > 0
+                RETURNING remaining_trips
+            """), {"id": ticket["ticket_id"]}).scalar()
+            if remaining is None:
+                raise GateDenied(400, "Ticket has no trips left")
+            ticket["remaining_trips"] = remaining
         
         # Insert Journey
-        db.execute(text("""
-            INSERT INTO journeys (journey_id, ticket_id, check_in_station_id, check_in_time, status)
-            VALUES (:jid, :tid, :sid, NOW(), 'IN_PROGRESS')
+        check_in_time = db.execute(text("""
+            INSERT INTO journeys (journey_id, ticket_id, user_id, check_in_station_id, check_in_time, status)
+            VALUES (:jid, :tid, :uid, :sid, NOW(), 'IN_PROGRESS')
+            RETURNING check_in_time
         """), {
-            "jid": str(uuid.uuid4()),
+            "jid": journey_id,
             "tid": ticket["ticket_id"],
+            "uid": ticket["user_id"],
             "sid": req.station_id
-        })
+        }).scalar()
         db.commit()
 
+    except GateDenied as denied:
+        db.rollback()
+        ticket_cache.invalidate([req.journey_code])
+        raise HTTPException(denied.status_code, denied.message)
+    except IntegrityError:
+        db.rollback()
+        ticket_cache.invalidate([req.journey_code])
+        raise HTTPException(400, "Ticket already used for entry. Please check out first.")
     except Exception as e:
-         db.rollback()
-         raise HTTPException(500, f"Check-in failed: {e}")
+        db.rollback()
+        ticket_cache.invalidate([req.journey_code])
+        raise HTTPException(500, f"Check-in failed: {e}")
+
+    ticket["active"] = {"journey_id": journey_id, "check_in_station_id": req.station_id, "check_in_time": check_in_time}
+    ticket["last_status"] = "IN_PROGRESS"
+    ticket_cache.put_gate_state(ticket)
+    station_load.record([("IN", req.station_id, None, None)])
 
     return GateResponse(ok = True, message = f"Welcome at {req.station_id}")
 
 @router.post("/gate/check-out")
 def gate_check_out(req: GateRequest, db: Session = Depends(get_db)):
     
-    # check for ticket
-    sql_ticket = text("SELECT * FROM tickets WHERE ticket_code = :c")
-    ticket = db.execute(sql_ticket, {"c": req.journey_code}).mappings().first()
+    # check for ticket and its active journey (hot path served from the ticket cache)
+    ticket = ticket_cache.get_gate_state(db, req.journey_code)
     if not ticket: raise HTTPException(404, "Ticket not found")
 
-    # check for active journey that has the same ticket id
-    sql_journey = text("SELECT * FROM journeys WHERE ticket_id = :tid AND status = 'IN_PROGRESS'")
-    journey = db.execute(sql_journey, {"tid": ticket["ticket_id"]}).mappings().first()
+    # never deny on a cached "not checked in": confirm against the database first
+    if not ticket["active"]:
+        ticket = ticket_cache.get_gate_state(db, req.journey_code, fresh=True)
+
+    journey = ticket["active"]
 
     # Case: No Active Journey found
     if not journey:
         # check if the journey has just finished
-        sql_last = text("SELECT * FROM journeys WHERE ticket_id = :tid ORDER BY created_at DESC LIMIT 1")
-        last = db.execute(sql_last, {"tid": ticket["ticket_id"]}).mappings().first()
-        if last and last["status"] in ["COMPLETED", "CLOSED"]:
+        if ticket["last_status"] in ["COMPLETED", "CLOSED"]:
              raise HTTPException(400, "Journey already closed (Double Check-out?)")
         
         # Check-out without Check-in? (Penalty)
         raise HTTPException(400, "No ACTIVE journey found. Did you check in?")
 
-    # 3. Existing Logic for Penalty/Fare calculation 
-    #check same station exit (<15m)
-    if journey["check_in_station_id"] == req.station_id:
-        check_in_time = journey["check_in_time"]
-        now = datetime.now(check_in_time.tzinfo) if check_in_time.tzinfo else datetime.now()
-        duration_minutes = (now - check_in_time).total_seconds() / 60
+    now = datetime.now(timezone.utc)
+    rules = fare_rules.current()
+    resolver = RealFareResolver()
+    decision = check_out_decision(
+        ticket, journey, req.station_id, now,
+        resolver.for_user(ticket["user_id"]),
+        rules,
+    )
 
-        # Common Logic: Revert Usage (Give back 1 trip) if it's a countable ticket
-        if ticket["remaining_trips"] is not None:
-             db.execute(text("UPDATE tickets SET remaining_trips = remaining_trips + 1 WHERE ticket_id = :tid"), 
-                {"tid": ticket["ticket_id"]})
-
-        if duration_minutes <= 15:
-             # Case 1: Early Exit (<15m) -> Free Cancellation
-             db.execute(text("UPDATE journeys SET status ='CANCELLED', check_out_time= NOW(), check_out_station_id= :s WHERE journey_id = :id"),
-                {"s": req.station_id, "id": journey["journey_id"]})
-             db.commit()
-             return GateResponse( ok = True, message= f"Trip Cancelled (Same station exit). Usage reverted.")
-        else:
-             # Case 2: Overstay (>15m) -> Penalty 5k, but Usage Reverted
-             penalty_amount = 5000.0
-             penalty_reason = f"Same Station Overstay > 15m ({int(duration_minutes)}m)"
-             
-             db.execute(text("""
-                UPDATE journeys 
-                SET status = 'PENALTY_DUE', 
-                    penalty_amount = :p, 
-                    penalty_reason = :r,
-                    check_out_station_id = :s,
-                    check_out_time = NOW()
-                WHERE journey_id = :id
-             """), 
-             {"p": penalty_amount, "r": penalty_reason, "s": req.station_id, "id": journey["journey_id"]})
-             db.commit()
-             
-             return JSONResponse(status_code = 402, content={
-                "error": "PENALTY",
-                "message": f"Penalty: {penalty_reason}. Amount: {penalty_amount:,.0f} VND. Ticket usage returned.",
-                "penalty_amount": penalty_amount,
-                "journey_code": req.journey_code
-             })
-
-    # PENALTY LOGIC
-    penalty_amount = 0.0
-    penalty_reasons = []
-
-    # 1. Overstay
-    check_in_time = journey["check_in_time"]
-    if check_in_time:
-        now = datetime.now(check_in_time.tzinfo)
-        duration = (now - check_in_time).total_seconds() / 60
-        if duration > 240:
-            penalty_amount = 50000.0
-            penalty_reasons.append(f"Overstay > 240m ({int(duration)}m)")
-
-    # 2. Wrong Station
-    ticket_type = ticket["ticket_type"]
-    
-    paid = float(ticket.get("fare_amount", 0) or 0)
-    
-    #check logic calculate real fare for single/return ticket
-    if ticket_type in ["SINGLE", "RETURN"]:
-        try:
-            sch_client = SchedulerClient()
-            acc_client = AccountClient()
-            user_info = acc_client.get_me(str(ticket["user_id"]))
-            p_type = user_info.get("passenger_type", "STANDARD")
-            
-            real_fare_data = sch_client.calculate_fare(journey["check_in_station_id"], req.station_id)
-            base_real = float(real_fare_data["total_amount"])
-            
-            real_price = base_real
-            if p_type == "STUDENT": real_price *= 0.5
-            elif p_type == "ELDERLY": real_price = 0
-            
-            if real_price > paid:
-                diff = real_price - paid
-                if penalty_amount < 50000:
-                    wrong_station_penalty = diff + 10000
-                    penalty_amount = max(penalty_amount, wrong_station_penalty)
-                    penalty_reasons.append(f"Fee Diff: {diff:,.0f}")
+    # Close the journey only if it is still the active one
+    closed = db.execute(text("""
+            UPDATE journeys 
+            SET status = :st, 
+                penalty_amount = :p, 
+                penalty_reason = :r,
+                check_out_station_id = :s,
+                check_out_time = NOW()
+            WHERE journey_id = :id AND status = 'IN_PROGRESS'
+        """), 
+        {"st": decision.status, "p": decision.penalty_amount, "r": decision.penalty_reason or None,
+         "s": req.station_id, "id": journey["journey_id"]}
+    ).rowcount
+    if not closed:
+        db.rollback()
+        ticket_cache.invalidate([req.journey_code])
+        raise HTTPException(409, "Ticket state changed. Please tap again.")
+
+    # Common Logic: Revert Usage (Give back 1 trip) if it's a countable ticket
+    if decision.revert_trip and ticket["remaining_trips"] is not None:
+        ticket["remaining_trips"] = db.execute(
+            text("UPDATE tickets SET remaining_trips = remaining_trips + 1 WHERE ticket_id = :tid RETURNING remaining_trips"),
+            {"tid": ticket["ticket_id"]}
+        ).scalar()
+
+    # Fare capping: pay-per-trip spend over the day/week cap is refunded
+    capped = None
+    fare = fare_caps.trip_fare(ticket) if decision.status == "COMPLETED" else None
+    if fare is not None:
+        capped = fare_caps.CappedTrip(ticket["user_id"], fare, now, resolver.passenger_type_or_default(ticket["user_id"]),
+                                      journey_id=journey["journey_id"], journey_code=ticket["ticket_code"])
+        fare_caps.record_trips(db, [capped], rules)
+    db.commit()
 
-        except Exception as e:
-            print(f"Wrong station check failed: {e}")
-
-    # 3. Apply Penalty
-    if penalty_amount > 0:
-        reason_str = " & ".join(penalty_reasons)
-        db.execute(text("""
-                UPDATE journeys 
-                SET status = 'PENALTY_DUE', 
-                    penalty_amount = :p, 
-                    penalty_reason = :r,
-                    check_out_station_id = :s,
-                    check_out_time = NOW()
-                WHERE journey_id = :id
-            """), 
-            {"p": penalty_amount, "r": reason_str, "s": req.station_id, "id": journey["journey_id"]}
-        )
-        db.commit()
+    ticket["active"] = None
+    ticket["last_status"] = decision.status
+    ticket_cache.put_gate_state(ticket)
+    station_load.record([("OUT", req.station_id, journey["check_in_station_id"], None)])
+
+    if decision.status == "CANCELLED":
+        # Early Exit (same station) -> Free Cancellation
+        return GateResponse( ok = True, message= f"Trip Cancelled (Same station exit). Usage reverted.")
+
+    if decision.status == "PENALTY_DUE":
+        message = f"Penalty: {decision.penalty_reason}. Amount: {decision.penalty_amount:,.0f} VND"
+        if decision.revert_trip:
+            message += ". Ticket usage returned."
         return JSONResponse(status_code = 402, content={
             "error": "PENALTY",
-            "message": f"Penalty: {reason_str}. Amount: {penalty_amount:,.0f} VND",
-            "penalty_amount": penalty_amount,
+            "message": message,
+            "penalty_amount": decision.penalty_amount,
             "journey_code": req.journey_code
         })
 
-    # Finalize
-    db.execute(
-        text("UPDATE journeys SET status = 'COMPLETED', check_out_station_id= :s, check_out_time=NOW() WHERE journey_id= :id"), 
-        {"s": req.station_id, "id": journey["journey_id"]}
-    )
-    db.commit()
-
     # Async logging
     try:
          
@@ -335,15 +429,54 @@ def gate_check_out(req: GateRequest, db: Session = Depends(get_db)):
             journey_code=ticket["ticket_code"]
         )
     except Exception as e:
-        print(f"Async error: {e}")
+        logger.warning("Receipt notification failed: %s", e)
+
+    if capped and capped.credit > 0:
+        fare_caps.refund(journey["journey_id"], ticket["user_id"], capped.credit, ticket["ticket_code"], db)
+        return GateResponse(ok = True, message=f"Thank you. Fare cap reached: {capped.credit:,.0f} VND refunded")
     
     return GateResponse(ok = True, message="Thank you")
 
+def _send_receipt(user_id, amount: float, journey_code: str):
+    try:
+        NotificationClient().send_receipt(user_id=user_id, amount=amount, journey_code=journey_code)
+    except Exception as e:
+        logger.warning("Receipt notification failed: %s", e)
+
+@router.post("/gate/events/batch", response_model=GateBatchResponse)
+def gate_events_batch(req: GateBatchRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Ordered taps buffered by a gate controller, applied with set-based SQL.
+    Each tap gets the result the single-tap endpoint would have returned.
+    """
+    if len(req.events) > settings.GATE_BATCH_MAX_EVENTS:
+        raise HTTPException(413, f"Batch too large (max {settings.GATE_BATCH_MAX_EVENTS} events)")
+    if not req.events:
+        return GateBatchResponse(ok=True, processed=0, results=[])
+
+    try:
+        outcome = process_batch(db, req.events, RealFareResolver(), req.gate_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        ticket_cache.invalidate({t.journey_code for t in req.events})
+        raise HTTPException(500, f"Batch failed: {e}")
+
+    for state in outcome.tickets.values():
+        ticket_cache.put_gate_state(state)
+    station_load.record(outcome.load_events)
+
+    for user_id, amount, journey_code in outcome.receipts:
+        background_tasks.add_task(_send_receipt, user_id, amount, journey_code)
+    for journey_id, user_id, amount, journey_code in outcome.refunds:
+        background_tasks.add_task(fare_caps.refund, journey_id, user_id, amount, journey_code)
+
+    return GateBatchResponse(ok=True, processed=len(outcome.results), results=outcome.results)
+
 @router.post("/gate/pay-penalty")
 def pay_penalty(req: PenaltyPaymentRequest, db: Session = Depends(get_db)):
     # 1. Look up Ticket
-    sql_ticket = text("SELECT * FROM tickets WHERE ticket_code = :c")
-    ticket = db.execute(sql_ticket, {"c": req.journey_code}).mappings().first()
+    ticket = ticket_cache.get_gate_state(db, req.journey_code)
     if not ticket: raise HTTPException(404, "Ticket not found")
 
     # 2. Look up Penalty Journey
@@ -369,7 +502,7 @@ def pay_penalty(req: PenaltyPaymentRequest, db: Session = Depends(get_db)):
                 transaction_type="PENALTY"
              )
         except Exception as e:
-            print(f"Failed to log penalty: {e}")
+            logger.warning("Failed to log penalty: %s", e)
 
     except Exception:
         # Insufficient balance -> manual paying, contact the supervisor and mark the ticket is closed
@@ -384,33 +517,163 @@ def pay_penalty(req: PenaltyPaymentRequest, db: Session = Depends(get_db)):
         {"note": reason_note, "id": journey["journey_id"]}
     )
     db.commit()
+    ticket_cache.invalidate([req.journey_code])
     
     msg = "Paid. Open Gate." if payment_status == "PAID" else "Insufficient balance. Contact Supervisor to pay & exit."
     return {"ok": True, "message": msg}
 
+@router.post("/gate/offline/reconcile", response_model=GateReconcileResponse)
+def reconcile_offline_events(req: GateReconcileRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Apply taps a gate admitted offline (validated locally with the ticket token).
+    The taps already happened, so they are recorded rather than rejected; anything
+    that does not fit the server-side state is flagged in gate_events.result.
+    Re-uploading the same event_id is a no-op.
+    """
+    if not req.events:
+        return GateReconcileResponse(ok=True, applied=0, duplicates=0, results=[])
+    received = datetime.now(timezone.utc)
+    for e in req.events:
+        e.tapped_at = tap_time(e.tapped_at, received)
+
+    # 1. Record the raw events; ON CONFLICT makes re-uploads idempotent
+    inserted = db.execute(text("""
+        INSERT INTO gate_events (event_id, gate_id, ticket_code, station_id, direction, tapped_at)
+        SELECT * FROM UNNEST(CAST(:ids AS varchar[]), CAST(:gates AS varchar[]), CAST(:codes AS varchar[]),
+                             CAST(:stations AS varchar[]), CAST(:dirs AS varchar[]), CAST(:taps AS timestamptz[]))
+        ON CONFLICT (event_id) DO NOTHING
+        RETURNING event_id
+    """), {
+        "ids": [e.event_id for e in req.events],
+        "gates": [req.gate_id] * len(req.events),
+        "codes": [e.journey_code for e in req.events],
+        "stations": [e.station_id for e in req.events],
+        "dirs": [e.direction.upper() for e in req.events],
+        "taps": [e.tapped_at for e in req.events],
+    }).scalars().all()
+    new_ids = set(inserted)
+    unique = {}
+    for e in req.events:
+        if e.event_id in new_ids:
+            unique.setdefault(e.event_id, e)
+    events = sorted(unique.values(), key=lambda e: e.tapped_at)
+
+    # 2. Replay in tap order against the locked ticket states, as a gate batch
+    codes = list({e.journey_code for e in events})
+    try:
+        outcome = reconcile_events(db, events, RealFareResolver())
+        results = outcome.results
+        if results:
+            db.execute(text("UPDATE gate_events SET result = :result WHERE event_id = :id"), results)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        ticket_cache.invalidate(codes)
+        raise HTTPException(500, f"Reconcile failed: {e}")
+
+    for state in outcome.tickets.values():
+        ticket_cache.put_gate_state(state)
+    station_load.record(outcome.load_events)
+    for journey_id, user_id, amount, journey_code in outcome.refunds:
+        background_tasks.add_task(fare_caps.refund, journey_id, user_id, amount, journey_code)
+
+    by_id = {r["id"]: r["result"] for r in results}
+    return GateReconcileResponse(
+        ok=True,
+        applied=sum(1 for r in results if r["result"] not in ("UNKNOWN_TICKET", "ALREADY_IN", "NO_ACTIVE_JOURNEY", "UNKNOWN_DIRECTION")),
+        duplicates=len(req.events) - len(new_ids),
+        results=[GateEventResult(event_id=e.event_id, result=by_id.get(e.event_id, "DUPLICATE")) for e in req.events],
+    )
+
 # ---------------------------------------------------------
 # 5. HISTORY & WALLET
 # ---------------------------------------------------------
-@router.get("/tickets", response_model=list[TicketItem])
-def get_tickets(x_user_id: str = Header(None, alias="X-User-Id"), db: Session = Depends(get_db)):
-    sql = text("SELECT * FROM tickets WHERE user_id = :uid ORDER BY created_at DESC")
-    rows = db.execute(sql, {"uid": x_user_id}).mappings().all()
+_TICKETS_PAGE_SQL = """
+    SELECT ticket_id, ticket_code, ticket_type, origin_station_id, destination_station_id,
+           status, remaining_trips, max_trips, valid_from, valid_until, created_at
+    FROM tickets
+    WHERE user_id = :uid
+      AND (created_at, ticket_id) < (CAST(:c_at AS timestamptz), CAST(:c_id AS uuid))
+"""
+_TICKETS_ORDER_SQL = " ORDER BY created_at DESC, ticket_id DESC LIMIT :limit"
+_TICKETS_PAGE = text(_TICKETS_PAGE_SQL + _TICKETS_ORDER_SQL)
+_TICKETS_PAGE_BY_STATUS = text(_TICKETS_PAGE_SQL + " AND status = ANY(:statuses)" + _TICKETS_ORDER_SQL)
+
+_HISTORY_PAGE_SQL = """
+    SELECT j.journey_id, t.ticket_code AS journey_code, j.check_in_station_id, j.check_out_station_id,
+           t.fare_amount, j.status, j.created_at
+    FROM journeys j
+    JOIN tickets t ON t.ticket_id = j.ticket_id
+    WHERE j.user_id = :uid
+      AND (j.created_at, j.journey_id) < (CAST(:c_at AS timestamptz), CAST(:c_id AS uuid))
+"""
+_HISTORY_ORDER_SQL = " ORDER BY j.created_at DESC, j.journey_id DESC LIMIT :limit"
+_HISTORY_PAGE = text(_HISTORY_PAGE_SQL + _HISTORY_ORDER_SQL)
+_HISTORY_PAGE_BY_STATUS = text(_HISTORY_PAGE_SQL + " AND j.status = ANY(:statuses)" + _HISTORY_ORDER_SQL)
+
+# same page over cold storage (see archiver.py)
+_ARCHIVE_PAGE_SQL = _HISTORY_PAGE_SQL.replace("FROM journeys j", "FROM journeys_archive j")
+_ARCHIVE_PAGE = text(_ARCHIVE_PAGE_SQL + _HISTORY_ORDER_SQL)
+_ARCHIVE_PAGE_BY_STATUS = text(_ARCHIVE_PAGE_SQL + " AND j.status = ANY(:statuses)" + _HISTORY_ORDER_SQL)
+
+
+def _page_params(x_user_id: str, cursor: Optional[str], limit: int, status_filter: Optional[str]) -> dict:
+    if not x_user_id:
+        raise HTTPException(401, "Unauthorized")
+    try:
+        c_at, c_id = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    params = {"uid": x_user_id, "c_at": c_at, "c_id": c_id, "limit": limit + 1}
+    if status_filter:
+        params["statuses"] = [s.strip().upper() for s in status_filter.split(",") if s.strip()]
+    return params
+
+
+def _page(rows, limit: int, id_key: str, response: Response):
+    # one extra row was fetched to tell whether another page exists
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1]["created_at"], rows[-1][id_key])
     return rows
 
+
+@router.get("/tickets", response_model=list[TicketItem])
+def get_tickets(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    status_filter: Optional[str] = Query(None, alias="status", description="Comma-separated, e.g. ACTIVE"),
+    x_user_id: str = Header(None, alias="X-User-Id"),
+    db: Session = Depends(get_db),
+):
+    params = _page_params(x_user_id, cursor, limit, status_filter)
+    sql = _TICKETS_PAGE_BY_STATUS if "statuses" in params else _TICKETS_PAGE
+    rows = _page(db.execute(sql, params).mappings().all(), limit, "ticket_id", response)
+    return [{**r, "ticket_token": _ticket_token(r)} for r in rows]
+
 @router.get("/history", response_model=list[JourneyHistoryItem])
-def get_history(x_user_id: str = Header(None, alias="X-User-Id"), db: Session = Depends(get_db)):
+def get_history(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(15, ge=1, le=100),
+    status_filter: Optional[str] = Query(None, alias="status", description="Comma-separated, e.g. COMPLETED,PENALTY_DUE"),
+    x_user_id: str = Header(None, alias="X-User-Id"),
+    db: Session = Depends(get_db),
+):
+    params = _page_params(x_user_id, cursor, limit, status_filter)
+    filtered = "statuses" in params
+    rows = db.execute(_HISTORY_PAGE_BY_STATUS if filtered else _HISTORY_PAGE, params).mappings().all()
+
+    # Archived journeys are all older than the archive cutoff, so the archive
+    # only has to be read once the page reaches past it (or the hot rows run out).
+    horizon = datetime.now(timezone.utc) - timedelta(days=settings.JOURNEY_ARCHIVE_AFTER_DAYS)
+    if len(rows) <= limit or rows[-1]["created_at"] < horizon:
+        archived = db.execute(_ARCHIVE_PAGE_BY_STATUS if filtered else _ARCHIVE_PAGE, params).mappings().all()
+        if archived:
+            rows = sorted([*rows, *archived], key=lambda r: (r["created_at"], r["journey_id"]), reverse=True)[:limit + 1]
+    return _page(rows, limit, "journey_id", response)
 
-    sql = text("""
-        SELECT j.*, t.ticket_code as journey_code, t.fare_amount 
-        FROM journeys j
-        JOIN tickets t ON j.ticket_id = t.ticket_id
-        WHERE t.user_id = :uid 
-        ORDER BY j.created_at DESC 
-        LIMIT 15
-    """)
-    rows = db.execute(sql, {"uid": x_user_id}).mappings().all()
-    return rows
-    
 
 @router.post("/internal/cron/process-missing-checkouts")
 def process_missing_checkouts(db: Session = Depends(get_db)):
@@ -425,8 +688,9 @@ def process_missing_checkouts(db: Session = Depends(get_db)):
     stuck_tickets = db.execute(sql).mappings().all()
 
     count = 0
+    closed = []     # station load events of the journeys actually closed
     acc_client = AccountClient()
-    max_penalty = 50000.0
+    max_penalty = fare_rules.current().overstay_penalty
 
     for ticket in stuck_tickets:
         try:
@@ -446,13 +710,94 @@ def process_missing_checkouts(db: Session = Depends(get_db)):
                     transaction_type="PENALTY"
                 )
             except Exception as e:
-                print(f"Failed to log auto-penalty: {e}")
+                logger.warning("Failed to log auto-penalty: %s", e)
 
             db.execute(text("UPDATE journeys SET status= 'CLOSED', penalty_amount= :p, check_out_time = NOW() WHERE journey_id = :id"),
             {"p": max_penalty, "id": ticket["journey_id"]})
+            closed.append(("CLOSED", None, ticket["check_in_station_id"], None))
             count += 1
         except Exception as e:
-            print(f"Failed to process ticket {ticket['ticket_code']}: {e}")
+            logger.error("Failed to process ticket %s: %s", ticket["ticket_code"], e)
         
     db.commit()
-    return {"ok": True, "processed_count": count, "message": f"Processed {count} stuck tickets"}
\ No newline at end of file
+    ticket_cache.invalidate([t["ticket_code"] for t in stuck_tickets])
+    # journeys whose penalty failed stay IN_PROGRESS and still count at their station
+    station_load.record(closed)
+    return {"ok": True, "processed_count": count, "message": f"Processed {count} stuck tickets"}
+
+
+@router.post("/internal/cron/expire-tickets")
+def expire_tickets(db: Session = Depends(get_db)):
+    """Run one expiry sweep now (the scheduler also runs it every EXPIRY_SWEEP_INTERVAL_SEC)."""
+    return sweep_expired(db)
+
+@router.get("/internal/metrics/expiry")
+def expiry_metrics():
+    return sweep_stats()
+
+@router.post("/internal/cron/archive-journeys")
+def archive_old_journeys(db: Session = Depends(get_db)):
+    return archive_journeys(db)
+
+
+# ---------------------------------------------------------
+# 6. RIDERSHIP ANALYTICS (internal)
+# ---------------------------------------------------------
+@router.post("/internal/analytics/export")
+def export_analytics_day(day: date, db: Session = Depends(get_db)):
+    """Snapshot one local service day into the columnar store read by the endpoints below."""
+    return analytics.export_day(db, day)
+
+@router.get("/internal/analytics/od-matrix")
+def analytics_od_matrix(day: date, db: Session = Depends(get_db)):
+    frame = analytics.frame_for_day(db, day)
+    return {
+        "day": day.isoformat(),
+        "stations": frame.stations.tolist(),
+        "matrix": analytics.od_matrix(frame).tolist(),
+    }
+
+@router.get("/internal/analytics/hourly")
+def analytics_hourly(day: date, station: Optional[str] = None, db: Session = Depends(get_db)):
+    """Entries / exits per station and local hour, e.g. riders entering S01 between 8 and 9 = entries[8]."""
+    frame = analytics.frame_for_day(db, day)
+    entries, exits = analytics.hourly_counts(frame)
+    stations = frame.stations.tolist()
+    if station is not None:
+        idx = analytics.station_index(frame, station)
+        if idx is None:
+            return {"day": day.isoformat(), "stations": {station: {"entries": [0] * 24, "exits": [0] * 24}}}
+        stations, entries, exits = [station], entries[idx:idx + 1], exits[idx:idx + 1]
+    return {
+        "day": day.isoformat(),
+        "stations": {
+            sid: {"entries": entries[i].tolist(), "exits": exits[i].tolist()}
+            for i, sid in enumerate(stations)
+        },
+    }
+
+@router.get("/internal/analytics/dwell")
+def analytics_dwell(
+    day: date,
+    bin_minutes: int = Query(5, ge=1, le=60),
+    max_minutes: int = Query(240, ge=10, le=1440),
+    db: Session = Depends(get_db),
+):
+    frame = analytics.frame_for_day(db, day)
+    return {"day": day.isoformat(), **analytics.dwell_distribution(frame, bin_minutes, max_minutes)}
+
+
+# ---------------------------------------------------------
+# 7. LIVE STATION LOAD (internal)
+# ---------------------------------------------------------
+@router.get("/internal/stations/load")
+def live_station_load(window: int = Query(15, ge=1, description="Throughput window in minutes")):
+    """Riders currently inside per entry station and entries/exits over the last `window` minutes."""
+    try:
+        return station_load.current_load(window)
+    except Exception as e:
+        raise HTTPException(503, f"Station load unavailable: {e}")
+
+@router.post("/internal/stations/load/rebuild")
+def rebuild_station_load(db: Session = Depends(get_db)):
+    return {"ok": True, "inside": station_load.rebuild(db)}
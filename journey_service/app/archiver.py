@@ -0,0 +1,143 @@
+"""
+Moves finished journeys out of the hot `journeys` table into `journeys_archive`.
+
+Each batch is a single statement (DELETE ... RETURNING feeding an INSERT), so a
+journey is always in exactly one of the two tables, and batches are small enough
+to keep locks and WAL bursts short. Only COMPLETED, CANCELLED and CLOSED journeys
+older than JOURNEY_ARCHIVE_AFTER_DAYS move; IN_PROGRESS and unpaid PENALTY_DUE
+journeys stay hot however old they are. The cutoff is never more recent than
+JOURNEY_ARCHIVE_AFTER_DAYS: journey history only reads the archive for pages
+past that horizon, so anything newer moved there would drop out of history.
+
+    python -m journey_service.app.archiver --older-than-days 180
+"""
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from journey_service.app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+_COLUMNS = """journey_id, ticket_id, user_id, check_in_station_id, check_in_time,
+              check_out_station_id, check_out_time, penalty_amount, penalty_reason,
+              status, created_at"""
+
+_OLDEST = text("""
+    SELECT min(created_at) FROM journeys
+    WHERE status IN ('COMPLETED', 'CANCELLED', 'CLOSED') AND created_at < :cutoff
+""")
+
+_MOVE_BATCH = text("""
+    WITH moved AS (
+        DELETE FROM journeys
+        WHERE journey_id IN (
+            SELECT journey_id FROM journeys
+            WHERE status IN ('COMPLETED', 'CANCELLED', 'CLOSED') AND created_at < :cutoff
+            ORDER BY created_at
+            LIMIT :n
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING """ + _COLUMNS + """
+    )
+    INSERT INTO journeys_archive (""" + _COLUMNS + """)
+    SELECT """ + _COLUMNS + """ FROM moved
+""")
+
+
+def _month_start(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(ts: datetime) -> datetime:
+    return ts.replace(year=ts.year + 1, month=1) if ts.month == 12 else ts.replace(month=ts.month + 1)
+
+
+def ensure_partitions(db: Session, oldest: datetime, cutoff: datetime) -> List[str]:
+    """Create the monthly partitions covering [oldest, cutoff]; returns their names."""
+    names = []
+    month = _month_start(oldest)
+    while month <= cutoff:
+        end = _next_month(month)
+        name = f"journeys_archive_{month:%Y_%m}"
+        db.connection().exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF journeys_archive "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        names.append(name)
+        month = end
+    db.commit()
+    return names
+
+
+def archive_journeys(
+    db: Session,
+    older_than_days: int = None,
+    batch_size: int = None,
+    max_batches: int = None,
+) -> Dict[str, Any]:
+    """Move up to batch_size * max_batches finished journeys older than the cutoff."""
+    if older_than_days is None:
+        older_than_days = settings.JOURNEY_ARCHIVE_AFTER_DAYS
+    elif older_than_days < settings.JOURNEY_ARCHIVE_AFTER_DAYS:
+        logger.warning("older_than_days=%d is below JOURNEY_ARCHIVE_AFTER_DAYS; using %d",
+                       older_than_days, settings.JOURNEY_ARCHIVE_AFTER_DAYS)
+        older_than_days = settings.JOURNEY_ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or settings.JOURNEY_ARCHIVE_BATCH_SIZE
+    max_batches = max_batches or settings.JOURNEY_ARCHIVE_MAX_BATCHES
+
+    started = time.perf_counter()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    oldest = db.execute(_OLDEST, {"cutoff": cutoff}).scalar()
+    if oldest is None:
+        return {"ok": True, "archived": 0, "batches": 0, "cutoff": cutoff.isoformat()}
+
+    ensure_partitions(db, oldest, cutoff)
+
+    archived = 0
+    batches = 0
+    while batches < max_batches:
+        try:
+            moved = db.execute(_MOVE_BATCH, {"cutoff": cutoff, "n": batch_size}).rowcount
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error("Journey archiving failed after %d rows: %s", archived, e)
+            return {"ok": False, "archived": archived, "batches": batches, "cutoff": cutoff.isoformat()}
+        batches += 1
+        archived += moved
+        if moved < batch_size:
+            break
+
+    return {
+        "ok": True,
+        "archived": archived,
+        "batches": batches,
+        "cutoff": cutoff.isoformat(),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from journey_service.app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Move finished journeys into journeys_archive")
+    parser.add_argument("--older-than-days", type=int, default=settings.JOURNEY_ARCHIVE_AFTER_DAYS,
+                        help="at least JOURNEY_ARCHIVE_AFTER_DAYS (smaller values are raised to it)")
+    parser.add_argument("--batch-size", type=int, default=settings.JOURNEY_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=1_000_000, help="default: until done")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        print(archive_journeys(session, args.older_than_days, args.batch_size, args.max_batches))
+    finally:
+        session.close()
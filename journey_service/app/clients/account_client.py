@@ -17,4 +17,15 @@ class AccountClient:
             "description": desc
         }
         resp = self._client.post("/internal/post/account/deduct", json=payload)
-        return resp.json()
\ No newline at end of file
+        return resp.json()
+
+    def credit_balance(self, user_id: str, amount: float, desc: str = "Refund", reference: str = None) -> Dict[str, Any]:
+        # `reference` makes the credit idempotent, so the client's retries cannot pay twice
+        payload = {
+            "user_id": str(user_id),
+            "amount": amount,
+            "description": desc,
+            "reference": reference
+        }
+        resp = self._client.post("/internal/post/account/credit", json=payload)
+        return resp.json()
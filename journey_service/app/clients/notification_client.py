@@ -1,8 +1,11 @@
+import logging
 from datetime import datetime
 from libs.http import HttpClient
 from journey_service.app.settings import settings
 from journey_service.app.clients.account_client import AccountClient
 
+logger = logging.getLogger(__name__)
+
 class NotificationClient:
     def __init__(self):
         self.client = HttpClient(settings.NOTIFICATION_SERVICE_URL)
@@ -14,7 +17,7 @@ class NotificationClient:
             user_email = user_info.get("email")
 
             if not user_email:
-                print(f"Skipping email reciept: No email found for user {user_id}")
+                logger.info("Skipping email receipt: no email found for user %s", user_id)
                 return 
 
             payload= {
@@ -28,4 +31,4 @@ class NotificationClient:
             self.client.post("/internal/post/notification/send_receipt", json=payload)
 
         except Exception as e:
-            print(f"Failed to send receipt: {e}")
\ No newline at end of file
+            logger.warning("Failed to send receipt: %s", e)
\ No newline at end of file
@@ -1,11 +1,16 @@
+import logging
+from typing import List
 from libs.http import HttpClient
 from journey_service.app.settings import settings
 
+logger = logging.getLogger(__name__)
+
 class PaymentClient:
     def __init__(self):
         self.client = HttpClient(settings.PAYMENT_SERVICE_URL)
 
-    def log_transaction(self, user_id: str, amount: float, description: str, ticket_id: str = None, transaction_type: str = "TICKET_PAYMENT"):
+    def log_transaction(self, user_id: str, amount: float, description: str, ticket_id: str = None, transaction_type: str = "TICKET_PAYMENT",
+                        ticket_ids: List[str] = None):
 
         try:
             payload = {
@@ -13,9 +18,10 @@ class PaymentClient:
                 "amount": amount,
                 "type": transaction_type,
                 "ticket_id": ticket_id,
+                "ticket_ids": ticket_ids,
                 "description": description
             }
             self.client.post("/internal/log", json=payload)
 
         except Exception as e:
-            print(f"Failed to log transaction: {e}")
\ No newline at end of file
+            logger.warning("Failed to log transaction: %s", e)
\ No newline at end of file
@@ -1,4 +1,5 @@
-from typing import Dict, Any, Optional
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
 from libs.http import HttpClient
 from journey_service.app.settings import settings
 
@@ -7,12 +8,35 @@ class SchedulerClient:
     def __init__(self):
         self._client = HttpClient(settings.SCHEDULER_SERVICE_URL)
 
-    def calculate_fare(self, from_station: str, to_station: str, passenger_type: str = "STANDARD")-> Dict[str, Any]:
+    def calculate_fare(self, from_station: str, to_station: str, passenger_type: str = "STANDARD",
+                       at: Optional[datetime] = None) -> Dict[str, Any]:
 
         payload = {
             "from_station": from_station,
             "to_station": to_station,
             "passenger_type": passenger_type
         }
+        if at is not None:
+            # trip start, local time: picks the time band
+            payload["at"] = at.isoformat()
         resp = self._client.post("/internal/calculate-fare", json= payload)
-        return resp.json()
\ No newline at end of file
+        return resp.json()
+
+    def fare_matrix(self, etag: Optional[str] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        (etag, compact matrix) from /internal/fares/matrix, or (etag, None) when the
+        table behind `etag` is still current (304).
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        resp = self._client.get("/internal/fares/matrix", params={"format": "compact"}, headers=headers)
+        if resp.status_code == 304:
+            return etag, None
+        return resp.headers.get("ETag"), resp.json()
+
+    def fare_rules(self, etag: Optional[str] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """(etag, compiled rules) from /internal/fares/rules, or (etag, None) on 304."""
+        headers = {"If-None-Match": etag} if etag else None
+        resp = self._client.get("/internal/fares/rules", headers=headers)
+        if resp.status_code == 304:
+            return etag, None
+        return resp.headers.get("ETag"), resp.json()
@@ -0,0 +1,91 @@
+"""
+Background expiry of tickets past valid_until.
+
+Tickets used to become EXPIRED only when scanned after valid_until, so the
+ACTIVE set grew without bound. The sweeper flips them in bounded batches off the
+(status, valid_until) index; each batch is its own short transaction and skips
+rows a gate is holding, so it never blocks taps. The lazy check at check-in stays
+as a fallback for the time between two sweeps.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from journey_service.app import ticket_cache
+from journey_service.app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+_EXPIRE_BATCH = text("""
+    UPDATE tickets SET status = 'EXPIRED'
+    WHERE ticket_id IN (
+        SELECT ticket_id FROM tickets
+        WHERE status = 'ACTIVE' AND valid_until < NOW()
+        ORDER BY valid_until
+        LIMIT :n
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING ticket_code
+""")
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "runs": 0,
+    "failures": 0,
+    "expired_total": 0,
+    "last_run_at": None,
+    "last_expired": 0,
+    "last_batches": 0,
+    "last_duration_ms": 0.0,
+    "last_error": None,
+}
+
+
+def sweep_expired(db: Session, batch_size: int = None, max_batches: int = None) -> Dict[str, Any]:
+    """Expire overdue ACTIVE tickets, at most batch_size * max_batches per call."""
+    batch_size = batch_size or settings.EXPIRY_SWEEP_BATCH_SIZE
+    max_batches = max_batches or settings.EXPIRY_SWEEP_MAX_BATCHES
+
+    started = time.perf_counter()
+    expired = 0
+    batches = 0
+    error = None
+    try:
+        while batches < max_batches:
+            codes = db.execute(_EXPIRE_BATCH, {"n": batch_size}).scalars().all()
+            db.commit()
+            batches += 1
+            expired += len(codes)
+            ticket_cache.invalidate(codes)
+            if len(codes) < batch_size:
+                break
+    except Exception as e:
+        db.rollback()
+        error = str(e)
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["failures"] += 1 if error else 0
+        _stats["expired_total"] += expired
+        _stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        _stats["last_expired"] = expired
+        _stats["last_batches"] = batches
+        _stats["last_duration_ms"] = round(duration_ms, 1)
+        _stats["last_error"] = error
+
+    if error:
+        logger.error("Expiry sweep failed after %d tickets: %s", expired, error)
+    return {"ok": error is None, "expired": expired, "batches": batches, "duration_ms": round(duration_ms, 1)}
+
+
+def sweep_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,203 @@
+"""
+Daily / weekly fare capping for pay-per-trip tickets (SINGLE / RETURN).
+
+Every completed trip adds its fare to the rider's running aggregates in
+rider_spend (one row per rider, period and period start), so the capping
+decision reads two rows and never the rider's journey history:
+
+    pays = min(fare, day_cap - charged_today, week_cap - charged_this_week)
+
+and the rest of the fare is refunded to the wallet. Caps come from the compiled
+rule set (daily_cap / weekly_cap) with the rider's passenger discount applied.
+Periods are local days (FARE_CAP_UTC_OFFSET_HOURS) and Monday-first weeks.
+
+`record_trips` runs inside the check-out transaction: the upsert locks the rows,
+so concurrent check-outs of the same rider are applied one after the other.
+It also records each refund owed in fare_cap_refunds; `refund` pays it after the
+commit (keyed by journey id, so a retried credit is applied once) and
+`retry_refunds` picks up the ones that failed.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from libs.fares import FareRuleSet
+from journey_service.app.clients.account_client import AccountClient
+from journey_service.app.clients.payment_client import PaymentClient
+from journey_service.app.db import SessionLocal
+from journey_service.app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+PAY_PER_TRIP = ("SINGLE", "RETURN")
+
+_SPEND_SQL = text("""
+    INSERT INTO rider_spend (user_id, period, period_start, spent)
+    SELECT v.uid, v.period, v.start, SUM(v.fare)
+    FROM UNNEST(CAST(:uid AS uuid[]), CAST(:period AS varchar[]), CAST(:start AS date[]), CAST(:fare AS numeric[]))
+         AS v(uid, period, start, fare)
+    GROUP BY v.uid, v.period, v.start
+    ON CONFLICT (user_id, period, period_start)
+    DO UPDATE SET spent = rider_spend.spent + EXCLUDED.spent, updated_at = NOW()
+    RETURNING user_id::text, period, period_start, charged
+""")
+
+_CHARGE_SQL = text("""
+    UPDATE rider_spend r
+    SET charged = r.charged + v.charged, credited = r.credited + v.credited
+    FROM UNNEST(CAST(:uid AS uuid[]), CAST(:period AS varchar[]), CAST(:start AS date[]),
+                CAST(:charged AS numeric[]), CAST(:credited AS numeric[]))
+         AS v(uid, period, start, charged, credited)
+    WHERE r.user_id = v.uid AND r.period = v.period AND r.period_start = v.start
+""")
+
+_OWED_SQL = text("""
+    INSERT INTO fare_cap_refunds (journey_id, user_id, amount, journey_code)
+    SELECT * FROM UNNEST(CAST(:jid AS uuid[]), CAST(:uid AS uuid[]), CAST(:amount AS numeric[]),
+                         CAST(:code AS varchar[]))
+    ON CONFLICT (journey_id) DO NOTHING
+""")
+
+_PAID_SQL = text("UPDATE fare_cap_refunds SET refunded_at = NOW(), attempts = attempts + 1 WHERE journey_id = :jid")
+_FAILED_SQL = text("UPDATE fare_cap_refunds SET attempts = attempts + 1 WHERE journey_id = :jid")
+
+_UNPAID_SQL = text("""
+    SELECT journey_id::text, user_id::text, amount, journey_code
+    FROM fare_cap_refunds
+    WHERE refunded_at IS NULL AND created_at < NOW() - make_interval(secs => :min_age)
+    ORDER BY created_at
+    LIMIT :limit
+""")
+
+Key = Tuple[str, str, date]
+
+
+@dataclass
+class CappedTrip:
+    user_id: str
+    fare: float                  # what this trip cost on the ticket (discounted)
+    when: datetime
+    passenger_type: str = "STANDARD"
+    credit: float = 0.0          # set by record_trips
+    journey_id: Optional[str] = None
+    journey_code: Optional[str] = None
+
+
+def trip_fare(ticket) -> Optional[float]:
+    """Per-trip fare of a pay-per-trip ticket, None for passes."""
+    if ticket["ticket_type"] not in PAY_PER_TRIP:
+        return None
+    return float(ticket["fare_amount"] or 0) / max(ticket["max_trips"] or 1, 1)
+
+
+def periods(when: datetime) -> Tuple[date, date]:
+    """(local day, Monday of its week) a trip ending at `when` counts towards."""
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    day = (when.astimezone(timezone.utc) + timedelta(hours=settings.FARE_CAP_UTC_OFFSET_HOURS)).date()
+    return day, day - timedelta(days=day.weekday())
+
+
+def cap_credit(fare: float, day_charged: float, week_charged: float, day_cap: float, week_cap: float) -> float:
+    """Part of `fare` above whichever cap is closer; 0 while both have room."""
+    pays = max(0.0, min(fare, day_cap - day_charged, week_cap - week_charged))
+    return fare - pays
+
+
+def record_trips(db: Session, trips: List[CappedTrip], rules: FareRuleSet) -> None:
+    """
+    Add `trips` (in tap order) to the aggregates, set each one's credit and record
+    the refunds owed (trips with a journey id); caller commits.
+    """
+    if rules.daily_cap is None and rules.weekly_cap is None:
+        return
+    trips = [t for t in trips if t.fare > 0]
+    if not trips:
+        return
+
+    keyed = []
+    for t in trips:
+        day, week = periods(t.when)
+        keyed.append((t, (str(t.user_id), "DAY", day), (str(t.user_id), "WEEK", week)))
+    rows = [(k, t.fare) for t, day_key, week_key in keyed for k in (day_key, week_key)]
+    returned = db.execute(_SPEND_SQL, {
+        "uid": [k[0] for k, _ in rows],
+        "period": [k[1] for k, _ in rows],
+        "start": [k[2] for k, _ in rows],
+        "fare": [fare for _, fare in rows],
+    })
+    charged: Dict[Key, float] = {(uid, period, start): float(c) for uid, period, start, c in returned}
+
+    deltas: Dict[Key, List[float]] = {}     # key -> [charged, credited]
+    for t, day_key, week_key in keyed:
+        day_cap, week_cap = rules.caps(t.passenger_type)
+        t.credit = cap_credit(t.fare, charged[day_key], charged[week_key], day_cap, week_cap)
+        for key in (day_key, week_key):
+            charged[key] += t.fare - t.credit
+            delta = deltas.setdefault(key, [0.0, 0.0])
+            delta[0] += t.fare - t.credit
+            delta[1] += t.credit
+
+    db.execute(_CHARGE_SQL, {
+        "uid": [k[0] for k in deltas],
+        "period": [k[1] for k in deltas],
+        "start": [k[2] for k in deltas],
+        "charged": [d[0] for d in deltas.values()],
+        "credited": [d[1] for d in deltas.values()],
+    })
+
+    owed = [t for t in trips if t.credit > 0 and t.journey_id]
+    if owed:
+        db.execute(_OWED_SQL, {
+            "jid": [str(t.journey_id) for t in owed],
+            "uid": [str(t.user_id) for t in owed],
+            "amount": [t.credit for t in owed],
+            "code": [t.journey_code for t in owed],
+        })
+
+
+def refund(journey_id: str, user_id: str, amount: float, journey_code: str, db: Session = None) -> bool:
+    """Pay a recorded cap credit back to the wallet (after the check-out commit); True once paid."""
+    if amount <= 0:
+        return True
+    own = db is None
+    if own:
+        db = SessionLocal()
+    try:
+        try:
+            AccountClient().credit_balance(
+                str(user_id), amount, f"Fare cap refund {journey_code}", reference=f"fare-cap:{journey_id}")
+        except Exception as e:
+            logger.error("Fare cap refund failed for %s (%.0f), will retry: %s", user_id, amount, e)
+            db.execute(_FAILED_SQL, {"jid": str(journey_id)})
+            db.commit()
+            return False
+        db.execute(_PAID_SQL, {"jid": str(journey_id)})
+        db.commit()
+    finally:
+        if own:
+            db.close()
+
+    try:
+        PaymentClient().log_transaction(
+            user_id=str(user_id),
+            amount=amount,
+            description=f"Fare cap refund {journey_code}",
+            transaction_type="FARE_CAP_REFUND",
+        )
+    except Exception as e:
+        logger.warning("Failed to log fare cap refund: %s", e)
+    return True
+
+
+def retry_refunds(db: Session, min_age_sec: int = 300, limit: int = 200) -> Dict[str, int]:
+    """Pay refunds still owed `min_age_sec` after their check-out (older first)."""
+    rows = db.execute(_UNPAID_SQL, {"min_age": min_age_sec, "limit": limit}).all()
+    paid = sum(1 for jid, uid, amount, code in rows if refund(jid, uid, float(amount), code, db))
+    return {"owed": len(rows), "paid": paid}
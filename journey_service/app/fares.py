@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from libs.fares import DEFAULT_RULES, FareRuleSet
+from libs.metrics import cache_lookup
+from journey_service.app.clients.account_client import AccountClient
+from journey_service.app.clients.scheduler_client import SchedulerClient
+from journey_service.app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class FareRules:
+    """
+    The scheduler's compiled pricing rules (libs.fares.FareRuleSet): discounts, pass
+    products and penalties. Same refresh model as FareTable: a conditional GET that
+    is a 304 until the network version moves, then a whole new immutable rule set.
+    DEFAULT_RULES apply until the first load succeeds.
+    """
+
+    def __init__(self) -> None:
+        self._rules: FareRuleSet = DEFAULT_RULES
+        self._loaded = False
+        self._etag: Optional[str] = None
+        self._client: Optional[SchedulerClient] = None
+        self._lock = threading.Lock()
+        self._last_attempt = 0.0
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._rules.version if self._loaded else None
+
+    def refresh(self) -> bool:
+        """Reload if the rules changed; True when a new rule set was loaded."""
+        with self._lock:
+            self._last_attempt = time.monotonic()
+            if self._client is None:
+                self._client = SchedulerClient()
+            etag, data = self._client.fare_rules(self._etag)
+            if data is None:
+                return False
+            self._rules = FareRuleSet.from_dict(data)
+            self._loaded = True
+            self._etag = etag
+            return True
+
+    def current(self) -> FareRuleSet:
+        if not self._loaded and time.monotonic() - self._last_attempt > settings.FARE_TABLE_REFRESH_SEC:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Fare rules load failed: %s", e)
+        return self._rules
+
+
+fare_rules = FareRules()
+
+
+def band_time(when: Optional[datetime] = None) -> datetime:
+    """Naive local time that time bands are matched against (naive `when` is taken as local)."""
+    if when is None:
+        return datetime.now()
+    return when.astimezone().replace(tzinfo=None) if when.tzinfo else when
+
+
+def apply_discount(amount: float, passenger_type: str) -> float:
+    return fare_rules.current().discount(amount, passenger_type)
+
+
+def price_ticket(ticket_type: str, from_station: str, to_station: str, base_fare) -> Tuple[float, int]:
+    """(undiscounted price, usage limit) for a ticket; `base_fare(from, to)` prices a single trip."""
+    product = fare_rules.current().pass_product(ticket_type)
+    if product is not None:
+        # DAY / MONTH
+        return product.price, product.max_trips
+    # SINGLE / RETURN
+    amount = float(base_fare(from_station, to_station))
+    if ticket_type == "RETURN":
+        return amount * 2, 2
+    return amount, 1
+
+
+class FareTable:
+    """
+    Local copy of the scheduler's standard fare for every station pair, for the
+    base tariff and for each time band.
+
+    Loaded in bulk and swapped in whole, so lookups are plain dict reads with no
+    locking. `refresh()` is a conditional GET on the compact matrix: a 304 while
+    scheduler's network version is unchanged, the full table once it moves. The
+    scheduler job calls it every FARE_TABLE_REFRESH_SEC.
+    """
+
+    def __init__(self) -> None:
+        self._fares: Dict[Tuple[str, str], float] = {}
+        self._band_fares: Dict[str, Dict[Tuple[str, str], float]] = {}
+        self.version: Optional[int] = None
+        self._etag: Optional[str] = None
+        self._client: Optional[SchedulerClient] = None
+        self._lock = threading.Lock()
+        self._last_attempt = 0.0
+
+    def refresh(self) -> bool:
+        """Reload if the network version changed; True when a new table was loaded."""
+        with self._lock:
+            self._last_attempt = time.monotonic()
+            if self._client is None:
+                self._client = SchedulerClient()
+            etag, data = self._client.fare_matrix(self._etag)
+            if data is None:
+                return False
+            stations = data["stations"]
+
+            def pairs(grid) -> Dict[Tuple[str, str], float]:
+                return {
+                    (a, b): float(fare)
+                    for a, row in zip(stations, grid)
+                    for b, fare in zip(stations, row)
+                    if fare is not None
+                }
+
+            self._fares = pairs(data["fare"])
+            self._band_fares = {band: pairs(grid) for band, grid in data.get("band_fare", {}).items()}
+            self.version = int(data["version"])
+            self._etag = etag
+            return True
+
+    def get(self, from_station: str, to_station: str, when: datetime = None) -> Optional[float]:
+        """Standard fare for a trip started at `when` (default now)."""
+        # first use before the scheduler job ran; don't retry on every tap while scheduler is down
+        if self.version is None and time.monotonic() - self._last_attempt > settings.FARE_TABLE_REFRESH_SEC:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Fare table load failed: %s", e)
+        band = fare_rules.current().band_at(band_time(when))
+        fares = self._band_fares.get(band.name, self._fares) if band else self._fares
+        return fares.get((from_station, to_station))
+
+
+fare_table = FareTable()
+
+
+class RealFareResolver:
+    """
+    Resolves the discounted fare a rider owes for the pair actually travelled.
+
+    Passenger types and pair fares (per time band) are memoised for the lifetime of
+    the resolver, so one instance per request (or per batch) makes each upstream
+    call at most once. With `local_only` set (while gate batches hold row locks)
+    anything not already known raises LookupError instead of calling upstream.
+    """
+
+    def __init__(self) -> None:
+        self._sch_client: Optional[SchedulerClient] = None
+        self._acc_client: Optional[AccountClient] = None
+        self._passenger_types: Dict[str, str] = {}
+        self._fares: Dict[Tuple[str, str, Optional[str]], float] = {}
+        self.local_only = False
+
+    def passenger_type(self, user_id: str) -> str:
+        user_id = str(user_id)
+        if user_id not in self._passenger_types:
+            if self.local_only:
+                raise LookupError(f"passenger type of {user_id} not resolved")
+            if self._acc_client is None:
+                self._acc_client = AccountClient()
+            user_info = self._acc_client.get_me(user_id)
+            self._passenger_types[user_id] = user_info.get("passenger_type", "STANDARD")
+        return self._passenger_types[user_id]
+
+    def passenger_type_or_default(self, user_id: str) -> str:
+        """passenger_type, or STANDARD (no discount) when account_service cannot tell."""
+        try:
+            return self.passenger_type(user_id)
+        except Exception as e:
+            logger.warning("Passenger type lookup failed: %s", e)
+            return "STANDARD"
+
+    def base_fare(self, from_station: str, to_station: str, when: datetime = None) -> float:
+        """Standard fare of the pair in the time band of `when` (a trip's start, default now)."""
+        at = band_time(when)
+        band = fare_rules.current().band_at(at)
+        key = (from_station, to_station, band.name if band else None)
+        if key not in self._fares:
+            fare = fare_table.get(from_station, to_station, at)
+            cache_lookup("fare_table", fare is not None)
+            if fare is not None:
+                return fare
+            # not in the local table (not loaded yet, or unknown pair): ask scheduler
+            if self.local_only:
+                raise LookupError(f"fare {from_station}->{to_station} not resolved")
+            if self._sch_client is None:
+                self._sch_client = SchedulerClient()
+            self._fares[key] = float(self._sch_client.calculate_fare(from_station, to_station, at=at)["total_amount"])
+        return self._fares[key]
+
+    def for_user(self, user_id: str):
+        """Callable (from, to, trip start) -> discounted fare or None, as expected by gate_rules."""
+        def real_fare(from_station: str, to_station: str, when: datetime = None) -> Optional[float]:
+            try:
+                return apply_discount(self.base_fare(from_station, to_station, when), self.passenger_type(user_id))
+            except Exception as e:
+                logger.warning("Wrong station check failed: %s", e)
+                return None
+        return real_fare
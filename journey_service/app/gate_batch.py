@@ -0,0 +1,400 @@
+"""
+Set-based processing of buffered gate taps.
+
+A batch costs a fixed number of statements regardless of its size: an unlocked
+read of every ticket involved, so fares and passenger types are resolved (over
+HTTP if need be) before any lock is taken; one read that locks the tickets and
+loads their active/last journey; and one write that inserts new journeys,
+updates existing ones and updates tickets via data-modifying CTEs (plus the
+fare-capping statements when pay-per-trip journeys complete, and the gate_events
+claim when taps carry event ids). While the locks are held the resolver only
+answers from what it already knows.
+Taps are replayed in array order against in-memory state, so several taps of the
+same ticket inside one batch see each other exactly as sequential requests would.
+Taps with an event_id are applied once: a retried upload gets "already processed".
+
+Offline gate events (`reconcile_events`) go through the same replay and writes,
+but are recorded rather than rejected: the gate already let the rider through.
+"""
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from journey_service.app import fare_caps
+from journey_service.app.fares import RealFareResolver, fare_rules
+from journey_service.app.gate_rules import CheckOutDecision, GateDenied, check_in_rules, check_out_decision
+from journey_service.app.ticket_cache import load_gate_states
+
+
+_WRITE_SQL = text("""
+    WITH new_journeys AS (
+        INSERT INTO journeys (journey_id, ticket_id, user_id, check_in_station_id, check_in_time,
+                              check_out_station_id, check_out_time, penalty_amount, penalty_reason,
+                              status, created_at)
+        SELECT v.jid, v.tid, v.uid, v.in_sid, v.in_t, v.out_sid, v.out_t, v.pen, v.reason, v.status, v.in_t
+        FROM UNNEST(CAST(:n_jid AS uuid[]), CAST(:n_tid AS uuid[]), CAST(:n_uid AS uuid[]), CAST(:n_in_sid AS varchar[]),
+                    CAST(:n_in_t AS timestamptz[]), CAST(:n_out_sid AS varchar[]), CAST(:n_out_t AS timestamptz[]),
+                    CAST(:n_pen AS numeric[]), CAST(:n_reason AS varchar[]), CAST(:n_status AS varchar[]))
+             AS v(jid, tid, uid, in_sid, in_t, out_sid, out_t, pen, reason, status)
+        RETURNING 1
+    ),
+    closed_journeys AS (
+        UPDATE journeys j
+        SET status = v.status,
+            check_out_station_id = v.out_sid,
+            check_out_time = v.out_t,
+            penalty_amount = v.pen,
+            penalty_reason = v.reason
+        FROM UNNEST(CAST(:u_jid AS uuid[]), CAST(:u_out_sid AS varchar[]), CAST(:u_out_t AS timestamptz[]),
+                    CAST(:u_pen AS numeric[]), CAST(:u_reason AS varchar[]), CAST(:u_status AS varchar[]))
+             AS v(jid, out_sid, out_t, pen, reason, status)
+        WHERE j.journey_id = v.jid
+        RETURNING 1
+    ),
+    touched_tickets AS (
+        UPDATE tickets t
+        SET remaining_trips = v.rem, status = v.status
+        FROM UNNEST(CAST(:t_id AS uuid[]), CAST(:t_rem AS int[]), CAST(:t_status AS varchar[]))
+             AS v(id, rem, status)
+        WHERE t.ticket_id = v.id
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM new_journeys),
+           (SELECT count(*) FROM closed_journeys),
+           (SELECT count(*) FROM touched_tickets)
+""")
+
+
+_CLAIM_SQL = text("""
+    INSERT INTO gate_events (event_id, gate_id, ticket_code, station_id, direction, tapped_at)
+    SELECT * FROM UNNEST(CAST(:ids AS varchar[]), CAST(:gates AS varchar[]), CAST(:codes AS varchar[]),
+                         CAST(:stations AS varchar[]), CAST(:dirs AS varchar[]), CAST(:taps AS timestamptz[]))
+    ON CONFLICT (event_id) DO NOTHING
+    RETURNING event_id
+""")
+
+_EVENT_RESULT_SQL = text("UPDATE gate_events SET result = :result WHERE event_id = :id")
+
+# (journey_code, station_id, direction, tap time)
+Tap = Tuple[str, str, str, datetime]
+
+
+@dataclass
+class BatchOutcome:
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    # (user_id, fare_amount, ticket_code) for journeys completed in this batch
+    receipts: List[tuple] = field(default_factory=list)
+    # (journey_id, user_id, amount, ticket_code) fare cap refunds owed after the commit
+    refunds: List[tuple] = field(default_factory=list)
+    # final gate state of every ticket in the batch, for the write-through cache
+    tickets: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # accepted taps for the live station counters (see station_load.record)
+    load_events: List[tuple] = field(default_factory=list)
+
+
+def _result(index: int, status_code: int, message: str, penalty_amount: float | None = None) -> Dict[str, Any]:
+    return {
+        "index": index,
+        "ok": status_code < 400,
+        "status_code": status_code,
+        "message": message,
+        "penalty_amount": penalty_amount,
+    }
+
+
+def tap_time(tapped_at: datetime | None, default: datetime) -> datetime:
+    """Timezone-aware tap time; a naive one from the gate is local time."""
+    if tapped_at is None:
+        return default
+    return tapped_at if tapped_at.tzinfo else tapped_at.astimezone()
+
+
+class _Replay:
+    """In-memory state of one batch: the tickets involved and everything changed."""
+
+    def __init__(self, db: Session, taps: List[Tap], resolver: RealFareResolver) -> None:
+        self.resolver = resolver
+        self.rules = fare_rules.current()
+        self.outcome = BatchOutcome()
+        codes = list({tap[0] for tap in taps})
+        self._prefetch(load_gate_states(db, codes), taps)
+        resolver.local_only = True
+        self.outcome.tickets = load_gate_states(db, codes, for_update=True)
+        self.journeys: Dict[Any, Dict[str, Any]] = {}
+        self.dirty_tickets: Dict[Any, Dict[str, Any]] = {}
+        self.capped: List[tuple] = []     # (CappedTrip, result index)
+
+    def _prefetch(self, states: Dict[str, Dict[str, Any]], taps: List[Tap]) -> None:
+        """Resolve what every check-out of the batch may need while nothing is locked yet."""
+        active = {code: (s["active"]["check_in_station_id"], s["active"]["check_in_time"]) if s["active"] else None
+                  for code, s in states.items()}
+        for code, station_id, direction, when in taps:
+            state = states.get(code)
+            if state is None:
+                continue
+            if direction.upper() == "IN":
+                active[code] = (station_id, when)
+            elif direction.upper() == "OUT" and active.get(code):
+                origin, started = active[code]
+                active[code] = None
+                if state["ticket_type"] in fare_caps.PAY_PER_TRIP:
+                    self.resolver.passenger_type_or_default(state["user_id"])
+                    if origin != station_id:
+                        self.resolver.for_user(state["user_id"])(origin, station_id, started)
+
+    def touch(self, ticket) -> None:
+        self.dirty_tickets[ticket["ticket_id"]] = ticket
+
+    def check_in(self, ticket, station_id: str, now: datetime) -> None:
+        """Open a journey; the caller has already applied (or overridden) check_in_rules."""
+        # an exhausted ticket (offline admission) is not charged below zero
+        charged = ticket["remaining_trips"] is not None and ticket["remaining_trips"] > 0
+        if charged:
+            ticket["remaining_trips"] -= 1
+            self.touch(ticket)
+
+        journey = {
+            "journey_id": str(uuid.uuid4()),
+            "ticket_id": ticket["ticket_id"],
+            "user_id": ticket["user_id"],
+            "check_in_station_id": station_id,
+            "check_in_time": now,
+            "status": "IN_PROGRESS",
+            "check_out_station_id": None,
+            "check_out_time": None,
+            "penalty_amount": 0,
+            "penalty_reason": None,
+            "new": True,
+            "charged": charged,
+        }
+        self.journeys[journey["journey_id"]] = journey
+        ticket["active"] = journey
+        ticket["last_status"] = "IN_PROGRESS"
+        self.outcome.load_events.append(("IN", station_id, None, now))
+
+    def check_out(self, ticket, station_id: str, now: datetime, index: int) -> CheckOutDecision:
+        """Close the ticket's active journey; completed pay-per-trip journeys are queued for capping."""
+        journey = ticket["active"]
+        decision = check_out_decision(
+            ticket, journey, station_id, now, self.resolver.for_user(ticket["user_id"]), self.rules)
+        # journeys opened before this batch always took a trip
+        if decision.revert_trip and ticket["remaining_trips"] is not None and journey.get("charged", True):
+            ticket["remaining_trips"] += 1
+            self.touch(ticket)
+
+        journey.update({
+            "status": decision.status,
+            "check_out_station_id": station_id,
+            "check_out_time": now,
+            "penalty_amount": decision.penalty_amount,
+            "penalty_reason": decision.penalty_reason or None,
+        })
+        self.journeys[journey["journey_id"]] = journey
+        ticket["active"] = None
+        ticket["last_status"] = decision.status
+        self.outcome.load_events.append(("OUT", station_id, journey["check_in_station_id"], now))
+
+        if decision.status == "COMPLETED":
+            fare = fare_caps.trip_fare(ticket)
+            if fare is not None:
+                trip = fare_caps.CappedTrip(
+                    ticket["user_id"], fare, now, self.resolver.passenger_type_or_default(ticket["user_id"]),
+                    journey_id=journey["journey_id"], journey_code=ticket["ticket_code"])
+                self.capped.append((trip, index))
+        return decision
+
+    def finish(self, db: Session) -> List[tuple]:
+        """Write everything and record the capped trips; returns (CappedTrip, result index) owed a refund."""
+        self.resolver.local_only = False
+        if self.journeys or self.dirty_tickets:
+            _write(db, self.journeys, self.dirty_tickets)
+
+        # one upsert + one update for every capped trip in the batch
+        fare_caps.record_trips(db, [trip for trip, _ in self.capped], self.rules)
+        credited = []
+        for trip, index in self.capped:
+            if trip.credit > 0:
+                self.outcome.refunds.append((trip.journey_id, trip.user_id, trip.credit, trip.journey_code))
+                credited.append((trip, index))
+
+        for ticket in self.outcome.tickets.values():
+            active = ticket["active"]
+            if active is not None:
+                ticket["active"] = {k: active[k] for k in ("journey_id", "check_in_station_id", "check_in_time")}
+        return credited
+
+
+def _claim_events(db: Session, taps, times: List[datetime], gate_id: str | None) -> Set[int]:
+    """Record taps that carry an event_id; returns the indexes of those already applied."""
+    ids = [(i, tap.event_id) for i, tap in enumerate(taps) if tap.event_id]
+    if not ids:
+        return set()
+    claimed = set(db.execute(_CLAIM_SQL, {
+        "ids": [eid for _, eid in ids],
+        "gates": [gate_id or "unknown"] * len(ids),
+        "codes": [taps[i].journey_code for i, _ in ids],
+        "stations": [taps[i].station_id for i, _ in ids],
+        "dirs": [taps[i].direction.upper() for i, _ in ids],
+        "taps": [times[i] for i, _ in ids],
+    }).scalars().all())
+    done, seen = set(), set()
+    for i, eid in ids:
+        if eid not in claimed or eid in seen:
+            done.add(i)
+        seen.add(eid)
+    return done
+
+
+def process_batch(db: Session, taps, resolver: RealFareResolver, gate_id: str | None = None) -> BatchOutcome:
+    """Apply `taps` (GateTap models) in order; caller commits."""
+    batch_now = datetime.now(timezone.utc)
+    times = [tap_time(tap.tapped_at, batch_now) for tap in taps]
+    done = _claim_events(db, taps, times, gate_id)
+    replay = _Replay(db, [(tap.journey_code, tap.station_id, tap.direction, now)
+                          for i, (tap, now) in enumerate(zip(taps, times)) if i not in done], resolver)
+    outcome = replay.outcome
+    tickets = outcome.tickets
+
+    for i, tap in enumerate(taps):
+        now = times[i]
+        if i in done:
+            outcome.results.append(_result(i, 200, "Tap already processed"))
+            continue
+        ticket = tickets.get(tap.journey_code)
+        if not ticket:
+            outcome.results.append(_result(i, 404, "Ticket not found"))
+            continue
+
+        direction = tap.direction.upper()
+        if direction == "IN":
+            try:
+                check_in_rules(ticket, tap.station_id, now, has_active_journey=ticket["active"] is not None)
+            except GateDenied as denied:
+                if denied.expire_ticket:
+                    ticket["status"] = "EXPIRED"
+                    replay.touch(ticket)
+                outcome.results.append(_result(i, denied.status_code, denied.message))
+                continue
+
+            replay.check_in(ticket, tap.station_id, now)
+            outcome.results.append(_result(i, 200, f"Welcome at {tap.station_id}"))
+
+        elif direction == "OUT":
+            if ticket["active"] is None:
+                if ticket["last_status"] in ["COMPLETED", "CLOSED"]:
+                    outcome.results.append(_result(i, 400, "Journey already closed (Double Check-out?)"))
+                else:
+                    outcome.results.append(_result(i, 400, "No ACTIVE journey found. Did you check in?"))
+                continue
+
+            decision = replay.check_out(ticket, tap.station_id, now, len(outcome.results))
+            if decision.status == "CANCELLED":
+                outcome.results.append(_result(i, 200, "Trip Cancelled (Same station exit). Usage reverted."))
+            elif decision.status == "PENALTY_DUE":
+                outcome.results.append(_result(
+                    i, 402,
+                    f"Penalty: {decision.penalty_reason}. Amount: {decision.penalty_amount:,.0f} VND",
+                    decision.penalty_amount,
+                ))
+            else:
+                outcome.results.append(_result(i, 200, "Thank you"))
+                outcome.receipts.append((ticket["user_id"], float(ticket["fare_amount"] or 0), ticket["ticket_code"]))
+        else:
+            outcome.results.append(_result(i, 422, f"Unknown direction {tap.direction}"))
+
+    for trip, index in replay.finish(db):
+        outcome.results[index]["message"] = f"Thank you. Fare cap reached: {trip.credit:,.0f} VND refunded"
+
+    claimed = [r for i, r in enumerate(outcome.results) if taps[i].event_id and i not in done]
+    if claimed:
+        db.execute(_EVENT_RESULT_SQL, [
+            {"id": taps[r["index"]].event_id, "result": f"HTTP_{r['status_code']}"} for r in claimed])
+    return outcome
+
+
+def _offline_flag(ticket, denied: GateDenied) -> str:
+    # check_in_rules order: status, expiry, trips left, station
+    if denied.expire_ticket:
+        return "EXPIRED"
+    if ticket["status"] != "ACTIVE":
+        return f"TICKET_{ticket['status']}"
+    if ticket["remaining_trips"] is not None and ticket["remaining_trips"] <= 0:
+        return "OVERUSED"
+    return "WRONG_STATION"
+
+
+def reconcile_events(db: Session, events, resolver: RealFareResolver) -> BatchOutcome:
+    """
+    Apply offline gate `events` (GateEvent models, tap order, tapped_at aware); caller commits.
+
+    Results are {"id": event_id, "result": ...}. A check-in the server would have
+    denied still opens the journey (the rider is inside) but is flagged; an
+    exhausted ticket is not charged another trip. Check-outs are decided exactly
+    as at an online gate.
+    """
+    replay = _Replay(db, [(e.journey_code, e.station_id, e.direction, e.tapped_at) for e in events], resolver)
+    outcome = replay.outcome
+    tickets = outcome.tickets
+
+    for e in events:
+        ticket = tickets.get(e.journey_code)
+        if not ticket:
+            outcome.results.append({"id": e.event_id, "result": "UNKNOWN_TICKET"})
+            continue
+
+        if e.direction.upper() == "IN":
+            if ticket["active"] is not None:
+                outcome.results.append({"id": e.event_id, "result": "ALREADY_IN"})
+                continue
+            result = "APPLIED"
+            try:
+                check_in_rules(ticket, e.station_id, e.tapped_at, has_active_journey=False)
+            except GateDenied as denied:
+                result = _offline_flag(ticket, denied)
+                if denied.expire_ticket:
+                    ticket["status"] = "EXPIRED"
+                    replay.touch(ticket)
+            replay.check_in(ticket, e.station_id, e.tapped_at)
+            outcome.results.append({"id": e.event_id, "result": result})
+        elif e.direction.upper() == "OUT":
+            if ticket["active"] is None:
+                outcome.results.append({"id": e.event_id, "result": "NO_ACTIVE_JOURNEY"})
+                continue
+            decision = replay.check_out(ticket, e.station_id, e.tapped_at, len(outcome.results))
+            result = "APPLIED" if decision.status == "COMPLETED" else decision.status
+            outcome.results.append({"id": e.event_id, "result": result})
+        else:
+            outcome.results.append({"id": e.event_id, "result": "UNKNOWN_DIRECTION"})
+
+    replay.finish(db)
+    return outcome
+
+
+def _write(db: Session, journeys: Dict[Any, Dict[str, Any]], dirty_tickets: Dict[Any, Dict[str, Any]]) -> None:
+    new = [j for j in journeys.values() if j.get("new")]
+    old = [j for j in journeys.values() if not j.get("new")]
+    db.execute(_WRITE_SQL, {
+        "n_jid": [j["journey_id"] for j in new],
+        "n_tid": [str(j["ticket_id"]) for j in new],
+        "n_uid": [str(j["user_id"]) for j in new],
+        "n_in_sid": [j["check_in_station_id"] for j in new],
+        "n_in_t": [j["check_in_time"] for j in new],
+        "n_out_sid": [j["check_out_station_id"] for j in new],
+        "n_out_t": [j["check_out_time"] for j in new],
+        "n_pen": [j["penalty_amount"] for j in new],
+        "n_reason": [j["penalty_reason"] for j in new],
+        "n_status": [j["status"] for j in new],
+        "u_jid": [str(j["journey_id"]) for j in old],
+        "u_out_sid": [j["check_out_station_id"] for j in old],
+        "u_out_t": [j["check_out_time"] for j in old],
+        "u_pen": [j["penalty_amount"] for j in old],
+        "u_reason": [j["penalty_reason"] for j in old],
+        "u_status": [j["status"] for j in old],
+        "t_id": [str(t["ticket_id"]) for t in dirty_tickets.values()],
+        "t_rem": [t["remaining_trips"] for t in dirty_tickets.values()],
+        "t_status": [t["status"] for t in dirty_tickets.values()],
+    })
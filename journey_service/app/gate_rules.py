@@ -0,0 +1,136 @@
+"""
+Pure gate decision rules shared by the single-tap endpoints and batch ingestion.
+
+The functions only look at ticket/journey rows (mappings) and return decisions;
+callers own all reads and writes.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from libs.fares import FareRuleSet
+
+
+class GateDenied(Exception):
+    def __init__(self, status_code: int, message: str, *, expire_ticket: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        # the ticket is past valid_until and should be persisted as EXPIRED
+        self.expire_ticket = expire_ticket
+
+
+@dataclass
+class CheckOutDecision:
+    status: str                  # CANCELLED, PENALTY_DUE, COMPLETED
+    penalty_amount: float = 0.0
+    penalty_reasons: List[str] = field(default_factory=list)
+    revert_trip: bool = False    # give the trip back to the ticket
+
+    @property
+    def penalty_reason(self) -> str:
+        return " & ".join(self.penalty_reasons)
+
+
+def _now_for(ts: datetime, now: datetime) -> datetime:
+    # compare like with like when the DB hands back naive timestamps
+    if ts.tzinfo is None:
+        return now.replace(tzinfo=None) if now.tzinfo else now
+    return now
+
+
+def _paid_exits(ticket) -> tuple:
+    """Stations the ticket was bought to exit at: the destination, and the origin too for a RETURN."""
+    if ticket["ticket_type"] == "RETURN":
+        return (ticket["destination_station_id"], ticket["origin_station_id"])
+    return (ticket["destination_station_id"],)
+
+
+def check_in_rules(ticket, station_id: str, now: datetime, *, has_active_journey: bool) -> None:
+    """Raise GateDenied if `ticket` may not enter at `station_id`."""
+    if ticket["status"] != 'ACTIVE':
+        raise GateDenied(400, f"Ticket is {ticket['status']}")
+
+    valid_until = ticket["valid_until"]
+    if valid_until and valid_until < _now_for(valid_until, now):
+        raise GateDenied(400, "Ticket EXPIRED", expire_ticket=True)
+
+    if ticket["remaining_trips"] is not None and ticket["remaining_trips"] <= 0:
+        raise GateDenied(400, "Ticket has no trips left")
+
+    # SINGLE: Must check-in at Origin
+    # RETURN: Must check-in at Origin or Destination
+    ticket_type = ticket["ticket_type"]
+    origin = ticket["origin_station_id"]
+    dest = ticket["destination_station_id"]
+
+    if ticket_type == "SINGLE":
+        if origin and station_id != origin:
+            raise GateDenied(400, f"Wrong Station! Ticket valid from {origin} only.")
+    elif ticket_type == "RETURN":
+        # max_trips == remaining_trips means the first leg has not been used yet
+        if ticket["max_trips"] == ticket["remaining_trips"]:
+            if origin and station_id != origin:
+                raise GateDenied(400, f"First leg must start at {origin}")
+        else:
+            if dest and station_id != dest:
+                raise GateDenied(400, f"Return leg must start at {dest}")
+
+    if has_active_journey:
+        raise GateDenied(400, "Ticket already used for entry. Please check out first.")
+
+
+def check_out_decision(
+    ticket,
+    journey,
+    station_id: str,
+    now: datetime,
+    real_fare: Callable[[str, str, datetime], Optional[float]],
+    rules: FareRuleSet,
+) -> CheckOutDecision:
+    """
+    Decide how an IN_PROGRESS `journey` ends at `station_id`.
+
+    `real_fare(from, to, trip_start)` returns the rider's discounted fare for the pair
+    actually travelled, in the time band of the check-in, or None when it cannot be
+    determined (no wrong-station penalty then).
+    Grace periods and penalty amounts come from `rules`.
+    """
+    check_in_time = journey["check_in_time"]
+
+    # same station exit: usage is always reverted
+    if journey["check_in_station_id"] == station_id:
+        duration_minutes = (_now_for(check_in_time, now) - check_in_time).total_seconds() / 60
+        if duration_minutes <= rules.same_station_grace_min:
+            return CheckOutDecision(status="CANCELLED", revert_trip=True)
+        return CheckOutDecision(
+            status="PENALTY_DUE",
+            penalty_amount=rules.same_station_penalty,
+            penalty_reasons=[f"Same Station Overstay > {rules.same_station_grace_min}m ({int(duration_minutes)}m)"],
+            revert_trip=True,
+        )
+
+    penalty_amount = 0.0
+    penalty_reasons: List[str] = []
+
+    # 1. Overstay
+    if check_in_time:
+        duration = (_now_for(check_in_time, now) - check_in_time).total_seconds() / 60
+        if duration > rules.overstay_limit_min:
+            penalty_amount = rules.overstay_penalty
+            penalty_reasons.append(f"Overstay > {rules.overstay_limit_min}m ({int(duration)}m)")
+
+    # 2. Wrong Station (only fares that depend on the pair travelled);
+    # exiting where the ticket goes is never a wrong station, whatever the band
+    if ticket["ticket_type"] in ["SINGLE", "RETURN"] and station_id not in _paid_exits(ticket):
+        paid = float(ticket["fare_amount"] or 0)
+        real_price = real_fare(journey["check_in_station_id"], station_id, check_in_time)
+        if real_price is not None and real_price > paid:
+            diff = real_price - paid
+            if penalty_amount < rules.overstay_penalty:
+                penalty_amount = max(penalty_amount, diff + rules.wrong_station_surcharge)
+                penalty_reasons.append(f"Fee Diff: {diff:,.0f}")
+
+    if penalty_amount > 0:
+        return CheckOutDecision(status="PENALTY_DUE", penalty_amount=penalty_amount, penalty_reasons=penalty_reasons)
+    return CheckOutDecision(status="COMPLETED")
@@ -1,10 +1,15 @@
+import logging
 from fastapi import FastAPI
+from libs.metrics import instrument_app
 from journey_service.app.api import router
 from journey_service.app.scheduler import start_scheduler
 
+logging.basicConfig(level=logging.INFO)
+
 app = FastAPI(title="Journey Service")
 
 app.include_router(router)
+instrument_app(app)
 
 @app.on_event("startup")
 def on_startup():
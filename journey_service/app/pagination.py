@@ -0,0 +1,26 @@
+"""Opaque keyset cursors: base64 of the (created_at, id) of the last row served."""
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+
+
+# sorts after every real row, so "no cursor" reads as the first page
+FIRST_PAGE: Tuple[str, str] = ("infinity", "ffffffff-ffff-ffff-ffff-ffffffffffff")
+
+
+def encode_cursor(created_at: datetime, row_id) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[str, str]:
+    """(created_at, id) to continue after; raises ValueError on a malformed cursor."""
+    if not cursor:
+        return FIRST_PAGE
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at).isoformat(), str(UUID(row_id))
+    except Exception:
+        raise ValueError("invalid cursor")
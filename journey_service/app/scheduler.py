@@ -1,7 +1,15 @@
+import logging
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from journey_service.app.db import SessionLocal
 from journey_service.app.api import process_missing_checkouts
+from journey_service.app.archiver import archive_journeys
+from journey_service.app.expiry import sweep_expired
+from journey_service.app import fare_caps, station_load
+from journey_service.app.fares import fare_rules, fare_table
+from journey_service.app.settings import settings
+
+logger = logging.getLogger(__name__)
 
 scheduler = BackgroundScheduler()
 
@@ -9,19 +17,77 @@ def job_wrapper():
     """
     Wraps the process_missing_checkouts logic with a manual DB session.
     """
-    print(f"[{datetime.now()}] Starting Scheduled Job: Process Missing Checkouts")
+    logger.info("Starting scheduled job: process missing check-outs")
     db = SessionLocal()
     try:
-        # process_missing_checkouts returns a dict, we can print it
+        # process_missing_checkouts returns a dict, we can log it
         result = process_missing_checkouts(db)
-        print(f"[{datetime.now()}] Job Completed: {result}")
+        logger.info("Job completed: %s", result)
+        # correct any drift in the live counters while we are at it
+        station_load.rebuild(db)
+    except Exception as e:
+        logger.exception("Job failed: %s", e)
+    finally:
+        db.close()
+
+def expiry_job():
+    db = SessionLocal()
+    try:
+        result = sweep_expired(db)
+        if result["expired"]:
+            logger.info("Expiry sweep: %s", result)
+    except Exception as e:
+        logger.exception("Expiry sweep failed: %s", e)
+    finally:
+        db.close()
+
+def archive_job():
+    db = SessionLocal()
+    try:
+        logger.info("Journey archiving: %s", archive_journeys(db))
+    except Exception as e:
+        logger.exception("Journey archiving failed: %s", e)
+    finally:
+        db.close()
+
+def refund_retry_job():
+    db = SessionLocal()
+    try:
+        result = fare_caps.retry_refunds(db, settings.FARE_CAP_REFUND_RETRY_SEC)
+        if result["owed"]:
+            logger.info("Fare cap refund retry: %s", result)
     except Exception as e:
-        print(f"[{datetime.now()}] Job Failed: {e}")
+        logger.exception("Fare cap refund retry failed: %s", e)
     finally:
         db.close()
 
+def fare_table_job():
+    try:
+        if fare_table.refresh():
+            logger.info("Fare table loaded (network version %s)", fare_table.version)
+    except Exception as e:
+        logger.warning("Fare table refresh failed: %s", e)
+    try:
+        if fare_rules.refresh():
+            logger.info("Fare rules loaded (network version %s)", fare_rules.version)
+    except Exception as e:
+        logger.warning("Fare rules refresh failed: %s", e)
+
 def start_scheduler():
     # Run every 1 hour (interval)
     scheduler.add_job(job_wrapper, 'interval', hours=1, id='process_missing_checkouts')
+    # A slow sweep is skipped rather than stacked
+    scheduler.add_job(expiry_job, 'interval', seconds=settings.EXPIRY_SWEEP_INTERVAL_SEC,
+                      id='expire_tickets', max_instances=1, coalesce=True)
+    scheduler.add_job(archive_job, 'interval', hours=settings.JOURNEY_ARCHIVE_INTERVAL_HOURS,
+                      id='archive_journeys', max_instances=1, coalesce=True)
+    scheduler.add_job(fare_table_job, 'interval', seconds=settings.FARE_TABLE_REFRESH_SEC,
+                      id='refresh_fare_table', max_instances=1, coalesce=True, next_run_time=datetime.now())
+    scheduler.add_job(refund_retry_job, 'interval', seconds=settings.FARE_CAP_REFUND_RETRY_SEC,
+                      id='retry_fare_cap_refunds', max_instances=1, coalesce=True)
     scheduler.start()
-    print("APScheduler started: process_missing_checkouts every 1 hour.")
+    logger.info("APScheduler started: process_missing_checkouts every 1 hour, "
+                "expire_tickets every %ss, archive_journeys every %sh, refresh_fare_table every %ss, "
+                "retry_fare_cap_refunds every %ss.",
+                settings.EXPIRY_SWEEP_INTERVAL_SEC, settings.JOURNEY_ARCHIVE_INTERVAL_HOURS,
+                settings.FARE_TABLE_REFRESH_SEC, settings.FARE_CAP_REFUND_RETRY_SEC)
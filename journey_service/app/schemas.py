@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 
 
@@ -14,6 +14,21 @@ class PurchaseResponse(BaseModel):
     journey_code: str
     fare_amount: float
     message:str
+    ticket_token: Optional[str] = None # signed payload for offline gate validation
+
+class BatchPurchaseItem(BaseModel):
+    from_station: str = Field(..., description="Departure Station")
+    to_station: str = Field(..., description="Arrival Station")
+    ticket_type: str = "SINGLE" # SINGLE, RETURN, DAY, MONTH
+    quantity: int = Field(1, ge=1)
+
+class BatchPurchaseRequest(BaseModel):
+    items: List[BatchPurchaseItem]
+
+class BatchPurchaseResponse(BaseModel):
+    tickets: List[PurchaseResponse]
+    total_amount: float
+    message: str
 
 #gate simulator
 
@@ -30,6 +45,53 @@ class PenaltyPaymentRequest(BaseModel):
     journey_code: str
     amount: float
 
+#batched gate taps
+class GateTap(BaseModel):
+    event_id: Optional[str] = Field(None, max_length=64, description="Gate-generated unique id; a re-uploaded tap is applied once")
+    journey_code: str
+    station_id: str
+    direction: str = Field(..., description="IN or OUT")
+    tapped_at: Optional[datetime] = None # defaults to the time the batch is processed
+
+class GateBatchRequest(BaseModel):
+    gate_id: Optional[str] = None
+    events: List[GateTap]
+
+class GateTapResult(BaseModel):
+    index: int
+    ok: bool
+    status_code: int
+    message: str
+    penalty_amount: Optional[float] = None
+
+class GateBatchResponse(BaseModel):
+    ok: bool
+    processed: int
+    results: List[GateTapResult]
+
+#offline gate reconciliation
+# lengths follow the gate_events columns
+class GateEvent(BaseModel):
+    event_id: str = Field(..., max_length=64, description="Gate-generated unique id")
+    journey_code: str = Field(..., max_length=20)
+    station_id: str = Field(..., max_length=10)
+    direction: Literal["IN", "OUT"]
+    tapped_at: datetime
+
+class GateReconcileRequest(BaseModel):
+    gate_id: str = Field(..., max_length=50)
+    events: List[GateEvent]
+
+class GateEventResult(BaseModel):
+    event_id: str
+    result: str
+
+class GateReconcileResponse(BaseModel):
+    ok: bool
+    applied: int
+    duplicates: int
+    results: List[GateEventResult]
+
 #history
 class JourneyHistoryItem(BaseModel):
     journey_id: UUID
@@ -53,6 +115,7 @@ class TicketItem(BaseModel):
     remaining_trips: Optional[int]
     valid_until: Optional[datetime]
     created_at: datetime
-    
+    ticket_token: Optional[str] = None
+
     class Config:
         orm_mode = True
\ No newline at end of file
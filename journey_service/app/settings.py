@@ -14,4 +14,49 @@ class Settings(BaseSettings):
     NOTIFICATION_SERVICE_URL: str = os.getenv("NOTIFICATION_SERVICE_URL", "http://notification_service:8080")
 
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
+    REDIS_POOL_SIZE: int = 10
+
+    # Hot ticket cache (gate lookups)
+    TICKET_CACHE_TTL_SEC: int = 900
+    TICKET_NEAR_CACHE_TTL_SEC: float = 2.0
+    TICKET_NEAR_CACHE_SIZE: int = 10000
+
+    # Signed ticket tokens (shared with gate controllers for offline validation)
+    TICKET_SIGNING_KEY: str = os.getenv("TICKET_SIGNING_KEY", "dev-ticket-key")
+
+    # Ticket code allocation (key must never change once codes are issued)
+    TICKET_CODE_KEY: str = os.getenv("TICKET_CODE_KEY", "dev-ticket-code-key")
+    TICKET_CODE_BLOCK_SIZE: int = 100
+
+    # Batched gate ingestion
+    GATE_BATCH_MAX_EVENTS: int = 1000
+
+    # Bulk / group purchases
+    PURCHASE_BATCH_MAX_TICKETS: int = 200
+
+    # Ticket expiry sweeper
+    EXPIRY_SWEEP_INTERVAL_SEC: int = 60
+    EXPIRY_SWEEP_BATCH_SIZE: int = 1000
+    EXPIRY_SWEEP_MAX_BATCHES: int = 50
+
+    # Journey cold storage (journeys_archive)
+    JOURNEY_ARCHIVE_AFTER_DAYS: int = 180
+    JOURNEY_ARCHIVE_BATCH_SIZE: int = 5000
+    JOURNEY_ARCHIVE_MAX_BATCHES: int = 100
+    JOURNEY_ARCHIVE_INTERVAL_HOURS: int = 24
+
+    # Ridership analytics
+    ANALYTICS_EXPORT_DIR: str = os.getenv("ANALYTICS_EXPORT_DIR", "/tmp/journey_analytics")
+    ANALYTICS_UTC_OFFSET_HOURS: int = 7
+
+    # Live station load counters (Redis)
+    STATION_LOAD_MAX_WINDOW_MIN: int = 120
+
+    # Local fare table (re-fetched when scheduler's network version changes)
+    FARE_TABLE_REFRESH_SEC: int = 30
+
+    # Fare capping periods (local day / Monday-first week)
+    FARE_CAP_UTC_OFFSET_HOURS: int = 7
+    # Unpaid cap refunds are retried this often (and once at least this old)
+    FARE_CAP_REFUND_RETRY_SEC: int = 300
 settings = Settings()
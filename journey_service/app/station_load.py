@@ -0,0 +1,109 @@
+"""
+Live station load kept as incremental counters in Redis.
+
+    load:inside             hash  station -> riders who entered there and have not left yet
+    load:min:<epoch minute> hash  "<station>:in" / "<station>:out" -> taps in that minute
+
+Every committed check-in / check-out adds its deltas in one pipelined round trip,
+so reading the current load is O(stations x window) Redis work and never touches
+Postgres. Counters are best effort (a failed write is only logged); `rebuild`
+resets the inside counts from the IN_PROGRESS journeys to undo any drift.
+"""
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from journey_service.app.settings import settings
+from journey_service.app.ticket_cache import _redis
+
+
+logger = logging.getLogger(__name__)
+
+
+_INSIDE_KEY = "load:inside"
+
+# (direction, station_id, entry_station_id, tapped_at); direction is IN, OUT, or
+# CLOSED for journeys ended without a tap (auto-penalty), which only release the rider
+LoadEvent = Tuple[str, Optional[str], Optional[str], Optional[datetime]]
+
+
+def _bucket_key(minute: int) -> str:
+    return f"load:min:{minute}"
+
+
+def record(events: Iterable[LoadEvent]) -> None:
+    """Apply committed taps: IN counts at its station, OUT/CLOSED release the rider's entry station."""
+    now_min = int(time.time() // 60)
+    oldest_min = now_min - settings.STATION_LOAD_MAX_WINDOW_MIN
+    ttl = settings.STATION_LOAD_MAX_WINDOW_MIN * 60 + 120
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        queued = False
+        for direction, station_id, entry_station_id, tapped_at in events:
+            if direction == "IN":
+                pipe.hincrby(_INSIDE_KEY, station_id, 1)
+            elif entry_station_id:
+                pipe.hincrby(_INSIDE_KEY, entry_station_id, -1)
+
+            minute = int(tapped_at.timestamp() // 60) if tapped_at else now_min
+            # late (offline) taps still settle the inside counts but are too old for throughput
+            if direction in ("IN", "OUT") and oldest_min <= minute <= now_min:
+                bucket = _bucket_key(minute)
+                pipe.hincrby(bucket, f"{station_id}:{direction.lower()}", 1)
+                pipe.expire(bucket, ttl)
+            queued = True
+        if queued:
+            pipe.execute()
+    except Exception as e:
+        logger.warning("Station load update failed: %s", e)
+
+
+def current_load(window_minutes: int) -> Dict[str, Any]:
+    """Riders inside per entry station plus entries/exits over the last `window_minutes`."""
+    window_minutes = max(1, min(window_minutes, settings.STATION_LOAD_MAX_WINDOW_MIN))
+    now_min = int(time.time() // 60)
+
+    pipe = _redis().pipeline(transaction=False)
+    pipe.hgetall(_INSIDE_KEY)
+    for minute in range(now_min - window_minutes + 1, now_min + 1):
+        pipe.hgetall(_bucket_key(minute))
+    inside, *buckets = pipe.execute()
+
+    stations: Dict[str, Dict[str, int]] = {}
+
+    def station(sid: str) -> Dict[str, int]:
+        return stations.setdefault(sid, {"inside": 0, "entries": 0, "exits": 0})
+
+    for sid, count in inside.items():
+        station(sid)["inside"] = max(0, int(count))
+    for bucket in buckets:
+        for field, count in bucket.items():
+            sid, _, direction = field.rpartition(":")
+            station(sid)["entries" if direction == "in" else "exits"] += int(count)
+
+    return {
+        "as_of": datetime.fromtimestamp(now_min * 60, tz=timezone.utc).isoformat(),
+        "window_minutes": window_minutes,
+        "total_inside": sum(s["inside"] for s in stations.values()),
+        "stations": dict(sorted(stations.items())),
+    }
+
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Reset the inside counts from Postgres (uses the IN_PROGRESS partial index)."""
+    rows = db.execute(text("""
+        SELECT check_in_station_id, count(*) FROM journeys
+        WHERE status = 'IN_PROGRESS'
+        GROUP BY check_in_station_id
+    """)).all()
+    counts = {sid: n for sid, n in rows}
+    pipe = _redis().pipeline(transaction=True)
+    pipe.delete(_INSIDE_KEY)
+    if counts:
+        pipe.hset(_INSIDE_KEY, mapping=counts)
+    pipe.execute()
+    return counts
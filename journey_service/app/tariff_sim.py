@@ -0,0 +1,210 @@
+"""
+Replays historical journeys against a candidate tariff.
+
+Both tariffs are compiled FareRuleSets (libs/fares): the current one from
+scheduler's /internal/fares/rules, the candidate as the same JSON with any
+fields overridden (time_bands, zone_fares, base_fare, ...). Each is expanded
+into a fare cube [band, from, to] over the fare matrix stations, then a day of
+journeys (analytics JourneyFrame) is priced with two fancy-index gathers; no
+per-journey Python.
+
+Only completed single/return journeys are priced (passes are flat-priced), at
+the standard fare: passenger discounts apply equally to both tariffs and are
+left out. Frames exported before ticket types were recorded price every journey.
+
+    python -m journey_service.app.tariff_sim --candidate peak.json --days 2024-05-01 2024-05-02
+    python -m journey_service.app.tariff_sim --synthetic 10000000
+"""
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from libs.fares import FareRuleSet
+from journey_service.app.analytics import (
+    JourneyFrame, STATUS_CODES, TICKET_TYPES, _synthetic_frame, export_path, load_frame,
+)
+from journey_service.app.settings import settings
+
+
+_COMPLETED = STATUS_CODES.index("COMPLETED")
+_PAIR_PRICED = [TICKET_TYPES.index("SINGLE"), TICKET_TYPES.index("RETURN")]
+
+
+def candidate_rules(current: FareRuleSet, overrides: Dict[str, Any]) -> FareRuleSet:
+    """`current` with the fields in `overrides` (to_dict format) replaced."""
+    return FareRuleSet.from_dict({**current.to_dict(), **overrides})
+
+
+def fare_cube(rules: FareRuleSet, stations: Sequence[str], distance_km: Sequence[Sequence]) -> np.ndarray:
+    """float64 [1 + bands, n, n]: [0] = base tariff, [i + 1] = time_bands[i]; NaN = no line."""
+    n = len(stations)
+    cube = np.full((1 + len(rules.time_bands), n, n), np.nan)
+    for band_index, band in enumerate((None,) + rules.time_bands):
+        grid = cube[band_index]
+        for i, a in enumerate(stations):
+            for j, b in enumerate(stations):
+                dist = distance_km[i][j]
+                if dist is not None:
+                    grid[i, j] = rules.fare(dist, a, b, band)
+    return cube
+
+
+def band_codes(rules: FareRuleSet, check_in: np.ndarray, utc_offset_hours: int) -> np.ndarray:
+    """int8 per journey: 0 = no band, i + 1 = time_bands[i] (first match wins, as in band_at)."""
+    local = check_in + utc_offset_hours * 3600
+    minute = (local % 86400) // 60
+    weekday = (local // 86400 + 3) % 7     # 1970-01-01 was a Thursday; Monday = 0
+    codes = np.zeros(len(check_in), dtype=np.int8)
+    for i in range(len(rules.time_bands) - 1, -1, -1):
+        band = rules.time_bands[i]
+        days = np.array([c == "1" for c in band.days])
+        hit = days[weekday] & (minute >= band.start_min) & (minute < band.end_min)
+        codes[hit] = i + 1
+    return codes
+
+
+def _percentiles(values: np.ndarray) -> Dict[str, float]:
+    if not len(values):
+        return {}
+    p = np.percentile(values, [5, 50, 95])
+    return {"p5": round(float(p[0]), 1), "p50": round(float(p[1]), 1), "p95": round(float(p[2]), 1)}
+
+
+def simulate(frame: JourneyFrame, matrix: Dict[str, Any], current: FareRuleSet, candidate: FareRuleSet,
+             utc_offset_hours: int = None, top: int = 10) -> Dict[str, Any]:
+    """Revenue of `frame` under both tariffs; `matrix` is scheduler's compact fare matrix."""
+    if utc_offset_hours is None:
+        utc_offset_hours = settings.ANALYTICS_UTC_OFFSET_HOURS
+    stations: List[str] = matrix["stations"]
+    n = len(stations)
+
+    # frame station codes -> matrix indices (-1 = station no longer in the network)
+    index = {sid: i for i, sid in enumerate(stations)}
+    remap = np.array([index.get(str(sid), -1) for sid in frame.stations] + [-1], dtype=np.int32)
+    origin = remap[frame.check_in_station]      # -1 codes pick the trailing -1
+    dest = remap[frame.check_out_station]
+
+    keep = (frame.status == _COMPLETED) & (origin >= 0) & (dest >= 0)
+    if frame.ticket_type is not None and (frame.ticket_type >= 0).any():
+        keep &= np.isin(frame.ticket_type, _PAIR_PRICED)
+    origin, dest, check_in = origin[keep], dest[keep], frame.check_in[keep]
+
+    result: Dict[str, Any] = {"journeys": int(len(origin)), "unpriced": 0}
+    fares = {}
+    for name, rules in (("current", current), ("candidate", candidate)):
+        cube = fare_cube(rules, stations, matrix["distance_km"])
+        bands = band_codes(rules, check_in, utc_offset_hours)
+        fares[name] = cube[bands, origin, dest]
+        fares[name + "_bands"] = bands
+
+    priced = ~(np.isnan(fares["current"]) | np.isnan(fares["candidate"]))
+    result["unpriced"] = int((~priced).sum())
+    cur, cand = fares["current"][priced], fares["candidate"][priced]
+    origin, dest = origin[priced], dest[priced]
+
+    cur_total, cand_total = float(cur.sum()), float(cand.sum())
+    result["current_revenue"] = cur_total
+    result["candidate_revenue"] = cand_total
+    result["delta"] = cand_total - cur_total
+    result["delta_pct"] = round(100 * (cand_total - cur_total) / cur_total, 2) if cur_total else None
+
+    change = cand - cur
+    pct = change[cur > 0] / cur[cur > 0] * 100
+    result["per_journey_change_pct"] = _percentiles(pct)
+    result["share_paying_more"] = round(float((change > 0).mean()), 4) if len(change) else 0.0
+    result["share_paying_less"] = round(float((change < 0).mean()), 4) if len(change) else 0.0
+
+    # revenue by candidate band
+    cand_bands = fares["candidate_bands"][priced]
+    names = ["(none)"] + [b.name for b in candidate.time_bands]
+    counts = np.bincount(cand_bands, minlength=len(names))
+    cur_by = np.bincount(cand_bands, weights=cur, minlength=len(names))
+    cand_by = np.bincount(cand_bands, weights=cand, minlength=len(names))
+    result["by_band"] = [
+        {"band": names[i], "journeys": int(counts[i]),
+         "current_revenue": float(cur_by[i]), "candidate_revenue": float(cand_by[i])}
+        for i in range(len(names)) if counts[i]
+    ]
+
+    # origin-destination pairs that move the most revenue
+    pair_delta = np.bincount(origin.astype(np.int64) * n + dest, weights=change, minlength=n * n)
+    order = np.argsort(-np.abs(pair_delta))[:top]
+    result["top_pairs"] = [
+        {"from_station": stations[k // n], "to_station": stations[k % n], "delta": float(pair_delta[k])}
+        for k in order if pair_delta[k]
+    ]
+    return result
+
+
+def load_frames(paths: Sequence[str]) -> JourneyFrame:
+    """Concatenate exported days, re-encoding stations onto one shared code table."""
+    frames = [load_frame(p) for p in paths]
+    stations = np.unique(np.concatenate([f.stations for f in frames]))
+    parts = {k: [] for k in ("check_in_station", "check_out_station", "check_in", "check_out", "status", "ticket_type")}
+    for f in frames:
+        codes = np.append(np.searchsorted(stations, f.stations), -1).astype(np.int16)
+        parts["check_in_station"].append(codes[f.check_in_station])
+        parts["check_out_station"].append(codes[f.check_out_station])
+        for k in ("check_in", "check_out", "status", "ticket_type"):
+            parts[k].append(getattr(f, k))
+    return JourneyFrame(stations=stations, **{k: np.concatenate(v) for k, v in parts.items()})
+
+
+# --- benchmark ---------------------------------------------------------------
+
+def _synthetic_matrix(stations: Sequence[str]) -> Dict[str, Any]:
+    pos = np.cumsum(np.random.default_rng(1).uniform(0.8, 2.5, len(stations)))
+    distance = np.round(np.abs(pos[:, None] - pos[None, :]), 3)
+    return {"version": 0, "stations": list(stations), "distance_km": distance.tolist()}
+
+
+def _benchmark(count: int, candidate: Optional[Dict[str, Any]]) -> None:
+    import time as _time
+
+    frame = _synthetic_frame(count, stations=40)
+    matrix = _synthetic_matrix([str(s) for s in frame.stations])
+    current = FareRuleSet()
+    candidate = candidate_rules(current, candidate or {
+        "time_bands": [
+            {"name": "AM_PEAK", "start": "07:00", "end": "09:00", "multiplier": 1.2, "days": "1111100"},
+            {"name": "PM_PEAK", "start": "17:00", "end": "19:00", "multiplier": 1.2, "days": "1111100"},
+            {"name": "OFF_PEAK", "start": "00:00", "end": "00:00", "multiplier": 0.9},
+        ],
+    })
+    started = _time.perf_counter()
+    result = simulate(frame, matrix, current, candidate, utc_offset_hours=7)
+    elapsed = _time.perf_counter() - started
+    print(json.dumps(result, indent=2))
+    print(f"{count:,} journeys simulated in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import date
+
+    parser = argparse.ArgumentParser(description="Replay exported journeys against a candidate tariff")
+    parser.add_argument("--candidate", help="JSON file of FareRuleSet fields to override")
+    parser.add_argument("--days", nargs="*", default=[], help="exported days (YYYY-MM-DD, see analytics.export_day)")
+    parser.add_argument("--frames", nargs="*", default=[], help="exported .npz files")
+    parser.add_argument("--synthetic", type=int, help="benchmark on N synthetic journeys instead")
+    args = parser.parse_args()
+
+    overrides = None
+    if args.candidate:
+        with open(args.candidate) as f:
+            overrides = json.load(f)
+
+    if args.synthetic:
+        _benchmark(args.synthetic, overrides)
+    else:
+        from journey_service.app.clients.scheduler_client import SchedulerClient
+
+        paths = list(args.frames) + [export_path(date.fromisoformat(d)) for d in args.days]
+        if not paths:
+            parser.error("give --days, --frames or --synthetic")
+        client = SchedulerClient()
+        current = FareRuleSet.from_dict(client.fare_rules()[1])
+        matrix = client.fare_matrix()[1]
+        result = simulate(load_frames(paths), matrix, current, candidate_rules(current, overrides or {}))
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,204 @@
+"""Write-through cache of gate state keyed by ticket_code.
+
+A gate state is the ticket row fields the gate rules need, plus a pointer to the
+ticket's IN_PROGRESS journey (``active``) and the status of its latest journey
+(``last_status``). Lookups go near-cache (per process, very short TTL) -> Redis
+-> Postgres; every state transition in the gate endpoints writes the new state
+back (or invalidates it when the new state is not known).
+
+The cache only serves reads. Writes stay guarded by the database (conditional
+UPDATEs and the unique IN_PROGRESS-journey index), so a stale entry can at worst
+cause a retryable rejection, never a double entry.
+"""
+
+from __future__ import annotations
+
+import logging
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+import redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from libs.metrics import cache_lookup
+from journey_service.app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+_STATE_SQL = """
+    SELECT t.ticket_id, t.ticket_code, t.user_id, t.ticket_type, t.fare_amount,
+           t.origin_station_id, t.destination_station_id, t.status,
+           t.remaining_trips, t.max_trips, t.valid_until,
+           a.journey_id AS active_journey_id,
+           a.check_in_station_id AS active_station_id,
+           a.check_in_time AS active_check_in_time,
+           l.status AS last_status
+    FROM tickets t
+    LEFT JOIN journeys a ON a.ticket_id = t.ticket_id AND a.status = 'IN_PROGRESS'
+    LEFT JOIN LATERAL (
+        SELECT status FROM journeys
+        WHERE ticket_id = t.ticket_id
+        ORDER BY created_at DESC LIMIT 1
+    ) l ON true
+    WHERE t.ticket_code = ANY(:codes)
+"""
+_STATE_QUERY = text(_STATE_SQL)
+_STATE_QUERY_FOR_UPDATE = text(_STATE_SQL + " FOR UPDATE OF t")
+
+
+def load_gate_states(db: Session, codes: List[str], *, for_update: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Read gate states for `codes` straight from Postgres in one query."""
+    if not codes:
+        return {}
+    states: Dict[str, Dict[str, Any]] = {}
+    query = _STATE_QUERY_FOR_UPDATE if for_update else _STATE_QUERY
+    for row in db.execute(query, {"codes": codes}).mappings().all():
+        state = {k: row[k] for k in (
+            "ticket_id", "ticket_code", "user_id", "ticket_type", "fare_amount",
+            "origin_station_id", "destination_station_id", "status",
+            "remaining_trips", "max_trips", "valid_until", "last_status",
+        )}
+        state["active"] = None
+        if row["active_journey_id"] is not None:
+            state["active"] = {
+                "journey_id": row["active_journey_id"],
+                "check_in_station_id": row["active_station_id"],
+                "check_in_time": row["active_check_in_time"],
+            }
+        states[row["ticket_code"]] = state
+    return states
+
+
+# --- serialization ---------------------------------------------------------
+
+def _default(o: Any) -> Any:
+    if isinstance(o, datetime):
+        return {"$dt": o.isoformat()}
+    if isinstance(o, (UUID,)):
+        return str(o)
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"not serializable: {type(o)}")
+
+
+def _hook(d: Dict[str, Any]) -> Any:
+    if len(d) == 1 and "$dt" in d:
+        return datetime.fromisoformat(d["$dt"])
+    return d
+
+
+def _encode(state: Dict[str, Any]) -> str:
+    return json.dumps(state, default=_default, separators=(",", ":"))
+
+
+def _decode(raw: str) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_hook)
+
+
+# --- near cache -------------------------------------------------------------
+
+class _NearCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._data: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if self._ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self._ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_near = _NearCache(settings.TICKET_NEAR_CACHE_SIZE, settings.TICKET_NEAR_CACHE_TTL_SEC)
+
+
+@lru_cache()
+def _redis() -> redis.Redis:
+    return redis.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        max_connections=settings.REDIS_POOL_SIZE,
+        socket_connect_timeout=1,
+        socket_timeout=1,
+    )
+
+
+def _key(code: str) -> str:
+    return f"gate:ticket:{code}"
+
+
+# --- public API -------------------------------------------------------------
+
+def get_gate_state(db: Session, code: str, *, fresh: bool = False) -> Optional[Dict[str, Any]]:
+    """Gate state for `code`, or None if the ticket does not exist. `fresh` bypasses the caches."""
+    if not fresh:
+        state = _near.get(code)
+        cache_lookup("ticket_near", state is not None)
+        if state is not None:
+            return dict(state)
+        try:
+            raw = _redis().get(_key(code))
+        except Exception:
+            raw = None
+        cache_lookup("ticket_redis", raw is not None)
+        if raw is not None:
+            state = _decode(raw)
+            _near.put(code, state)
+            return dict(state)
+
+    state = load_gate_states(db, [code]).get(code)
+    if state is not None:
+        put_gate_state(state)
+    return dict(state) if state is not None else None
+
+
+def put_gate_state(state: Dict[str, Any]) -> None:
+    """Write-through after a committed transition."""
+    code = state["ticket_code"]
+    _near.put(code, dict(state))
+    try:
+        _redis().setex(_key(code), settings.TICKET_CACHE_TTL_SEC, _encode(state))
+    except Exception as e:
+        logger.warning("Ticket cache write failed: %s", e)
+
+
+def invalidate(codes: Iterable[str]) -> None:
+    codes = [c for c in codes if c]
+    if not codes:
+        return
+    for code in codes:
+        _near.pop(code)
+    try:
+        _redis().delete(*[_key(c) for c in codes])
+    except Exception as e:
+        logger.warning("Ticket cache invalidation failed: %s", e)
@@ -0,0 +1,282 @@
+"""
+Query-plan regression check for the journey service.
+
+Collects every SQL literal passed to ``text()`` in the app modules, seeds a large synthetic dataset, EXPLAINs each statement and fails when a plan
+reads one of the big tables with a sequential scan. Seeding, ANALYZE and the
+EXPLAINs all run in one transaction that is rolled back, so it is safe to point
+at any database with the migrations applied (e.g. the db_journey container):
+
+    python -m journey_service.db.explain_check --tickets 200000 --journeys 1000000
+
+Statements with placeholders need a sample value; array parameters written as
+``CAST(:x AS type[])`` get one automatically, scalar ones are listed in
+``_samples()``. A new placeholder name makes the check fail until it is added.
+"""
+import argparse
+import ast
+import json
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+# every module of the app, so new statements are checked without registering them
+MODULES = sorted(p.name for p in APP_DIR.glob("*.py"))
+WATCHED_TABLES = {"tickets", "journeys", "gate_events", "journeys_archive", "rider_spend", "fare_cap_refunds"}
+
+_ARRAY_PARAM = re.compile(r"CAST\(:(\w+) AS (\w+)\[\]\)", re.IGNORECASE)
+_PARAM = re.compile(r"(?<![:\w]):(\w+)")
+
+
+# --- statement discovery ----------------------------------------------------
+
+def _string(node: ast.AST, consts: Dict[str, str]) -> Optional[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        return consts.get(node.id)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _string(node.left, consts), _string(node.right, consts)
+        if left is not None and right is not None:
+            return left + right
+    # "<sql>".replace("a", "b"), used to derive one statement from another
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "replace" and len(node.args) == 2):
+        base = _string(node.func.value, consts)
+        old, new = (_string(arg, consts) for arg in node.args)
+        if base is not None and old is not None and new is not None:
+            return base.replace(old, new)
+    return None
+
+
+def _is_text_call(node: ast.AST) -> bool:
+    if not isinstance(node, ast.Call) or not node.args:
+        return False
+    func = node.func
+    return (isinstance(func, ast.Name) and func.id == "text") or (
+        isinstance(func, ast.Attribute) and func.attr == "text"
+    )
+
+
+def collect_statements(modules: List[str]) -> Iterator[Tuple[str, Optional[str]]]:
+    """Yield (location, sql) for every text(...) call; sql is None when it is not a literal."""
+    for name in modules:
+        tree = ast.parse((APP_DIR / name).read_text(), filename=name)
+
+        consts: Dict[str, str] = {}
+        for stmt in tree.body:
+            if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+                value = _string(stmt.value, consts)
+                if value is not None:
+                    consts[stmt.targets[0].id] = value
+
+        for node in ast.walk(tree):
+            if _is_text_call(node):
+                yield f"{name}:{node.lineno}", _string(node.args[0], consts)
+
+
+# --- dataset ----------------------------------------------------------------
+
+_SEED_SQL = [
+    """
+    INSERT INTO tickets (ticket_id, user_id, ticket_code, ticket_type, fare_amount,
+                         origin_station_id, destination_station_id, status,
+                         remaining_trips, max_trips, valid_from, valid_until, created_at)
+    SELECT CAST(md5('t' || g) AS uuid),
+           CAST(md5('u' || (g % :users)) AS uuid),
+           'X' || lpad(g::text, 9, '0'),
+           (ARRAY['SINGLE', 'RETURN', 'DAY', 'MONTH'])[1 + g % 4],
+           15000,
+           'S' || lpad((1 + g % 14)::text, 2, '0'),
+           'S' || lpad((1 + (g + 5) % 14)::text, 2, '0'),
+           CASE WHEN g % 10 = 0 THEN 'ACTIVE' WHEN g % 10 < 8 THEN 'USED' ELSE 'EXPIRED' END,
+           1, 1,
+           NOW() - make_interval(secs => g % 31536000),
+           NOW() - make_interval(secs => g % 31536000) + INTERVAL '1 day',
+           NOW() - make_interval(secs => g % 31536000)
+    FROM generate_series(0, :tickets - 1) AS g
+    """,
+    # ticket g % tickets; the first 1% of rows are the (distinct) IN_PROGRESS journeys
+    """
+    INSERT INTO journeys (journey_id, ticket_id, user_id, check_in_station_id, check_in_time,
+                          check_out_station_id, check_out_time, penalty_amount, status, created_at)
+    SELECT CAST(md5('j' || g) AS uuid),
+           CAST(md5('t' || (g % :tickets)) AS uuid),
+           CAST(md5('u' || ((g % :tickets) % :users)) AS uuid),
+           'S' || lpad((1 + g % 14)::text, 2, '0'),
+           NOW() - make_interval(secs => (g * 37) % 31536000),
+           CASE WHEN g < :tickets / 100 THEN NULL ELSE 'S' || lpad((1 + (g + 3) % 14)::text, 2, '0') END,
+           CASE WHEN g < :tickets / 100 THEN NULL ELSE NOW() - make_interval(secs => (g * 37) % 31536000 - 1800) END,
+           CASE WHEN g % 97 = 0 THEN 50000 ELSE 0 END,
+           CASE WHEN g < :tickets / 100 THEN 'IN_PROGRESS'
+                WHEN g % 97 = 0 THEN 'PENALTY_DUE'
+                WHEN g % 13 = 0 THEN 'CANCELLED'
+                ELSE 'COMPLETED' END,
+           NOW() - make_interval(secs => (g * 37) % 31536000)
+    FROM generate_series(0, :journeys - 1) AS g
+    """,
+    """
+    INSERT INTO gate_events (event_id, gate_id, ticket_code, station_id, direction, tapped_at, result)
+    SELECT 'E' || g, 'G' || (g % 50), 'X' || lpad((g % :tickets)::text, 9, '0'),
+           'S' || lpad((1 + g % 14)::text, 2, '0'), (ARRAY['IN', 'OUT'])[1 + g % 2],
+           NOW() - make_interval(secs => g), 'APPLIED'
+    FROM generate_series(0, :events - 1) AS g
+    """,
+    # 30 days of DAY aggregates per rider
+    """
+    INSERT INTO rider_spend (user_id, period, period_start, spent, charged)
+    SELECT CAST(md5('u' || (g % :users)) AS uuid), 'DAY', CURRENT_DATE - g / :users, 15000, 15000
+    FROM generate_series(0, :users * 30 - 1) AS g
+    """,
+    # one capped trip in a hundred; 1% of those still unpaid
+    """
+    INSERT INTO fare_cap_refunds (journey_id, user_id, amount, journey_code, created_at, refunded_at)
+    SELECT CAST(md5('j' || (g * 100)) AS uuid), CAST(md5('u' || (g % :users)) AS uuid), 5000,
+           'X' || lpad((g % :tickets)::text, 9, '0'),
+           NOW() - make_interval(secs => g * 60),
+           CASE WHEN g % 100 = 0 THEN NULL ELSE NOW() - make_interval(secs => g * 60) END
+    FROM generate_series(0, :journeys / 100 - 1) AS g
+    """,
+]
+
+
+def seed(conn, tickets: int, journeys: int, events: int, users: int) -> Dict[str, Any]:
+    params = {"tickets": tickets, "journeys": journeys, "events": events, "users": users}
+    for sql in _SEED_SQL:
+        conn.execute(text(sql), params)
+    conn.execute(text("ANALYZE tickets, journeys, gate_events, rider_spend, fare_cap_refunds"))
+    return dict(conn.execute(text(
+        "SELECT ticket_id, user_id, ticket_code FROM tickets WHERE ticket_code = 'X000000001'"
+    )).mappings().one())
+
+
+# --- sample parameters -----------------------------------------------------
+
+def _samples(ticket: Dict[str, Any]) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return {
+        "uid": str(ticket["user_id"]),
+        "tid": str(ticket["ticket_id"]),
+        "id": str(ticket["ticket_id"]),
+        "jid": str(ticket["ticket_id"]),
+        "code": ticket["ticket_code"],
+        "codes": [ticket["ticket_code"]],
+        "type": "SINGLE",
+        "fare": 15000,
+        "origin": "S01",
+        "dest": "S05",
+        "rem": 1,
+        "max": 1,
+        "sid": "S01",
+        "s": "S05",
+        "st": "COMPLETED",
+        "p": 0,
+        "r": "explain",
+        "note": "explain",
+        "t": now,
+        "result": "APPLIED",
+        "n": 1,
+        "c_at": "infinity",
+        "c_id": "ffffffff-ffff-ffff-ffff-ffffffffffff",
+        "limit": 51,
+        "statuses": ["ACTIVE"],
+        "cutoff": now,
+        "start": now - timedelta(days=1),
+        "end": now,
+        "min_age": 300,
+    }
+
+
+_ARRAY_SAMPLES = {
+    "uuid": lambda ticket, now: str(ticket["ticket_id"]),
+    "varchar": lambda ticket, now: "S01",
+    "timestamptz": lambda ticket, now: now,
+    "numeric": lambda ticket, now: 0,
+    "int": lambda ticket, now: 1,
+    "date": lambda ticket, now: now.date(),
+}
+
+
+def bind_params(sql: str, ticket: Dict[str, Any]) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    params: Dict[str, Any] = {}
+    for name, elem_type in _ARRAY_PARAM.findall(sql):
+        params[name] = [_ARRAY_SAMPLES[elem_type.lower()](ticket, now)]
+    samples = _samples(ticket)
+    for name in _PARAM.findall(sql):
+        if name in params:
+            continue
+        if name not in samples:
+            raise KeyError(f"no sample value for :{name}; add it to _samples()")
+        params[name] = samples[name]
+    return params
+
+
+# --- plans ------------------------------------------------------------------
+
+def seq_scans(plan: Dict[str, Any]) -> List[str]:
+    found = []
+    relation = plan.get("Relation Name") or ""
+    # archive partitions are named journeys_archive_YYYY_MM
+    if plan.get("Node Type") == "Seq Scan" and relation.split("_20")[0] in WATCHED_TABLES:
+        found.append(relation)
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def run(database_url: str, tickets: int, journeys: int, events: int, users: int) -> int:
+    engine = create_engine(database_url, future=True)
+    failures = 0
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            print(f"Seeding {tickets:,} tickets, {journeys:,} journeys, {events:,} gate events ...")
+            ticket = seed(conn, tickets, journeys, events, users)
+
+            for location, sql in collect_statements(MODULES):
+                if sql is None:
+                    print(f"SKIP  {location}  (not a string literal)")
+                    continue
+                summary = " ".join(sql.split())[:90]
+                try:
+                    params = bind_params(sql, ticket)
+                    # a failing statement must not abort the seeded transaction
+                    with conn.begin_nested():
+                        plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params).scalar()
+                except Exception as e:
+                    failures += 1
+                    print(f"ERROR {location}  {summary}\n      {e}")
+                    continue
+
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scans = seq_scans(plan[0]["Plan"])
+                if scans:
+                    failures += 1
+                    print(f"FAIL  {location}  seq scan on {', '.join(sorted(set(scans)))}\n      {summary}")
+                else:
+                    print(f"OK    {location}  {summary}")
+        finally:
+            trans.rollback()
+
+    print(f"{failures} statement(s) failed" if failures else "All plans use indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    from journey_service.app.settings import settings
+
+    parser = argparse.ArgumentParser(description="EXPLAIN every journey service statement against a large seeded dataset")
+    parser.add_argument("--database-url", default=settings.JOURNEY_DATABASE_URL)
+    parser.add_argument("--tickets", type=int, default=200_000)
+    parser.add_argument("--journeys", type=int, default=1_000_000)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    args = parser.parse_args()
+    sys.exit(run(args.database_url, args.tickets, args.journeys, args.events, args.users))
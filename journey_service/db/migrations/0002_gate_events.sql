@@ -0,0 +1,13 @@
+-- Gate events uploaded by gate controllers (offline admissions, reconciled later)
+CREATE TABLE IF NOT EXISTS gate_events (
+    event_id        VARCHAR(64) PRIMARY KEY,      -- gate-generated, makes uploads idempotent
+    gate_id         VARCHAR(50) NOT NULL,
+    ticket_code     VARCHAR(20) NOT NULL,
+    station_id      VARCHAR(10) NOT NULL,
+    direction       VARCHAR(3)  NOT NULL,         -- IN, OUT
+    tapped_at       TIMESTAMP WITH TIME ZONE NOT NULL,
+    result          VARCHAR(30),                  -- APPLIED, OVERUSED, UNKNOWN_TICKET, ...
+    received_at     TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX idx_gate_events_ticket ON gate_events(ticket_code, tapped_at);
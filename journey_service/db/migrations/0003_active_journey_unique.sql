@@ -0,0 +1,4 @@
+-- At most one IN_PROGRESS journey per ticket. Gate reads may come from the
+-- ticket cache, so the database is what guarantees no double entry.
+DROP INDEX IF EXISTS idx_active_journey;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_active_journey ON journeys(ticket_id) WHERE status = 'IN_PROGRESS';
@@ -0,0 +1,6 @@
+-- Counter behind the collision-free ticket code allocator (journey_service/app/ticket_codes.py).
+-- Workers lease blocks of values; each value maps to exactly one code.
+CREATE SEQUENCE IF NOT EXISTS ticket_code_seq MINVALUE 0 START WITH 0;
+
+-- ticket_code is UNIQUE, which already creates the lookup index.
+DROP INDEX IF EXISTS idx_ticket_code;
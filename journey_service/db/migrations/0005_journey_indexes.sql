@@ -0,0 +1,16 @@
+-- Indexes matching how journeys are actually read.
+
+-- Penalty lookup at the gate: WHERE ticket_id = :tid AND status = 'PENALTY_DUE'
+CREATE INDEX IF NOT EXISTS idx_journey_penalty_due ON journeys(ticket_id) WHERE status = 'PENALTY_DUE';
+
+-- Latest journey of a ticket (double check-out detection, gate state):
+-- WHERE ticket_id = :tid ORDER BY created_at DESC LIMIT 1, answered index-only.
+CREATE INDEX IF NOT EXISTS idx_journey_ticket_created ON journeys(ticket_id, created_at DESC) INCLUDE (status);
+
+-- The composite index above serves every ticket_id lookup (and the FK), so the
+-- single-column one is dead weight on every insert.
+DROP INDEX IF EXISTS idx_journey_ticket;
+
+-- Missing check-out job: WHERE status = 'IN_PROGRESS' AND check_in_time < ...
+CREATE INDEX IF NOT EXISTS idx_journey_in_progress_checkin ON journeys(check_in_time)
+    INCLUDE (ticket_id, journey_id) WHERE status = 'IN_PROGRESS';
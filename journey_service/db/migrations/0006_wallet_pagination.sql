@@ -0,0 +1,18 @@
+-- Keyset pagination for the ticket wallet and journey history.
+-- Pages are read as WHERE user_id = :uid AND (created_at, id) < cursor
+-- ORDER BY created_at DESC, id DESC LIMIT n, straight off these indexes.
+
+CREATE INDEX IF NOT EXISTS idx_ticket_user_created ON tickets(user_id, created_at DESC, ticket_id DESC);
+-- "only ACTIVE tickets" must not walk years of expired passes
+CREATE INDEX IF NOT EXISTS idx_ticket_user_active ON tickets(user_id, created_at DESC, ticket_id DESC) WHERE status = 'ACTIVE';
+DROP INDEX IF EXISTS idx_ticket_user;
+
+-- History used to join every journey of every ticket the user ever bought
+-- before sorting; owning the user_id on the journey lets it page directly.
+ALTER TABLE journeys ADD COLUMN IF NOT EXISTS user_id UUID;
+UPDATE journeys j SET user_id = t.user_id
+FROM tickets t
+WHERE t.ticket_id = j.ticket_id AND j.user_id IS NULL;
+ALTER TABLE journeys ALTER COLUMN user_id SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_journey_user_created ON journeys(user_id, created_at DESC, journey_id DESC);
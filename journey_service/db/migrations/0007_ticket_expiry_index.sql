@@ -0,0 +1,3 @@
+-- Expiry sweeper (journey_service/app/expiry.py):
+-- WHERE status = 'ACTIVE' AND valid_until < NOW() ORDER BY valid_until LIMIT n
+CREATE INDEX IF NOT EXISTS idx_ticket_status_valid_until ON tickets(status, valid_until);
@@ -0,0 +1,31 @@
+-- Cold storage for finished journeys (journey_service/app/archiver.py).
+-- Monthly range partitions are created by the archiver as it needs them, so old
+-- months can later be detached or dropped wholesale.
+CREATE TABLE IF NOT EXISTS journeys_archive (
+    journey_id              UUID NOT NULL,
+    ticket_id               UUID NOT NULL,
+    user_id                 UUID NOT NULL,
+
+    check_in_station_id     VARCHAR(10) NOT NULL,
+    check_in_time           TIMESTAMP WITH TIME ZONE,
+
+    check_out_station_id    VARCHAR(10),
+    check_out_time          TIMESTAMP WITH TIME ZONE,
+
+    penalty_amount          NUMERIC(12,2) DEFAULT 0,
+    penalty_reason          VARCHAR(255),
+
+    status                  VARCHAR(20) NOT NULL,
+
+    created_at              TIMESTAMP WITH TIME ZONE NOT NULL,
+    archived_at             TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    PRIMARY KEY (journey_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- History fallback pages the archive exactly like the hot table
+CREATE INDEX IF NOT EXISTS idx_journey_archive_user_created ON journeys_archive(user_id, created_at DESC, journey_id DESC);
+
+-- Oldest archivable journeys first, without touching IN_PROGRESS / PENALTY_DUE rows
+CREATE INDEX IF NOT EXISTS idx_journey_archivable ON journeys(created_at)
+    WHERE status IN ('COMPLETED', 'CANCELLED', 'CLOSED');
@@ -0,0 +1,4 @@
+-- Day-range scans for the analytics export (journey_service/app/analytics.py).
+-- Journeys are appended in created_at order, so a BRIN index narrows a day to a
+-- few block ranges for a few KB of index and next to no insert cost.
+CREATE INDEX IF NOT EXISTS brin_journey_created ON journeys USING brin (created_at);
@@ -0,0 +1,20 @@
+-- Running pay-per-trip spend per rider and capping period (fare_caps.py).
+-- Upserted on every completed SINGLE / RETURN journey, so the capping decision
+-- at check-out reads one row per period instead of the rider's history.
+--   spent   = fares of the trips taken in the period (what tickets cost)
+--   charged = what the rider ends up paying after the cap
+--   credited = refunds issued (spent - charged)
+CREATE TABLE IF NOT EXISTS rider_spend (
+    user_id         UUID NOT NULL,
+    period          VARCHAR(10) NOT NULL,      -- DAY, WEEK
+    period_start    DATE NOT NULL,             -- local date; Monday for WEEK
+    spent           NUMERIC NOT NULL DEFAULT 0,
+    charged         NUMERIC NOT NULL DEFAULT 0,
+    credited        NUMERIC NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, period, period_start)
+);
+
+-- old periods are only kept for support lookups; prune with
+--   DELETE FROM rider_spend WHERE period_start < CURRENT_DATE - 60
+CREATE INDEX IF NOT EXISTS idx_rider_spend_period_start ON rider_spend(period_start);
@@ -0,0 +1,15 @@
+-- Fare cap refunds owed to riders (fare_caps.py). Written in the check-out
+-- transaction together with rider_spend.credited, paid to the wallet after the
+-- commit and marked refunded_at; a scheduler job retries the ones left unpaid.
+-- The journey id is the wallet credit's idempotency key.
+CREATE TABLE IF NOT EXISTS fare_cap_refunds (
+    journey_id      UUID PRIMARY KEY,
+    user_id         UUID NOT NULL,
+    amount          NUMERIC NOT NULL,
+    journey_code    VARCHAR(20) NOT NULL,
+    attempts        INT NOT NULL DEFAULT 0,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    refunded_at     TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_fare_cap_refunds_owed ON fare_cap_refunds(created_at) WHERE refunded_at IS NULL;
@@ -0,0 +1,3 @@
+from .rules import DEFAULT_RULES, FareRuleSet, PassProduct, TimeBand
+
+__all__ = ["DEFAULT_RULES", "FareRuleSet", "PassProduct", "TimeBand"]
@@ -0,0 +1,182 @@
+"""Compiled fare rules shared by scheduler_service (which builds them) and journey_service.
+
+A ``FareRuleSet`` is an immutable, versioned snapshot of every pricing input:
+distance or zone pricing, time-of-day bands, passenger discounts, pass products,
+fare caps and penalties. Scheduler compiles it from its tables once per network version
+and serves it as JSON (``to_dict``); consumers rebuild it with ``from_dict`` and
+swap the whole object, so evaluation is a few attribute and dict reads with no
+locking.
+
+``DEFAULT_RULES`` holds the values used before the first rule set is loaded.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PassProduct:
+    price: float
+    max_trips: int
+
+
+@dataclass(frozen=True)
+class TimeBand:
+    """Multiplier on pair fares for taps in [start_min, end_min) local time on the days in `days`."""
+    name: str
+    start_min: int
+    end_min: int
+    multiplier: float
+    days: str = "1111111"   # Monday first
+
+    def applies(self, weekday: int, minute_of_day: int) -> bool:
+        return self.days[weekday] == "1" and self.start_min <= minute_of_day < self.end_min
+
+
+def _clock(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _minutes(value: str) -> int:
+    hours, mins = value.split(":")[:2]
+    return int(hours) * 60 + int(mins)
+
+
+def _optional_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+@dataclass(frozen=True)
+class FareRuleSet:
+    version: int = 0
+
+    # distance pricing: base + km * price, rounded up to round_to
+    base_fare: float = 12000.0
+    price_per_km: float = 2000.0
+    round_to: float = 1000.0
+    min_balance: float = 20000.0
+
+    # zone pricing: used instead of distance when both stations have a zone;
+    # zone_fares[n] = fare for crossing n zone boundaries (the largest n covers more)
+    zones: Mapping[str, int] = field(default_factory=lambda: MappingProxyType({}))
+    zone_fares: Mapping[int, float] = field(default_factory=lambda: MappingProxyType({}))
+
+    # first matching band wins; no match = multiplier 1
+    time_bands: Tuple[TimeBand, ...] = ()
+
+    # passenger type -> price multiplier (unknown types pay full price)
+    discounts: Mapping[str, float] = field(default_factory=lambda: MappingProxyType(
+        {"STANDARD": 1.0, "STUDENT": 0.5, "ELDERLY": 0.0}))
+    # flat-priced ticket types
+    passes: Mapping[str, PassProduct] = field(default_factory=lambda: MappingProxyType(
+        {"DAY": PassProduct(40000.0, 100), "MONTH": PassProduct(200000.0, 1000)}))
+
+    # pay-per-trip fare caps per local day / Monday-first week, before the passenger
+    # discount; None = no cap (also until the first rule set is loaded)
+    daily_cap: Optional[float] = None
+    weekly_cap: Optional[float] = None
+
+    # penalties
+    same_station_grace_min: int = 15
+    same_station_penalty: float = 5000.0
+    wrong_station_surcharge: float = 10000.0
+    overstay_limit_min: int = 240
+    overstay_penalty: float = 50000.0
+
+    def band_at(self, when: datetime) -> Optional[TimeBand]:
+        """The time band a (local) tap time falls in, if any."""
+        minute = when.hour * 60 + when.minute
+        weekday = when.weekday()
+        for band in self.time_bands:
+            if band.applies(weekday, minute):
+                return band
+        return None
+
+    def pair_price(self, distance_km: float, from_station: str = None, to_station: str = None) -> float:
+        """Unrounded single-trip price before time bands and discounts."""
+        if self.zone_fares and from_station in self.zones and to_station in self.zones:
+            crossed = min(abs(self.zones[from_station] - self.zones[to_station]), max(self.zone_fares))
+            return self.zone_fares.get(crossed, max(self.zone_fares.values()))
+        return self.base_fare + distance_km * self.price_per_km
+
+    def fare(self, distance_km: float, from_station: str = None, to_station: str = None,
+             band: Optional[TimeBand] = None) -> float:
+        price = self.pair_price(distance_km, from_station, to_station) * (band.multiplier if band else 1.0)
+        return math.ceil(price / self.round_to) * self.round_to
+
+    def distance_fare(self, distance_km: float) -> float:
+        return self.fare(distance_km)
+
+    def discount(self, amount: float, passenger_type: str) -> float:
+        return amount * self.discounts.get(passenger_type, 1.0)
+
+    def pass_product(self, ticket_type: str) -> Optional[PassProduct]:
+        return self.passes.get(ticket_type)
+
+    def caps(self, passenger_type: str) -> Tuple[float, float]:
+        """(daily, weekly) cap for a passenger type; inf where there is none."""
+        return tuple(
+            self.discount(cap, passenger_type) if cap is not None else math.inf
+            for cap in (self.daily_cap, self.weekly_cap)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "base_fare": self.base_fare,
+            "price_per_km": self.price_per_km,
+            "round_to": self.round_to,
+            "min_balance": self.min_balance,
+            "zones": dict(self.zones),
+            "zone_fares": {str(k): v for k, v in self.zone_fares.items()},
+            "time_bands": [
+                {"name": b.name, "start": _clock(b.start_min), "end": _clock(b.end_min),
+                 "multiplier": b.multiplier, "days": b.days}
+                for b in self.time_bands
+            ],
+            "discounts": dict(self.discounts),
+            "passes": {k: {"price": p.price, "max_trips": p.max_trips} for k, p in self.passes.items()},
+            "daily_cap": self.daily_cap,
+            "weekly_cap": self.weekly_cap,
+            "same_station_grace_min": self.same_station_grace_min,
+            "same_station_penalty": self.same_station_penalty,
+            "wrong_station_surcharge": self.wrong_station_surcharge,
+            "overstay_limit_min": self.overstay_limit_min,
+            "overstay_penalty": self.overstay_penalty,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "FareRuleSet":
+        return cls(
+            version=int(data["version"]),
+            base_fare=float(data["base_fare"]),
+            price_per_km=float(data["price_per_km"]),
+            round_to=float(data.get("round_to", 1000)),
+            min_balance=float(data["min_balance"]),
+            zones=MappingProxyType({k: int(v) for k, v in data.get("zones", {}).items()}),
+            zone_fares=MappingProxyType({int(k): float(v) for k, v in data.get("zone_fares", {}).items()}),
+            time_bands=tuple(
+                TimeBand(b["name"], _minutes(b["start"]), _minutes(b["end"]) or 24 * 60, float(b["multiplier"]),
+                         b.get("days", "1111111"))
+                for b in data.get("time_bands", ())
+            ),
+            discounts=MappingProxyType({k: float(v) for k, v in data["discounts"].items()}),
+            passes=MappingProxyType({
+                k: PassProduct(float(p["price"]), int(p["max_trips"])) for k, p in data["passes"].items()
+            }),
+            daily_cap=_optional_float(data.get("daily_cap")),
+            weekly_cap=_optional_float(data.get("weekly_cap")),
+            same_station_grace_min=int(data["same_station_grace_min"]),
+            same_station_penalty=float(data["same_station_penalty"]),
+            wrong_station_surcharge=float(data["wrong_station_surcharge"]),
+            overstay_limit_min=int(data["overstay_limit_min"]),
+            overstay_penalty=float(data["overstay_penalty"]),
+        )
+
+
+DEFAULT_RULES = FareRuleSet()
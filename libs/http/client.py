@@ -10,6 +10,9 @@ import os
 import time
 import uuid
 from typing import Any, Dict, Optional, TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from libs.metrics import count_retry, observe_upstream
 
 try:
     import httpx
@@ -38,6 +41,16 @@ def _build_url(base_url: str, url: str) -> str:
     return f"{base_url.rstrip('/')}/{url.lstrip('/')}"
 
 
+def _outcome(resp: Any, exc: Optional[Exception]) -> str:
+    """Metric label for a finished call: status code, or the error type when there is no response."""
+    if resp is not None:
+        return str(resp.status_code)
+    response = getattr(exc, "response", None)
+    if response is not None:
+        return str(response.status_code)
+    return type(exc).__name__ if exc is not None else "unknown"
+
+
 class HttpClient:
     def __init__(
         self,
@@ -78,24 +91,32 @@ class HttpClient:
         attempts = max(1, retries or self.retries)
         last_exc: Optional[Exception] = None
         full_url = _build_url(self.base_url, url)
-        for attempt in range(attempts):
-            try:
-                resp = self._client.request(
-                    method,
-                    full_url,
-                    params=params,
-                    json=json,
-                    headers=self._headers(headers, correlation_id),
-                )
-                resp.raise_for_status()
-                return resp
-            except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as ex:
-                last_exc = ex
-                if attempt >= attempts - 1:
-                    raise
-                time.sleep(BACKOFF_FACTOR * (2 ** attempt))
-        assert last_exc is not None
-        raise last_exc
+        upstream = urlsplit(full_url).netloc
+        started = time.perf_counter()
+        resp = None
+        try:
+            for attempt in range(attempts):
+                try:
+                    resp = self._client.request(
+                        method,
+                        full_url,
+                        params=params,
+                        json=json,
+                        headers=self._headers(headers, correlation_id),
+                    )
+                    resp.raise_for_status()
+                    return resp
+                except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as ex:
+                    last_exc = ex
+                    resp = None
+                    if attempt >= attempts - 1:
+                        raise
+                    count_retry(upstream)
+                    time.sleep(BACKOFF_FACTOR * (2 ** attempt))
+            assert last_exc is not None
+            raise last_exc
+        finally:
+            observe_upstream(upstream, method, _outcome(resp, last_exc), time.perf_counter() - started)
 
     def get(self, url: str, **kwargs: Any) -> ResponseT:
         return self.request("GET", url, **kwargs)
@@ -165,24 +186,32 @@ class AsyncHttpClient:
         attempts = max(1, retries or self.retries)
         last_exc: Optional[Exception] = None
         full_url = _build_url(self.base_url, url)
-        for attempt in range(attempts):
-            try:
-                resp = await self._client.request(
-                    method,
-                    full_url,
-                    params=params,
-                    json=json,
-                    headers=self._headers(headers, correlation_id),
-                )
-                resp.raise_for_status()
-                return resp
-            except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as ex:
-                last_exc = ex
-                if attempt >= attempts - 1:
-                    raise
-                await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
-        assert last_exc is not None
-        raise last_exc
+        upstream = urlsplit(full_url).netloc
+        started = time.perf_counter()
+        resp = None
+        try:
+            for attempt in range(attempts):
+                try:
+                    resp = await self._client.request(
+                        method,
+                        full_url,
+                        params=params,
+                        json=json,
+                        headers=self._headers(headers, correlation_id),
+                    )
+                    resp.raise_for_status()
+                    return resp
+                except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as ex:
+                    last_exc = ex
+                    resp = None
+                    if attempt >= attempts - 1:
+                        raise
+                    count_retry(upstream)
+                    await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+            assert last_exc is not None
+            raise last_exc
+        finally:
+            observe_upstream(upstream, method, _outcome(resp, last_exc), time.perf_counter() - started)
 
     async def get(self, url: str, **kwargs: Any) -> ResponseT:
         return await self.request("GET", url, **kwargs)
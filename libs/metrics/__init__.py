@@ -0,0 +1,19 @@
+"""Prometheus metrics shared by the services."""
+
+from .prometheus import (
+    cache_lookup,
+    count_retry,
+    instrument_app,
+    observe_request,
+    observe_upstream,
+    track_engine,
+)
+
+__all__ = [
+    "cache_lookup",
+    "count_retry",
+    "instrument_app",
+    "observe_request",
+    "observe_upstream",
+    "track_engine",
+]
@@ -0,0 +1,169 @@
+"""Prometheus instrumentation shared by every service.
+
+- ``instrument_app(app)``: per-endpoint latency histogram (labelled with the
+  route template, not the raw path) and a ``/metrics`` endpoint.
+- ``observe_upstream``: inter-service call latencies, fed by libs.http clients.
+- ``track_engine(engine, name)``: SQLAlchemy pool usage, read at scrape time.
+- ``cache_lookup(cache, hit)``: hit / miss counters; the hit ratio is
+  ``rate(cache_requests_total{result="hit"}) / rate(cache_requests_total)``.
+
+prometheus_client is optional: without it every metric is a no-op and
+``/metrics`` answers 503, so scripts and tests run unchanged.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+try:
+    import prometheus_client as prom
+    from prometheus_client.core import GaugeMetricFamily
+except Exception:  # pragma: no cover
+    prom = None  # type: ignore
+    GaugeMetricFamily = None  # type: ignore
+
+
+# request latencies in seconds: 5ms .. 10s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoopMetric:
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+
+def _histogram(name: str, doc: str, labels: Tuple[str, ...]):
+    if prom is None:
+        return _NoopMetric()
+    return prom.Histogram(name, doc, labels, buckets=LATENCY_BUCKETS)
+
+
+def _counter(name: str, doc: str, labels: Tuple[str, ...]):
+    if prom is None:
+        return _NoopMetric()
+    return prom.Counter(name, doc, labels)
+
+
+REQUEST_LATENCY = _histogram(
+    "http_request_duration_seconds", "Latency of requests served, by route template",
+    ("method", "route", "status"))
+UPSTREAM_LATENCY = _histogram(
+    "upstream_request_duration_seconds", "Latency of outgoing service calls, retries included",
+    ("upstream", "method", "outcome"))
+UPSTREAM_RETRIES = _counter(
+    "upstream_retries_total", "Outgoing service calls retried after a failed attempt", ("upstream",))
+CACHE_REQUESTS = _counter(
+    "cache_requests_total", "Cache lookups by result (hit / miss)", ("cache", "result"))
+
+
+# --- endpoints ----------------------------------------------------------------
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(seconds)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request until its last body chunk is sent."""
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # the router stores the matched route in the (shared) scope;
+            # unmatched paths are folded together to keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            observe_request(scope["method"], route, status[0], time.perf_counter() - started)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """(body, content type) of the current metrics in the Prometheus text format."""
+    return prom.generate_latest(), prom.CONTENT_TYPE_LATEST
+
+
+def instrument_app(app, path: str = "/metrics") -> None:
+    """Time every request of a FastAPI `app` and serve the metrics at `path`."""
+    from starlette.responses import Response
+
+    app.add_middleware(MetricsMiddleware)
+
+    def metrics():
+        if prom is None:
+            return Response("prometheus_client is not installed\n", status_code=503, media_type="text/plain")
+        body, content_type = metrics_payload()
+        return Response(body, media_type=content_type)
+
+    app.add_api_route(path, metrics, methods=["GET"], include_in_schema=False)
+
+
+# --- upstream calls -----------------------------------------------------------
+
+def observe_upstream(upstream: str, method: str, outcome: str, seconds: float) -> None:
+    """`outcome` is the final status code, or the exception name when there was no response."""
+    UPSTREAM_LATENCY.labels(upstream, method, outcome).observe(seconds)
+
+
+def count_retry(upstream: str) -> None:
+    UPSTREAM_RETRIES.labels(upstream).inc()
+
+
+# --- caches -------------------------------------------------------------------
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+# --- database pools -----------------------------------------------------------
+
+_engines: List[Tuple[str, Any]] = []
+
+
+class _PoolCollector:
+    """Reads pool counters of every tracked engine when Prometheus scrapes."""
+
+    def collect(self):
+        families = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["pool"]),
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["pool"]),
+            "checked_in": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["pool"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections opened above the pool size", labels=["pool"]),
+        }
+        for name, engine in _engines:
+            pool = engine.pool
+            for key, read in (("size", "size"), ("checked_out", "checkedout"),
+                              ("checked_in", "checkedin"), ("overflow", "overflow")):
+                reader: Optional[Callable[[], int]] = getattr(pool, read, None)
+                if reader is not None:
+                    # QueuePool counts overflow from -size up
+                    families[key].add_metric([name], max(0, reader()))
+        return list(families.values())
+
+
+def track_engine(engine, name: str) -> None:
+    """Export the pool usage of a SQLAlchemy `engine` as db_pool_* gauges labelled `name`."""
+    if prom is None:
+        return
+    if not _engines:
+        prom.REGISTRY.register(_PoolCollector())
+    _engines.append((name, engine))
@@ -1,3 +1,4 @@
 from .jwt import verify_and_decode
+from .ticket_token import sign_ticket_token, verify_ticket_token, check_entry
 
-__all__ = ["verify_and_decode"]
\ No newline at end of file
+__all__ = ["verify_and_decode", "sign_ticket_token", "verify_ticket_token", "check_entry"]
@@ -0,0 +1,107 @@
+"""Compact signed ticket tokens for offline gate validation.
+
+Token format: ``<b64url(json payload)>.<b64url(truncated HMAC-SHA256)>``.
+The payload uses short keys to keep QR codes small:
+
+- ``c``: ticket code
+- ``t``: ticket type (SINGLE, RETURN, DAY, MONTH)
+- ``o`` / ``d``: origin / destination station (null for passes)
+- ``vf`` / ``vu``: validity window as epoch seconds
+- ``n``: number of trips (null = unlimited)
+
+Gates hold the HMAC key and can admit riders without calling journey_service;
+taps are uploaded later for reconciliation.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+SIG_BYTES = 16
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(segment: str) -> bytes:
+    padding = "=" * (-len(segment) % 4)
+    return base64.urlsafe_b64decode(segment + padding)
+
+
+def _resolve_key(key: Optional[str]) -> bytes:
+    secret = key if key is not None else os.getenv("TICKET_SIGNING_KEY")
+    if not secret:
+        raise ValueError("ticket signing key not configured; set TICKET_SIGNING_KEY or pass key")
+    return secret.encode("utf-8")
+
+
+def _sign(payload_b64: str, secret: bytes) -> bytes:
+    return hmac.new(secret, payload_b64.encode("ascii"), hashlib.sha256).digest()[:SIG_BYTES]
+
+
+def sign_ticket_token(claims: Dict[str, Any], *, key: Optional[str] = None) -> str:
+    """Serialize and sign ticket claims (see module docstring for keys)."""
+    payload_b64 = _b64url(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload_b64}.{_b64url(_sign(payload_b64, _resolve_key(key)))}"
+
+
+def verify_ticket_token(token: str, *, key: Optional[str] = None, now: Optional[int] = None, leeway: int = 0) -> Dict[str, Any]:
+    """
+    Verify signature and validity window; return the claims.
+
+    Raises ValueError on a bad format, bad signature, or a token outside `vf`..`vu`.
+    """
+    try:
+        payload_b64, sig_b64 = token.split(".")
+    except ValueError:
+        raise ValueError("invalid token format")
+
+    if not hmac.compare_digest(_sign(payload_b64, _resolve_key(key)), _b64url_decode(sig_b64)):
+        raise ValueError("invalid signature")
+
+    try:
+        claims: Dict[str, Any] = json.loads(_b64url_decode(payload_b64))
+    except Exception as ex:
+        raise ValueError("invalid payload") from ex
+
+    ts = int(time.time()) if now is None else int(now)
+    if claims.get("vf") is not None and int(claims["vf"]) - leeway > ts:
+        raise ValueError("ticket not yet valid")
+    if claims.get("vu") is not None and int(claims["vu"]) + leeway < ts:
+        raise ValueError("ticket expired")
+    return claims
+
+
+def check_entry(claims: Dict[str, Any], station_id: str, *, trips_used: int = 0) -> None:
+    """
+    Apply the gate's entry rules to verified claims, mirroring journey_service check-in.
+
+    `trips_used` is the gate's local count of entries already made with this ticket.
+    Raises ValueError with a rider-facing reason when entry must be refused.
+    """
+    max_trips = claims.get("n")
+    if max_trips is not None and trips_used >= int(max_trips):
+        raise ValueError("Ticket has no trips left")
+
+    ticket_type = claims.get("t")
+    origin = claims.get("o")
+    dest = claims.get("d")
+    if ticket_type == "SINGLE":
+        if origin and station_id != origin:
+            raise ValueError(f"Wrong Station! Ticket valid from {origin} only.")
+    elif ticket_type == "RETURN":
+        if trips_used == 0:
+            if origin and station_id != origin:
+                raise ValueError(f"First leg must start at {origin}")
+        elif dest and station_id != dest:
+            raise ValueError(f"Return leg must start at {dest}")
+
+
+__all__ = ["sign_ticket_token", "verify_ticket_token", "check_entry"]
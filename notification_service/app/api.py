@@ -1,3 +1,4 @@
+import logging
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -6,6 +7,8 @@ from fastapi import APIRouter, HTTPException, status
 from notification_service.app.settings import settings
 from notification_service.app.schemas import SendReceiptRequest
 
+logger = logging.getLogger("notification_service")
+
 router = APIRouter()
 
 @router.post("/internal/post/notification/send_receipt", status_code=status.HTTP_202_ACCEPTED)
@@ -14,12 +17,12 @@ def send_receipt(req: SendReceiptRequest):
         _send_email_receipt(req)
         return {"ok": True, "message": "Email queued"}
     except Exception as e:
-        print(f"Email error: {e}")
+        logger.error("Email error: %s", e)
         return {"ok": False, "message": str(e)}
 
 def _send_email_receipt(req: SendReceiptRequest):
     if settings.DRY_RUN:
-        print(f"[DRY RUN] Sending email to {req.email}: {req.amount}đ")
+        logger.info("[DRY RUN] Sending email to %s: %sđ", req.email, req.amount)
         return
 
     subject = f"Biên lai chuyến đi MetroFlow - {req.journey_code}"
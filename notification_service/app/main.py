@@ -3,6 +3,8 @@ import sys
 import threading
 from fastapi import FastAPI
 
+from libs.metrics import instrument_app
+
 logger = logging.getLogger("notification_service")
 logger.setLevel(logging.INFO)
 
@@ -21,6 +23,7 @@ def create_app() -> FastAPI:
     
     from notification_service.app.api import router
     app.include_router(router)
+    instrument_app(app)
 
     return app
 
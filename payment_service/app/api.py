@@ -19,9 +19,9 @@ def log_transaction(req: TransactionCreate, db: Session = Depends(get_db)):
     new_id = str(uuid.uuid4())
     sql = text("""
         INSERT INTO transactions (
-            transaction_id, user_id, ticket_id, amount, type, description, 
+            transaction_id, user_id, ticket_id, ticket_ids, amount, type, description, 
             created_at) VALUES (
-            :id, :uid, :tid, :amt, :type, :desc, NOW()
+            :id, :uid, :tid, CAST(:tids AS uuid[]), :amt, :type, :desc, NOW()
             ) RETURNING transaction_id, created_at
     """)
 
@@ -38,6 +38,7 @@ def log_transaction(req: TransactionCreate, db: Session = Depends(get_db)):
         "id": new_id,
         "uid": req.user_id,
         "tid": req.ticket_id,
+        "tids": req.ticket_ids,
         "amt": final_amount,
         "type": req.type,
         "desc": req.description
@@ -6,6 +6,7 @@ from typing import Generator
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
+from libs.metrics import track_engine
 from payment_service.app.settings import settings
 
 
@@ -17,6 +18,7 @@ engine = create_engine(
     echo=settings.DB_ECHO,
     future=True,
 )
+track_engine(engine, "payment")
 
 # Session factory
 SessionLocal = sessionmaker(
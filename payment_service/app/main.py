@@ -2,6 +2,7 @@
 import threading
 from fastapi import FastAPI
 
+from libs.metrics import instrument_app
 from payment_service.app.api import router as api_router
 
 
@@ -11,6 +12,7 @@ logging.basicConfig(level=logging.INFO)
 def create_app() -> FastAPI:
     app = FastAPI(title="payment_service")
     app.include_router(api_router)
+    instrument_app(app)
 
     return app
 
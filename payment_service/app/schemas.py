@@ -1,14 +1,15 @@
 from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 import datetime
 
 class TransactionCreate(BaseModel):
     user_id: str
     amount: float
-    type: str = "TICKET_PAYMENT" #TICKET_PAYMENT, TOP_UP, PENALTY
+    type: str = "TICKET_PAYMENT" #TICKET_PAYMENT, TOP_UP, PENALTY, FARE_CAP_REFUND
     ticket_id: Optional[str] = None
+    ticket_ids: Optional[List[str]] = None   # every ticket of a batch purchase
     description: Optional[str] = None
 
 class TransactionResponse(BaseModel):
@@ -0,0 +1,3 @@
+-- Batch purchases log one transaction for all their tickets (journey_service
+-- /ticket/purchase/batch); ticket_id stays set for single-ticket transactions.
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS ticket_ids UUID[];
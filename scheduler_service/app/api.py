@@ -1,114 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from datetime import datetime, timedelta, time
+from datetime import date, datetime, time
+import hashlib
 import math
+from libs.metrics import cache_lookup
+from scheduler_service.app import stop_times
+from scheduler_service.app.planner import planner
+from scheduler_service.app.pricing import FareTables, current_rules, current_tables
+from scheduler_service.app.snapshot import network
 from scheduler_service.app.db import get_db
+from scheduler_service.app.settings import settings
 from scheduler_service.app.schemas import (
     MetroLine, Station,
     RouteSearchRequest, FareResponse,
     InternalFareRequest, InternalFareResponse,
-    StationScheduleResponse, NextTrainInfo
+    StationScheduleResponse, NextTrainInfo,
+    FareMatrixResponse, NetworkVersionResponse,
+    DepartureInfo, StationDeparturesResponse, JourneyLeg,
+    NearbyStation, StationMatch
 )
 
 router = APIRouter()
 @router.get("/lines", response_model=list[MetroLine])
 def get_lines(db: Session = Depends(get_db)):
-    result = db.execute(text("SELECT * FROM metro_lines ORDER BY line_id"))
-    return result.mappings().all()
+    return list(network.current(db).lines)
 
 @router.get("/stations", response_model = list[Station])
 def get_stations(line_id: str | None = None, db: Session = Depends(get_db)):
-
+    snapshot = network.current(db)
     if line_id:
-        sql = text(
-            """
-            SELECT s.* FROM stations s
-            JOIN line_stations ls ON s.station_id = ls.station_id
-            WHERE ls.line_id = :lid AND s.is_active = true
-            ORDER BY ls.station_order
-        """
-        )
-        result = db.execute(sql,{"lid": line_id})
-    else: 
-        sql = text("SELECT * FROM stations WHERE is_active = true ORDER BY station_id")
-        result = db.execute(sql)
-
-    return result.mappings().all()
-
-def _calculate_fare_logic(db: Session, from_station: str, to_station: str) -> dict:
-
-    #tim tuyen chung va khoang cach giua 2 ga
-    #logic: tim dong trong line_stations ma 2 ga cung thuoc 1 line
-    sql_dist = text("""
-        SELECT
-            ls1.line_id,
-            ABS(ls1.distance_km - ls2.distance_km) as distance,
-            ABS(ls1.station_order - ls2.station_order) as stops
-        FROM line_stations ls1
-        JOIN line_stations ls2 ON ls1.line_id = ls2.line_id
-        WHERE ls1.station_id = :s1 AND ls2.station_id = :s2
-        LIMIT 1
-    """)
-    row = db.execute(sql_dist, {"s1": from_station, "s2": to_station}).mappings().first()
-
-    if not row:
-        raise HTTPException(404, "Can not found line between 2 stations")
-    
-    distance = float(row["distance"])
+        return list(snapshot.stations_on_line(line_id))
+    return list(snapshot.active_stations)
 
-    rule = db.execute(text("SELECT * FROM fare_rules LIMIT 1")).mappings().first()
-    if not rule:
-        base_fare = 12000
-        price_per_km = 2000
-    else:
-        base_fare = float(rule["base_fare"])
-        price_per_km = float(rule["price_per_km"])
+@router.get("/stations/nearby", response_model=list[NearbyStation])
+def get_nearby_stations(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1),
+    radius_m: float | None = Query(None, gt=0),
+    db: Session = Depends(get_db),
+):
+    """k nearest active stations to a point, closest first, from the in-memory tree."""
+    hits = network.current(db).nearby.nearest(lat, lon, min(k, settings.NEARBY_MAX_K), radius_m)
+    out = []
+    for meters, st in hits:
+        walking = meters * settings.WALK_DETOUR_FACTOR
+        out.append(NearbyStation(
+            station_id=st["station_id"],
+            name=st["name"],
+            lat=st["lat"],
+            long=st["long"],
+            distance_m=round(meters),
+            walking_m=round(walking),
+            walking_mins=math.ceil(walking / settings.WALK_SPEED_M_PER_MIN),
+        ))
+    return out
+
+@router.get("/stations/search", response_model=list[StationMatch])
+def search_stations(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    """Autocomplete on station names, accents optional ("ben thanh" finds "Bến Thành")."""
+    return [{**st, "score": score} for score, st in network.current(db).names.search(q, limit)]
+
+def _calculate_fare_logic(db: Session, from_station: str, to_station: str, when: datetime | None = None) -> dict:
+
+    #gia ve va khoang cach da tinh san cho moi cap ga (theo tung khung gio)
+    tables = current_tables(db)
+    pair = tables.pairs.get((from_station, to_station))
 
-    total_fare = base_fare + (distance * price_per_km)
+    if not pair:
+        raise HTTPException(404, "Can not found line between 2 stations")
 
-    total_fare = math.ceil(total_fare /1000) * 1000
+    distance, line_id = pair
+    rules = tables.rules
 
     return {
         "distance": distance,
-        "total_fare": total_fare,
-        "base_fare": base_fare,
-        "line_id": row["line_id"]
+        "total_fare": tables.fare(from_station, to_station, when),
+        "base_fare": rules.base_fare,
+        "line_id": line_id,
+        "rules": rules,
     }
 
+def _network_version(db: Session) -> int:
+    return db.execute(text("SELECT version FROM network_version WHERE id = 1")).scalar() or 0
+
+def _fare_matrix(tables: FareTables, band: str | None = None) -> list[dict]:
+    """Standard fare (base tariff or one time band) and distance for every ordered pair sharing a line."""
+    fares = tables.fares[band]
+    return [
+        {
+            "from_station": a,
+            "to_station": b,
+            "distance_km": distance,
+            "fare": fares[(a, b)],
+        }
+        for (a, b), (distance, _) in sorted(tables.pairs.items())
+    ]
+
 @router.post("/routes/search", response_model=FareResponse)
 def search_route(req: RouteSearchRequest, db: Session = Depends(get_db)):
     #lay ten ga hien thi
-    s_info = db.execute(
-        text("SELECT station_id, name FROM stations WHERE station_id IN (:s1, :s2)"),
-        {"s1": req.from_station, "s2": req.to_station}
-    ).mappings().all()
+    snapshot = network.current(db)
 
-    s_map = {r["station_id"]: r["name"] for r in s_info}
+    when = req.departure_time or datetime.now()
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
 
-    data = _calculate_fare_logic(db, req.from_station, req.to_station)
+    data = _calculate_fare_logic(db, req.from_station, req.to_station, when)
+    itinerary = planner.plan(db, req.from_station, req.to_station, when)
 
-    est_time = int((data["distance"]/ 40 * 60) + 2)
+    if itinerary:
+        est_time = int((itinerary.arrival - when).total_seconds() // 60)
+        lines = " -> ".join(dict.fromkeys(leg.line_name for leg in itinerary.legs))
+        description = f"Moving on {lines}"
+    else:
+        #khong con chuyen tau: uoc tinh theo khoang cach
+        est_time = int((data["distance"]/ 40 * 60) + 2)
+        description = f"Moving on {data['line_id']}"
 
     return FareResponse(
-        from_station_name = s_map.get(req.from_station, req.from_station),
-        to_station_name = s_map.get(req.to_station, req.to_station),
+        from_station_name = snapshot.station_name(req.from_station) or req.from_station,
+        to_station_name = snapshot.station_name(req.to_station) or req.to_station,
         distance_km = round(data["distance"], 1),
         standard_fare = data["total_fare"],
         estimated_time_mins = est_time,
-        route_description = f"Moving on {data['line_id']}"
+        route_description = description,
+        departure_time = itinerary.departure if itinerary else None,
+        arrival_time = itinerary.arrival if itinerary else None,
+        legs = [JourneyLeg(**vars(leg)) for leg in itinerary.legs] if itinerary else [],
     )
 
 @router.post("/internal/calculate-fare", response_model = InternalFareResponse)
 def internal_caculate_fare(req: InternalFareRequest, db: Session = Depends(get_db)):
 
-    data = _calculate_fare_logic(db, req.from_station, req.to_station)
+    at = req.at.astimezone().replace(tzinfo=None) if req.at and req.at.tzinfo else req.at
+    data = _calculate_fare_logic(db, req.from_station, req.to_station, at or datetime.now())
 
-    final_fare = data["total_fare"]
-    if req.passenger_type == 'STUDENT':
-        final_fare = final_fare * 0.5
-    elif req.passenger_type == 'ELDERLY':
-        final_fare = 0
+    final_fare = data["rules"].discount(data["total_fare"], req.passenger_type)
 
     return InternalFareResponse(
         base_fare = data["base_fare"],
@@ -117,72 +151,170 @@ def internal_caculate_fare(req: InternalFareRequest, db: Session = Depends(get_d
         currency= "VND"
     )
 
-@router.get("/stations/{station_id}/next-trains", response_model= StationScheduleResponse)
-def get_next_trains(station_id: str, db: Session = Depends(get_db)):
-    #lay ten ga
+@router.get("/internal/fares/rules")
+def fare_rules(request: Request, db: Session = Depends(get_db)):
+    """
+    The compiled pricing rules (libs.fares.FareRuleSet.to_dict). The ETag follows the
+    network version; send it back in If-None-Match to get a 304 while nothing changed.
+    """
+    rules = current_rules(db)
+    etag = f'"rules-{rules.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Network-Version": str(rules.version)}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(rules.to_dict(), headers=headers)
+
+@router.get("/internal/fares/version", response_model=NetworkVersionResponse)
+def fare_table_version(db: Session = Depends(get_db)):
+    return NetworkVersionResponse(version=_network_version(db))
+
+# the matrix only changes with the network version, so build it once per version;
+# (version, {band: rows}) is never mutated, only replaced whole, so concurrent
+# requests never see one version's rows under another's version
+_matrix_cache: tuple = (None, {})
+
+def _fare_matrix_for(tables: FareTables, band: str | None) -> list[dict]:
+    global _matrix_cache
+    version, by_band = _matrix_cache
+    if version != tables.version:
+        by_band = {}
+    cache_lookup("fare_matrix", band in by_band)
+    if band not in by_band:
+        by_band = {**by_band, band: _fare_matrix(tables, band)}
+        _matrix_cache = (tables.version, by_band)
+    return by_band[band]
 
-    st = db.execute(text("SELECT name FROM stations WHERE station_id = :sid"), {"sid": station_id}).mappings().first()
-    if not st:
+@router.get("/internal/fares/matrix", response_model=FareMatrixResponse)
+def fare_matrix(
+    request: Request,
+    format: str = Query("rows", regex="^(rows|compact)$"),
+    stations: str | None = Query(None, description="Comma-separated station ids; only pairs among them"),
+    band: str | None = Query(None, description="Time band name; default the base (off-peak) tariff"),
+    db: Session = Depends(get_db),
+):
+    """
+    Whole standard fare table in one response (discounts are applied by the caller).
+
+    format=rows    -> {"version", "fares": [{"from_station", "to_station", "distance_km", "fare"}]}
+    format=compact -> {"version", "stations": [...], "fare": [[...]], "distance_km": [[...]],
+                       "band_fare": {band: [[...]]}},
+                      row = from, column = to, null where no line connects the pair;
+                      band_fare (every time band) only when no band is requested
+
+    The ETag changes with the network version; send it back in If-None-Match to get
+    a 304 while nothing changed. Large bodies are gzip-compressed (see main.py).
+    """
+    tables = current_tables(db)
+    version = tables.version
+    if band is not None and band not in tables.fares:
+        raise HTTPException(400, f"unknown time band {band!r}")
+    subset = sorted({s.strip() for s in stations.split(",") if s.strip()}) if stations else None
+    variant = hashlib.sha1(f"{format}|{','.join(subset or [])}|{band or ''}".encode()).hexdigest()[:12]
+    etag = f'"fares-{version}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Network-Version": str(version)}
+
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    rows = _fare_matrix_for(tables, band)
+    if subset is not None:
+        wanted = set(subset)
+        rows = [r for r in rows if r["from_station"] in wanted and r["to_station"] in wanted]
+
+    if format == "rows":
+        body = FareMatrixResponse(version=version, fares=rows).dict()
+    else:
+        ids = subset if subset is not None else sorted({r["from_station"] for r in rows})
+        index = {sid: i for i, sid in enumerate(ids)}
+
+        def grid(fares: dict) -> list:
+            out = [[None] * len(ids) for _ in ids]
+            for r in rows:
+                out[index[r["from_station"]]][index[r["to_station"]]] = int(fares[(r["from_station"], r["to_station"])])
+            return out
+
+        distance = [[None] * len(ids) for _ in ids]
+        for r in rows:
+            distance[index[r["from_station"]]][index[r["to_station"]]] = round(r["distance_km"], 3)
+        body = {"version": version, "stations": ids, "fare": grid(tables.fares[band]), "distance_km": distance}
+        if band is None:
+            body["band_fare"] = {b.name: grid(tables.fares[b.name]) for b in tables.rules.time_bands}
+
+    return JSONResponse(body, headers=headers)
+
+def _station_name(db: Session, station_id: str) -> str:
+    name = network.current(db).station_name(station_id)
+    if name is None:
         raise HTTPException(404, "station not found")
+    return name
 
-    current_now = datetime.now()
-    current_time_str = current_now.strftime("%H:%M:%S")
-    print(f"DEBUG: Station {station_id}, Current Time: {current_now}")
-
-    #query phuc tap: join schedule -> route -> route station de tinh gio den
-    #cong thuc: gio den = gio khoi hanh (trip) + thoi gian di chuyen (route_station)
-    sql = text(
-        """
-        SELECT 
-            ml.name as line_name,
-            r.description as direction_desc,
-            ts.departure_time,
-            ts.train_code,
-            rs.travel_time_from_start
-        FROM trip_schedules ts
-        JOIN routes r ON ts.route_id = r.route_id
-        JOIN route_stations rs ON r.route_id = rs.route_id
-        JOIN metro_lines ml ON r.line_id = ml.line_id
-        WHERE rs.station_id = :sid
-        AND ts.is_active = true
-        ORDER BY ts.departure_time
-        """
-    )
-    rows = db.execute(sql, {"sid": station_id}).mappings().all()
-    print(f"DEBUG: Found {len(rows)} raw schedules for station {station_id}")
+@router.get("/stations/{station_id}/departures", response_model=StationDeparturesResponse)
+def get_departures(
+    station_id: str,
+    on_date: date | None = Query(None, alias="date", description="Calendar date, default today"),
+    from_time: str = Query("00:00", alias="from", description="HH:MM"),
+    to_time: str = Query("23:59", alias="to", description="HH:MM; earlier than `from` means the next morning"),
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """All departures from a station in a wall-clock window, e.g. from=22:00&to=01:00 on a Saturday."""
+    station_name = _station_name(db, station_id)
+    try:
+        from_secs, to_secs = stop_times.parse_clock(from_time), stop_times.parse_clock(to_time)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if to_secs < from_secs:
+        to_secs += stop_times.DAY
+    if to_secs - from_secs > stop_times.DAY:
+        raise HTTPException(400, "window longer than 24 hours")
 
-    next_trains = []
+    on_date = on_date or datetime.now().date()
+    rows = stop_times.departures(db, station_id, on_date, from_secs, to_secs, limit)
+    return StationDeparturesResponse(
+        station_id=station_id,
+        station_name=station_name,
+        date=on_date,
+        from_time=from_time,
+        to_time=to_time,
+        departures=[DepartureInfo(**r) for r in rows],
+    )
 
-    for row in rows:
-        #tinh thoi gian tau den ga
-        dep_time = row["departure_time"]
-        travel_seconds = row["travel_time_from_start"]
+@router.post("/internal/schedule/refresh")
+def refresh_stop_times(db: Session = Depends(get_db)):
+    stop_times.refresh(db)
+    planner.invalidate()
+    return {"status": "refreshed"}
 
-        train_arrival_dt = datetime.combine(current_now.date(), dep_time) + timedelta(seconds=travel_seconds)
+@router.get("/stations/{station_id}/next-trains", response_model= StationScheduleResponse)
+def get_next_trains(
+    station_id: str,
+    minutes: int = Query(60, ge=1, le=24 * 60),
+    limit: int = Query(3, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    station_name = _station_name(db, station_id)
 
-        if train_arrival_dt < current_now:
-            continue
-            
-        diff = train_arrival_dt - current_now
-        minutes_left = int(diff.total_seconds() / 60)
+    current_now = datetime.now().replace(microsecond=0)
+    midnight = datetime.combine(current_now.date(), time.min)
+    from_secs = int((current_now - midnight).total_seconds())
 
-        if minutes_left > 60:
-            continue
+    #gio tau den ga da tinh san trong stop_times (theo ngay van hanh, ke ca chuyen qua nua dem)
+    rows = stop_times.departures(db, station_id, current_now.date(), from_secs, from_secs + minutes * 60, limit)
 
-        next_trains.append(NextTrainInfo(
+    next_trains = [
+        NextTrainInfo(
             line_name = row["line_name"],
-            direction= row["direction_desc"],
-            departure_time = train_arrival_dt.time(),
-            minutes_left=minutes_left,
+            direction= row["direction"],
+            departure_time = row["departure"].time(),
+            minutes_left = int((row["departure"] - current_now).total_seconds() / 60),
             train_code=row["train_code"]
-        ))
+        )
+        for row in rows
+    ]
 
-        if len(next_trains) >= 3:
-            continue
-    
     return StationScheduleResponse(
         station_id = station_id,
-        station_name= st["name"],
-        current_time = current_time_str,
+        station_name= station_name,
+        current_time = current_now.strftime("%H:%M:%S"),
         next_trains = next_trains
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,94 @@
+"""
+Nearest-station lookup: a 2-d tree over station coordinates.
+
+Coordinates are projected onto a local plane (equirectangular around the
+network's mean latitude), which is accurate to well under 1% across a city, so
+the tree can prune with plain Euclidean distances. The final distances are
+great-circle metres; walking distance applies a street-detour factor.
+
+The tree is built with the network snapshot (see snapshot.py), so a query is a
+few dozen node visits and never touches the database.
+"""
+import heapq
+import math
+from typing import List, Optional, Sequence, Tuple
+
+
+EARTH_RADIUS_M = 6_371_000.0
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class StationKDTree:
+    """k-d tree over (lat, lon) points; `items[i]` is returned for point i."""
+
+    def __init__(self, points: Sequence[Tuple[float, float]], items: Sequence) -> None:
+        self.items = list(items)
+        self._lat = [p[0] for p in points]
+        self._lon = [p[1] for p in points]
+        self._cos = math.cos(math.radians(sum(self._lat) / len(self._lat))) if points else 1.0
+        self._xy = [self._project(lat, lon) for lat, lon in points]
+        # node = (point index, axis, left node, right node); -1 = no child
+        self._nodes: List[Tuple[int, int, int, int]] = []
+        self._root = self._build(list(range(len(points))), 0)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _project(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (math.radians(lon) * self._cos * EARTH_RADIUS_M, math.radians(lat) * EARTH_RADIUS_M)
+
+    def _build(self, idx: List[int], depth: int) -> int:
+        if not idx:
+            return -1
+        axis = depth % 2
+        idx.sort(key=lambda i: self._xy[i][axis])
+        mid = len(idx) // 2
+        node = len(self._nodes)
+        self._nodes.append((idx[mid], axis, -1, -1))
+        left = self._build(idx[:mid], depth + 1)
+        right = self._build(idx[mid + 1:], depth + 1)
+        self._nodes[node] = (idx[mid], axis, left, right)
+        return node
+
+    def nearest(self, lat: float, lon: float, k: int, radius_m: Optional[float] = None) -> List[Tuple[float, object]]:
+        """Up to k (metres, item) pairs, closest first, optionally within radius_m."""
+        if self._root < 0 or k <= 0:
+            return []
+        q = self._project(lat, lon)
+        # bound a little above the radius: planar and great-circle distances differ slightly
+        limit2 = (radius_m * 1.01) ** 2 if radius_m is not None else math.inf
+        best: List[Tuple[float, int]] = []   # max-heap of (-dist2, point)
+
+        # (node, lower bound of squared distance to anything in its subtree)
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            worst = -best[0][0] if len(best) == k else limit2
+            if node < 0 or bound > worst:
+                continue
+            point, axis, left, right = self._nodes[node]
+            px, py = self._xy[point]
+            d2 = (px - q[0]) ** 2 + (py - q[1]) ** 2
+            if d2 <= limit2:
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, point))
+                elif d2 < -best[0][0]:
+                    heapq.heapreplace(best, (-d2, point))
+            diff = q[axis] - self._xy[point][axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+
+        out = []
+        for _, point in best:
+            meters = haversine_m(lat, lon, self._lat[point], self._lon[point])
+            if radius_m is None or meters <= radius_m:
+                out.append((meters, self.items[point]))
+        out.sort(key=lambda pair: pair[0])
+        return out
@@ -1,9 +1,27 @@
+import logging
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from libs.metrics import instrument_app
 from scheduler_service.app.api import router
+from scheduler_service.app.snapshot import network
+
+logging.basicConfig(level=logging.INFO)
 
 app = FastAPI(title="Scheduler Service")
+# fare matrix and other bulk responses
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 app.include_router(router)
+instrument_app(app)
+
+@app.on_event("startup")
+def on_startup():
+    # loads the network snapshot and keeps it current via LISTEN/NOTIFY
+    network.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    network.stop()
 
 @app.get("/health")
 def health_check():
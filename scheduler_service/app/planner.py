@@ -0,0 +1,291 @@
+"""
+Earliest-arrival journey planner (Connection Scan) over the loaded timetable.
+
+The stop_times view is read once into flat parallel lists of elementary
+connections (train leaves station A at t1, reaches the next station B at t2),
+one sorted timeline per weekday: that weekday's trips plus the previous service
+day's trips that run past midnight, shifted back 24h. A query binary-searches the
+first connection at or after the departure time and scans forward once, stopping
+as soon as connections leave after the best arrival at the destination, so it
+touches only the connections in the travel window.
+
+Changing trains at a station costs PLANNER_TRANSFER_SEC; staying on a train is free.
+The timetable is reloaded after stop_times is refreshed and at least every
+PLANNER_TIMETABLE_TTL_SEC.
+
+Benchmark on a synthetic network:
+    python -m scheduler_service.app.planner --lines 20
+"""
+import bisect
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from scheduler_service.app.settings import settings
+
+
+DAY = 86400
+_INF = 1 << 40
+
+_LOAD_SQL = text("""
+    SELECT st.trip_id, st.line_id, ml.name AS line_name, r.description AS direction, st.train_code,
+           st.days_of_week, st.station_id, st.stop_sequence, st.departure_secs
+    FROM stop_times st
+    JOIN routes r ON r.route_id = st.route_id
+    JOIN metro_lines ml ON ml.line_id = st.line_id
+    ORDER BY st.trip_id, st.stop_sequence
+""")
+
+# (trip_id, line_id, line_name, direction, train_code, days_of_week, station_id, stop_sequence, secs)
+StopRow = Tuple[str, str, str, Optional[str], Optional[str], str, str, int, int]
+
+
+@dataclass
+class Connections:
+    """One weekday's connections sorted by departure; index i across all lists is one connection."""
+    dep_time: List[int] = field(default_factory=list)
+    arr_time: List[int] = field(default_factory=list)
+    dep_stop: List[int] = field(default_factory=list)
+    arr_stop: List[int] = field(default_factory=list)
+    trip: List[int] = field(default_factory=list)       # trip index; + n_trips for the previous service day's run
+    arr_seq: List[int] = field(default_factory=list)    # stop_sequence at arr_stop
+
+
+@dataclass
+class Leg:
+    trip_id: str
+    line_id: str
+    line_name: str
+    direction: Optional[str]
+    train_code: Optional[str]
+    from_station: str
+    to_station: str
+    departure: datetime
+    arrival: datetime
+    stops: int
+
+
+@dataclass
+class Itinerary:
+    departure: datetime
+    arrival: datetime
+    legs: List[Leg]
+
+    @property
+    def duration_mins(self) -> int:
+        return int((self.arrival - self.departure).total_seconds() // 60)
+
+
+class Timetable:
+    def __init__(self, rows: Iterable[StopRow]) -> None:
+        self.stations: List[str] = []
+        self.station_index: Dict[str, int] = {}
+        self.trips: List[tuple] = []          # (trip_id, line_id, line_name, direction, train_code)
+        self._masks: List[str] = []
+        # raw connections in trip order: (trip, dep_stop, arr_stop, dep, arr, arr_seq)
+        self._raw: List[Tuple[int, int, int, int, int, int]] = []
+        self._days: Dict[int, Connections] = {}
+        self._days_lock = threading.Lock()
+
+        prev = None
+        for trip_id, line_id, line_name, direction, train_code, days, station_id, seq, secs in rows:
+            stop = self.station_index.get(station_id)
+            if stop is None:
+                stop = self.station_index[station_id] = len(self.stations)
+                self.stations.append(station_id)
+            if prev is None or prev[0] != trip_id:
+                self.trips.append((trip_id, line_id, line_name, direction, train_code))
+                self._masks.append(days or "1111111")
+            elif secs >= prev[2]:
+                self._raw.append((len(self.trips) - 1, prev[1], stop, prev[2], secs, seq))
+            prev = (trip_id, stop, secs)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def connections(self, weekday: int) -> Connections:
+        """Sorted timeline for a Monday=0 weekday, built on first use."""
+        conns = self._days.get(weekday)
+        if conns is not None:
+            return conns
+        with self._days_lock:
+            if weekday not in self._days:
+                self._days[weekday] = self._build_day(weekday)
+            return self._days[weekday]
+
+    def _build_day(self, weekday: int) -> Connections:
+        yesterday = (weekday - 1) % 7
+        n_trips = len(self.trips)
+        picked = []
+        for trip, dep_stop, arr_stop, dep, arr, seq in self._raw:
+            mask = self._masks[trip]
+            if mask[weekday] == "1":
+                picked.append((dep, arr, dep_stop, arr_stop, trip, seq))
+            if dep >= DAY and mask[yesterday] == "1":
+                picked.append((dep - DAY, arr - DAY, dep_stop, arr_stop, trip + n_trips, seq))
+        picked.sort()
+        conns = Connections()
+        for dep, arr, dep_stop, arr_stop, trip, seq in picked:
+            conns.dep_time.append(dep)
+            conns.arr_time.append(arr)
+            conns.dep_stop.append(dep_stop)
+            conns.arr_stop.append(arr_stop)
+            conns.trip.append(trip)
+            conns.arr_seq.append(seq)
+        return conns
+
+    def earliest_arrival(self, origin: str, target: str, when: datetime,
+                         transfer_secs: int = 0) -> Optional[Itinerary]:
+        """Earliest arrival at `target` leaving `origin` no earlier than `when` (naive local time)."""
+        src, dst = self.station_index.get(origin), self.station_index.get(target)
+        if src is None or dst is None or src == dst:
+            return None
+        day = when.date()
+        t0 = when.hour * 3600 + when.minute * 60 + when.second
+        c = self.connections(day.weekday())
+        dep_time, arr_time, dep_stop, arr_stop, trips = c.dep_time, c.arr_time, c.dep_stop, c.arr_stop, c.trip
+
+        n = len(self.stations)
+        ready = [_INF] * n         # earliest time a new train can be boarded at the station
+        arrival = [_INF] * n
+        in_conn = [-1] * n
+        boarded: Dict[int, int] = {}   # trip -> connection where it was boarded
+        ready[src] = arrival[src] = t0
+
+        for i in range(bisect.bisect_left(dep_time, t0), len(dep_time)):
+            d = dep_time[i]
+            if d >= arrival[dst]:
+                break
+            trip = trips[i]
+            if trip not in boarded:
+                if ready[dep_stop[i]] > d:
+                    continue
+                boarded[trip] = i
+            s, a = arr_stop[i], arr_time[i]
+            if a < arrival[s]:
+                arrival[s] = a
+                ready[s] = a + transfer_secs
+                in_conn[s] = i
+
+        if in_conn[dst] < 0:
+            return None
+
+        midnight = datetime.combine(day, datetime.min.time())
+        legs: List[Leg] = []
+        s = dst
+        while s != src:
+            last = in_conn[s]
+            first = boarded[trips[last]]
+            trip_id, line_id, line_name, direction, train_code = self.trips[trips[last] % len(self.trips)]
+            legs.append(Leg(
+                trip_id=trip_id, line_id=line_id, line_name=line_name, direction=direction, train_code=train_code,
+                from_station=self.stations[dep_stop[first]],
+                to_station=self.stations[s],
+                departure=midnight + timedelta(seconds=dep_time[first]),
+                arrival=midnight + timedelta(seconds=arr_time[last]),
+                stops=c.arr_seq[last] - c.arr_seq[first] + 1,
+            ))
+            s = dep_stop[first]
+        legs.reverse()
+        return Itinerary(departure=legs[0].departure, arrival=legs[-1].arrival, legs=legs)
+
+
+class Planner:
+    """Process-wide timetable holder; loads lazily and swaps a new Timetable in whole."""
+
+    def __init__(self) -> None:
+        self._timetable: Optional[Timetable] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def timetable(self, db: Session) -> Timetable:
+        stale = time.monotonic() - self._loaded_at > settings.PLANNER_TIMETABLE_TTL_SEC
+        if self._timetable is None or stale:
+            with self._lock:
+                if self._timetable is None or time.monotonic() - self._loaded_at > settings.PLANNER_TIMETABLE_TTL_SEC:
+                    self.reload(db)
+        return self._timetable
+
+    def reload(self, db: Session) -> Timetable:
+        self._timetable = Timetable(tuple(r) for r in db.execute(_LOAD_SQL))
+        self._loaded_at = time.monotonic()
+        return self._timetable
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    def plan(self, db: Session, origin: str, target: str, when: datetime) -> Optional[Itinerary]:
+        return self.timetable(db).earliest_arrival(origin, target, when, settings.PLANNER_TRANSFER_SEC)
+
+
+planner = Planner()
+
+
+# --- benchmark ---------------------------------------------------------------
+
+def _synthetic_rows(lines: int, stations_per_line: int = 20, hop_secs: int = 120) -> List[StopRow]:
+    """Lines whose 15th station is the next line's 5th, so longer trips need transfers."""
+    from scheduler_service.app.timetable import Route, generate
+
+    stations = {}
+    for n in range(lines):
+        stations[n] = [f"X{n:03d}S{i:02d}" for i in range(stations_per_line)]
+    for n in range(lines - 1):
+        stations[n + 1][5] = stations[n][15]
+
+    routes, stops = [], {}
+    for n in range(lines):
+        for direction, ordered in ((0, stations[n]), (1, stations[n][::-1])):
+            route_id = len(routes) + 1
+            routes.append(Route(route_id, f"X{n:03d}", ordered[0], ordered[-1], (len(ordered) - 1) * hop_secs))
+            stops[route_id] = ordered
+
+    rows: List[StopRow] = []
+    for trip in generate(routes):
+        route = routes[trip.route_id - 1]
+        for seq, station_id in enumerate(stops[trip.route_id], start=1):
+            rows.append((trip.trip_id, route.line_id, route.line_id, None, trip.train_code,
+                         trip.days_of_week, station_id, seq, trip.departure_secs + (seq - 1) * hop_secs))
+    rows.sort(key=lambda r: (r[0], r[7]))
+    return rows
+
+
+def _benchmark(lines: int, queries: int) -> None:
+    import random
+
+    rows = _synthetic_rows(lines)
+    started = time.perf_counter()
+    timetable = Timetable(rows)
+    timetable.connections(2)
+    print(f"{len(timetable.trips):,} trips, {len(timetable):,} connections, "
+          f"{len(timetable.stations)} stations loaded in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(0)
+    day = date(2024, 1, 3)  # a Wednesday
+    timings, found = [], 0
+    for _ in range(queries):
+        a, b = rng.sample(timetable.stations, 2)
+        when = datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randint(5 * 3600, 22 * 3600))
+        started = time.perf_counter()
+        result = timetable.earliest_arrival(a, b, when, 120)
+        timings.append((time.perf_counter() - started) * 1000)
+        found += result is not None
+    timings.sort()
+    print(f"{queries} queries ({found} with a journey): "
+          f"p50 {timings[len(timings) // 2]:.2f} ms, p99 {timings[int(len(timings) * 0.99)]:.2f} ms, "
+          f"max {timings[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the journey planner on a synthetic network")
+    parser.add_argument("--lines", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+    _benchmark(args.lines, args.queries)
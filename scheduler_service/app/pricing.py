@@ -0,0 +1,129 @@
+"""
+Compiles the pricing tables into one immutable FareRuleSet (libs/fares) and the
+fare table derived from it.
+
+fare_rules (distance pricing, min balance, overstay), passenger_discounts,
+pass_products, penalty_rules, fare_time_bands, station_zones, zone_fares and
+fare_caps are read together and compiled once per network version; every change
+to them bumps the version (migrations 0002 / 0007 / 0008 / 0009). The standard
+fare of every station pair is precomputed for the base tariff and for each time
+band, so pricing a request is a dict lookup and `current_tables` costs one
+version query until something changes.
+"""
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from libs.fares import DEFAULT_RULES, FareRuleSet, PassProduct, TimeBand
+
+
+Pair = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class FareTables:
+    rules: FareRuleSet
+    pairs: Dict[Pair, Tuple[float, str]]              # (from, to) -> (distance_km, line_id)
+    fares: Dict[Optional[str], Dict[Pair, float]]     # band name (None = base tariff) -> pair fare
+
+    @property
+    def version(self) -> int:
+        return self.rules.version
+
+    def fare(self, from_station: str, to_station: str, when: datetime = None) -> Optional[float]:
+        """Standard (undiscounted) fare for a trip started at `when` (local), None if no line connects them."""
+        band = self.rules.band_at(when) if when else None
+        return self.fares[band.name if band else None].get((from_station, to_station))
+
+
+_lock = threading.Lock()
+_tables: Optional[FareTables] = None
+
+
+def _end_minutes(t) -> int:
+    minutes = t.hour * 60 + t.minute
+    return minutes or 24 * 60   # 00:00 closes the day
+
+
+def compile_rules(db: Session, version: int) -> FareRuleSet:
+    rule = db.execute(text("SELECT * FROM fare_rules ORDER BY id LIMIT 1")).mappings().first()
+    discounts = db.execute(text("SELECT passenger_type, multiplier FROM passenger_discounts")).all()
+    passes = db.execute(text("SELECT ticket_type, price, max_trips FROM pass_products")).all()
+    penalties = {
+        r["code"]: r for r in db.execute(text("SELECT code, amount, grace_minutes FROM penalty_rules")).mappings()
+    }
+    bands = db.execute(text("""
+        SELECT name, start_time, end_time, days_of_week, multiplier
+        FROM fare_time_bands ORDER BY priority, start_time, band_id
+    """)).all()
+    zones = db.execute(text("SELECT station_id, zone FROM station_zones")).all()
+    zone_fares = db.execute(text("SELECT zones_crossed, fare FROM zone_fares")).all()
+    caps = {period: float(amount) for period, amount in db.execute(text("SELECT period, amount FROM fare_caps"))}
+
+    d = DEFAULT_RULES
+    same_station = penalties.get("SAME_STATION")
+    wrong_station = penalties.get("WRONG_STATION")
+    return FareRuleSet(
+        version=version,
+        base_fare=float(rule["base_fare"]) if rule else d.base_fare,
+        price_per_km=float(rule["price_per_km"]) if rule else d.price_per_km,
+        min_balance=float(rule["min_balance"]) if rule and rule["min_balance"] is not None else d.min_balance,
+        zones=MappingProxyType({sid: int(z) for sid, z in zones}),
+        zone_fares=MappingProxyType({int(n): float(f) for n, f in zone_fares}),
+        time_bands=tuple(
+            TimeBand(name, start.hour * 60 + start.minute, _end_minutes(end), float(mult), days or "1111111")
+            for name, start, end, days, mult in bands
+        ),
+        discounts=MappingProxyType({ptype: float(m) for ptype, m in discounts}) if discounts else d.discounts,
+        passes=MappingProxyType({t: PassProduct(float(p), int(n)) for t, p, n in passes}) if passes else d.passes,
+        daily_cap=caps.get("DAY"),
+        weekly_cap=caps.get("WEEK"),
+        same_station_grace_min=int(same_station["grace_minutes"] or 0) if same_station else d.same_station_grace_min,
+        same_station_penalty=float(same_station["amount"]) if same_station else d.same_station_penalty,
+        wrong_station_surcharge=float(wrong_station["amount"]) if wrong_station else d.wrong_station_surcharge,
+        overstay_limit_min=int(rule["max_travel_time"]) if rule and rule["max_travel_time"] else d.overstay_limit_min,
+        overstay_penalty=float(rule["overstay_penalty"]) if rule and rule["overstay_penalty"] is not None else d.overstay_penalty,
+    )
+
+
+def compile_tables(db: Session, version: int) -> FareTables:
+    rules = compile_rules(db, version)
+    # one line per pair: the first by line_id when several lines connect them
+    rows = db.execute(text("""
+        SELECT DISTINCT ON (ls1.station_id, ls2.station_id)
+            ls1.station_id AS from_station,
+            ls2.station_id AS to_station,
+            ls1.line_id,
+            ABS(ls1.distance_km - ls2.distance_km) AS distance
+        FROM line_stations ls1
+        JOIN line_stations ls2 ON ls1.line_id = ls2.line_id
+        ORDER BY ls1.station_id, ls2.station_id, ls1.line_id
+    """)).all()
+    pairs = {(a, b): (float(dist), line_id) for a, b, line_id, dist in rows}
+
+    fares: Dict[Optional[str], Dict[Pair, float]] = {}
+    for band in (None,) + rules.time_bands:
+        fares[band.name if band else None] = {
+            (a, b): rules.fare(dist, a, b, band) for (a, b), (dist, _) in pairs.items()
+        }
+    return FareTables(rules=rules, pairs=pairs, fares=fares)
+
+
+def current_tables(db: Session) -> FareTables:
+    """Rules and precomputed fares for the current network version."""
+    global _tables
+    version = db.execute(text("SELECT version FROM network_version WHERE id = 1")).scalar() or 0
+    if _tables is None or _tables.version != version:
+        with _lock:
+            if _tables is None or _tables.version != version:
+                _tables = compile_tables(db, version)
+    return _tables
+
+
+def current_rules(db: Session) -> FareRuleSet:
+    return current_tables(db).rules
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from datetime import date, time
+from datetime import date, datetime, time
 from typing import List, Optional
 
 class MetroLine(BaseModel):
@@ -25,6 +25,19 @@ class Station(BaseModel):
 class RouteSearchRequest(BaseModel):
     from_station: str = Field(..., description="Mã ga đi ")
     to_station: str = Field(..., description="Mã ga đến ")
+    departure_time: datetime | None = Field(None, description="Leave at or after (local time), default now")
+
+class JourneyLeg(BaseModel):
+    trip_id: str
+    line_id: str
+    line_name: str
+    direction: str | None = None
+    train_code: str | None = None
+    from_station: str
+    to_station: str
+    departure: datetime
+    arrival: datetime
+    stops: int
 
 class FareResponse(BaseModel):
     from_station_name: str
@@ -36,10 +49,16 @@ class FareResponse(BaseModel):
     estimated_time_mins: int
     route_description: str | None = None
 
+    # from the timetable; empty when no train runs after departure_time
+    departure_time: datetime | None = None
+    arrival_time: datetime | None = None
+    legs: List[JourneyLeg] = []
+
 class InternalFareRequest(BaseModel):
     from_station: str
     to_station: str
     passenger_type: str = "STANDARD" 
+    at: datetime | None = None   # trip start (time-band pricing), default now
 
 class InternalFareResponse(BaseModel):
     base_fare: float      
@@ -47,6 +66,19 @@ class InternalFareResponse(BaseModel):
     total_amount: float   
     currency: str = "VND"
 
+class FareMatrixEntry(BaseModel):
+    from_station: str
+    to_station: str
+    distance_km: float
+    fare: float
+
+class FareMatrixResponse(BaseModel):
+    version: int
+    fares: List[FareMatrixEntry]
+
+class NetworkVersionResponse(BaseModel):
+    version: int
+
 
 class NextTrainInfo(BaseModel):
     line_name: str        
@@ -61,6 +93,37 @@ class StationScheduleResponse(BaseModel):
     current_time: str
     next_trains: List[NextTrainInfo]
 
+class DepartureInfo(BaseModel):
+    trip_id: str
+    line_id: str
+    line_name: str
+    direction: str | None = None
+    train_code: str | None = None
+    departure: datetime
+    service_date: date
+
+class StationDeparturesResponse(BaseModel):
+    station_id: str
+    station_name: str
+    date: date
+    from_time: str
+    to_time: str
+    departures: List[DepartureInfo]
+
+
+
+class StationMatch(Station):
+    score: float
+
+class NearbyStation(BaseModel):
+    station_id: str
+    name: str
+    lat: float
+    long: float
+    distance_m: int       # straight line
+    walking_m: int
+    walking_mins: int
+
 
 
 class StationCreate(BaseModel):
@@ -0,0 +1,83 @@
+"""
+Station name autocomplete.
+
+Names are folded to plain ASCII lowercase words (NFD, combining marks dropped,
+đ -> d), so "ben thanh", "Ben Thanh" and "Bến Thành" are the same key. Every
+prefix of every word maps to the stations containing it; a query matches a
+station when each of its words is a prefix of one of the station's words.
+Queries with no prefix match (typos, infixes) fall back to trigram similarity.
+
+Built with the network snapshot (see snapshot.py); a lookup is a few dict reads
+and set intersections.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Sequence, Set, Tuple
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+_MIN_SIMILARITY = 0.3
+
+
+def fold(value: str) -> str:
+    """Diacritic- and case-insensitive form: 'Bến Thành' -> 'ben thanh'."""
+    value = value.replace("đ", "d").replace("Đ", "D")
+    value = unicodedata.normalize("NFD", value)
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return " ".join(_WORD.findall(value.lower()))
+
+
+def _trigrams(folded: str) -> Set[str]:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class StationNameIndex:
+    def __init__(self, stations: Sequence[dict]) -> None:
+        self._stations = list(stations)
+        self._names = [fold(st["name"]) for st in self._stations]
+        self._prefixes: Dict[str, Set[int]] = {}
+        self._grams: Dict[str, Set[int]] = {}
+        self._gram_counts: List[int] = []
+
+        for i, (st, name) in enumerate(zip(self._stations, self._names)):
+            for word in name.split() + [st["station_id"].lower()]:
+                for end in range(1, len(word) + 1):
+                    self._prefixes.setdefault(word[:end], set()).add(i)
+            grams = _trigrams(name)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._grams.setdefault(gram, set()).add(i)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, dict]]:
+        """(score, station) best first; 3 = exact name, 2 = name starts with the query, 1 = word prefixes, <1 = fuzzy."""
+        q = fold(query)
+        if not q:
+            return []
+
+        words = q.split()
+        hits = None
+        for word in sorted(words, key=len, reverse=True):   # longest word = smallest set first
+            ids = self._prefixes.get(word, set())
+            hits = ids if hits is None else hits & ids
+            if not hits:
+                break
+
+        scored: List[Tuple[float, int]] = []
+        if hits:
+            for i in hits:
+                name = self._names[i]
+                scored.append((3.0 if name == q else 2.0 if name.startswith(q) else 1.0, i))
+        else:
+            grams = _trigrams(q)
+            shared: Dict[int, int] = {}
+            for gram in grams:
+                for i in self._grams.get(gram, ()):
+                    shared[i] = shared.get(i, 0) + 1
+            for i, n in shared.items():
+                similarity = n / (len(grams) + self._gram_counts[i] - n)
+                if similarity >= _MIN_SIMILARITY:
+                    scored.append((round(similarity, 3), i))
+
+        scored.sort(key=lambda pair: (-pair[0], len(self._names[pair[1]]), self._names[pair[1]]))
+        return [(score, self._stations[i]) for score, i in scored[:limit]]
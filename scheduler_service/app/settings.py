@@ -12,5 +12,14 @@ class Settings(BaseSettings):
 # Redis cache
     REDIS_URL: str = Field(default="redis://redis:6379/0")
     REDIS_POOL_SIZE: int = Field(default=10)
+
+# Journey planner
+    PLANNER_TRANSFER_SEC: int = 120
+    PLANNER_TIMETABLE_TTL_SEC: int = 300
+
+# Nearby stations: street distance ~ straight line x detour factor
+    NEARBY_MAX_K: int = 20
+    WALK_DETOUR_FACTOR: float = 1.3
+    WALK_SPEED_M_PER_MIN: float = 80.0
     
 settings = Settings()
@@ -0,0 +1,156 @@
+"""
+In-memory snapshot of the network metadata (lines, stations, line orderings)
+and the lookup structures built from it (nearest-station tree, name index).
+
+A snapshot is tagged with network_version and never modified after it is built
+(callers must treat its dicts as read-only); readers take `network.current()` and
+use it without locks or queries, a reload builds a new snapshot and swaps the
+reference. A background thread LISTENs on the `network_changed` channel (notified
+by bump_network_version(), migration 0005) and reloads when a newer version is
+announced; after a (re)connect it reloads unconditionally, so notifications missed
+while disconnected are not lost.
+"""
+import logging
+import select
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from scheduler_service.app.db import SessionLocal, engine
+from scheduler_service.app.geo import StationKDTree
+from scheduler_service.app.search import StationNameIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+CHANNEL = "network_changed"
+_POLL_SEC = 5.0
+_RETRY_SEC = 5.0
+
+
+@dataclass(frozen=True)
+class NetworkSnapshot:
+    version: int
+    lines: Tuple[dict, ...]                      # by line_id
+    stations: Dict[str, dict]                    # every station, active or not
+    active_stations: Tuple[dict, ...]            # by station_id
+    line_stations: Dict[str, Tuple[dict, ...]]   # line_id -> active stations by station_order
+    nearby: StationKDTree                        # active stations with coordinates
+    names: StationNameIndex                      # active stations by folded name
+
+    def station_name(self, station_id: str) -> Optional[str]:
+        station = self.stations.get(station_id)
+        return station["name"] if station else None
+
+    def stations_on_line(self, line_id: str) -> Tuple[dict, ...]:
+        return self.line_stations.get(line_id, ())
+
+
+def load_snapshot(db: Session) -> NetworkSnapshot:
+    # version first: a change committed during the reads announces a newer version and reloads again
+    version = db.execute(text("SELECT version FROM network_version WHERE id = 1")).scalar() or 0
+    lines = db.execute(text("SELECT * FROM metro_lines ORDER BY line_id")).mappings().all()
+    stations = db.execute(text("SELECT * FROM stations ORDER BY station_id")).mappings().all()
+    ordering = db.execute(text("""
+        SELECT line_id, station_id FROM line_stations ORDER BY line_id, station_order
+    """)).all()
+
+    by_id = {s["station_id"]: dict(s) for s in stations}
+    on_line: Dict[str, List[dict]] = {}
+    for line_id, station_id in ordering:
+        station = by_id.get(station_id)
+        if station is not None and station["is_active"]:
+            on_line.setdefault(line_id, []).append(station)
+
+    located = [st for st in by_id.values() if st["is_active"] and st["lat"] is not None and st["long"] is not None]
+
+    return NetworkSnapshot(
+        version=int(version),
+        lines=tuple(dict(l) for l in lines),
+        stations=by_id,
+        active_stations=tuple(s for s in by_id.values() if s["is_active"]),
+        line_stations={k: tuple(v) for k, v in on_line.items()},
+        nearby=StationKDTree([(st["lat"], st["long"]) for st in located], located),
+        names=StationNameIndex([st for st in by_id.values() if st["is_active"]]),
+    )
+
+
+class NetworkMetadata:
+    def __init__(self) -> None:
+        self._snapshot: Optional[NetworkSnapshot] = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._snapshot.version if self._snapshot else None
+
+    def current(self, db: Session = None) -> NetworkSnapshot:
+        """The live snapshot; loads it with `db` (or a new session) if the listener has not yet."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.reload(db)
+        return snapshot
+
+    def reload(self, db: Session = None) -> NetworkSnapshot:
+        with self._reload_lock:
+            if db is not None:
+                self._snapshot = load_snapshot(db)
+            else:
+                with SessionLocal() as session:
+                    self._snapshot = load_snapshot(session)
+            return self._snapshot
+
+    # --- change notifications ---
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="network-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=_POLL_SEC + 1)
+            self._thread = None
+
+    def _listen(self) -> None:
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                self.reload()
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], _POLL_SEC) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if not conn.notifies:
+                        continue
+                    announced = max(int(n.payload or 0) for n in conn.notifies)
+                    conn.notifies.clear()
+                    if self.version is None or announced > self.version:
+                        self.reload()
+            except Exception as e:
+                logger.warning("Network snapshot listener error: %s", e)
+                self._stop.wait(_RETRY_SEC)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+network = NetworkMetadata()
@@ -0,0 +1,82 @@
+"""
+Schedule queries over the precomputed stop_times view (migration 0004).
+
+stop_times.departure_secs counts from midnight of the trip's *service day* and
+runs past 86400 for trains that leave after midnight, so a wall-clock window on
+a calendar date can contain trips of three service days: the previous day's late
+trains, the day itself, and (for windows crossing midnight) the next day's first
+trains. `departures` turns the window into one seconds range per service day,
+each checked against that day's weekday in the Monday-first days_of_week mask,
+and reads all of them with index range scans on (station_id, departure_secs).
+"""
+from datetime import date, datetime, timedelta
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+DAY = 86400
+
+_DEPARTURES_SQL = text("""
+    SELECT d.service_date, st.trip_id, st.route_id, st.line_id, st.departure_secs, st.train_code,
+           ml.name AS line_name, r.description AS direction
+    FROM UNNEST(CAST(:dates AS date[]), CAST(:dows AS int[]),
+                CAST(:lo AS int[]), CAST(:hi AS int[])) AS d(service_date, dow, lo, hi)
+    JOIN stop_times st
+      ON st.station_id = :sid
+     AND st.departure_secs BETWEEN d.lo AND d.hi
+     AND substr(st.days_of_week, d.dow, 1) = '1'
+    JOIN routes r ON r.route_id = st.route_id
+    JOIN metro_lines ml ON ml.line_id = st.line_id
+    WHERE NOT st.is_terminal
+    ORDER BY d.service_date + make_interval(secs => st.departure_secs), st.trip_id
+    LIMIT :limit
+""")
+
+
+def parse_clock(value: str) -> int:
+    """'HH:MM[:SS]' -> seconds; HH may be 24 or more."""
+    parts = [int(p) for p in value.split(":")]
+    if len(parts) not in (2, 3) or any(p < 0 for p in parts) or parts[1] > 59 or (len(parts) == 3 and parts[2] > 59):
+        raise ValueError(f"invalid time {value!r}")
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) == 3 else 0)
+
+
+def service_windows(day: date, from_secs: int, to_secs: int):
+    """(service_date, weekday 1-7, lo, hi) for every service day that can run in [from, to] on `day`."""
+    windows = []
+    for offset in (-1, 0, 1):
+        service_date = day + timedelta(days=offset)
+        lo, hi = from_secs - offset * DAY, to_secs - offset * DAY
+        if hi < 0:
+            continue
+        windows.append((service_date, service_date.weekday() + 1, max(lo, 0), hi))
+    return windows
+
+
+def departures(db: Session, station_id: str, day: date, from_secs: int, to_secs: int, limit: int) -> List[dict]:
+    """
+    Trains leaving `station_id` between from_secs and to_secs after midnight of `day`
+    (to_secs may exceed 86400 for windows past midnight), in time order.
+    """
+    windows = service_windows(day, from_secs, to_secs)
+    rows = db.execute(_DEPARTURES_SQL, {
+        "sid": station_id,
+        "dates": [w[0] for w in windows],
+        "dows": [w[1] for w in windows],
+        "lo": [w[2] for w in windows],
+        "hi": [w[3] for w in windows],
+        "limit": limit,
+    }).mappings().all()
+    out = []
+    for r in rows:
+        at = datetime.combine(r["service_date"], datetime.min.time()) + timedelta(seconds=r["departure_secs"])
+        out.append({**r, "departure": at})
+    return out
+
+
+def refresh(db: Session) -> None:
+    """Rebuild stop_times after trip_schedules / route_stations change; readers are not blocked."""
+    db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY stop_times"))
+    db.commit()
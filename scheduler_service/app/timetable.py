@@ -0,0 +1,266 @@
+"""
+Timetable generator and bulk loader for trip_schedules.
+
+Builds full-day schedules for every route from headway profiles (bands of
+"from, until, minutes between trains" per service calendar), the route running
+times in route_stations and a turnaround time at the terminals, assigns physical
+trains by chaining arrivals at a terminal to the next departure from it, and
+loads the result with a single COPY.
+
+Times are seconds since the start of the service day and may run past 24:00 for
+late trains; departure_time stores them modulo 24h, departure_secs keeps the
+service-day value. days_of_week is a 7-char mask, Monday first ('1111100' = Mon-Fri).
+
+    python -m scheduler_service.app.timetable --replace
+    python -m scheduler_service.app.timetable --profile profile.json --csv trips.csv
+    python -m scheduler_service.app.timetable --synthetic-lines 300 --replace   # perf data
+
+Profile JSON (defaults below when omitted):
+    {"turnaround_min": 5,
+     "calendars": {"WKD": {"days": "1111100", "bands": [["05:00", "06:30", 10], ...]}}}
+
+Supersedes generate_seed.py.
+"""
+import csv
+import heapq
+import io
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+
+WEEKDAY_BANDS = [
+    ("05:00", "06:30", 10),
+    ("06:30", "09:00", 4),    # morning peak
+    ("09:00", "16:30", 8),
+    ("16:30", "19:30", 4),    # evening peak
+    ("19:30", "22:00", 10),
+    ("22:00", "24:30", 15),   # last trains run past midnight
+]
+WEEKEND_BANDS = [
+    ("06:00", "10:00", 10),
+    ("10:00", "20:00", 8),
+    ("20:00", "24:00", 12),
+]
+DEFAULT_PROFILE = {
+    "turnaround_min": 5,
+    "calendars": {
+        "WKD": {"days": "1111100", "bands": WEEKDAY_BANDS},
+        "SAT": {"days": "0000010", "bands": WEEKEND_BANDS},
+        "SUN": {"days": "0000001", "bands": WEEKEND_BANDS},
+    },
+}
+
+COPY_COLUMNS = ("trip_id", "route_id", "departure_time", "departure_secs", "days_of_week", "train_code", "is_active")
+
+
+@dataclass
+class Route:
+    route_id: int
+    line_id: str
+    origin: str           # first station
+    terminus: str         # last station
+    running_secs: int     # origin departure -> terminus arrival
+
+
+@dataclass
+class Trip:
+    trip_id: str
+    route_id: int
+    departure_secs: int
+    days_of_week: str
+    train_code: str
+
+    def csv_row(self) -> Tuple:
+        secs = self.departure_secs % 86400
+        departure_time = f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+        return (self.trip_id, self.route_id, departure_time, self.departure_secs,
+                self.days_of_week, self.train_code, "true")
+
+
+def parse_clock(value: str) -> int:
+    """'HH:MM' (HH may be >= 24) -> seconds since service-day start."""
+    hours, minutes = value.split(":")[:2]
+    return int(hours) * 3600 + int(minutes) * 60
+
+
+def departures(bands: Sequence[Sequence]) -> List[int]:
+    """Departure times for consecutive headway bands; a band starts where the previous train left off."""
+    out: List[int] = []
+    t: Optional[int] = None
+    for start, until, headway_min in bands:
+        start_s, until_s, step = parse_clock(start), parse_clock(until), int(headway_min) * 60
+        t = start_s if t is None or t < start_s else t
+        while t < until_s:
+            out.append(t)
+            t += step
+    return out
+
+
+def generate(routes: Sequence[Route], profile: Dict = None) -> Iterator[Trip]:
+    """Trips for every route and calendar of `profile`, with trains chained across terminals."""
+    profile = profile or DEFAULT_PROFILE
+    turnaround = int(profile.get("turnaround_min", 5)) * 60
+
+    by_line: Dict[str, List[Route]] = {}
+    for route in routes:
+        by_line.setdefault(route.line_id, []).append(route)
+
+    for calendar, spec in profile["calendars"].items():
+        times = departures(spec["bands"])
+        for line_id, line_routes in by_line.items():
+            # (departure, route) for the whole line, in time order
+            schedule = sorted((t, r.route_id) for r in line_routes for t in times)
+            route_by_id = {r.route_id: r for r in line_routes}
+            # station -> heap of (available_from, train_no) for trains waiting there
+            waiting: Dict[str, List[Tuple[int, int]]] = {}
+            fleet = 0
+            for dep, route_id in schedule:
+                route = route_by_id[route_id]
+                pool = waiting.setdefault(route.origin, [])
+                if pool and pool[0][0] <= dep:
+                    _, train_no = heapq.heappop(pool)
+                else:
+                    fleet += 1
+                    train_no = fleet
+                heapq.heappush(waiting.setdefault(route.terminus, []),
+                               (dep + route.running_secs + turnaround, train_no))
+                yield Trip(
+                    trip_id=f"R{route_id}-{calendar}-{dep:05d}",
+                    route_id=route_id,
+                    departure_secs=dep,
+                    days_of_week=spec["days"],
+                    train_code=f"{line_id}-{calendar}-{train_no:03d}",
+                )
+
+
+# --- database ---------------------------------------------------------------
+
+def load_routes(db) -> List[Route]:
+    rows = db.execute(text("""
+        SELECT r.route_id, r.line_id,
+               (array_agg(rs.station_id ORDER BY rs.stop_sequenece))[1] AS origin,
+               (array_agg(rs.station_id ORDER BY rs.stop_sequenece DESC))[1] AS terminus,
+               max(rs.travel_time_from_start) AS running_secs
+        FROM routes r
+        JOIN route_stations rs ON rs.route_id = r.route_id
+        GROUP BY r.route_id, r.line_id
+        ORDER BY r.route_id
+    """)).mappings().all()
+    return [Route(r["route_id"], r["line_id"], r["origin"], r["terminus"], int(r["running_secs"] or 0)) for r in rows]
+
+
+def create_synthetic_network(db, lines: int, stations_per_line: int = 20, hop_secs: int = 120) -> None:
+    """Lines X001.. with stations X001S01.. and two routes each, for performance testing."""
+    for n in range(1, lines + 1):
+        line_id = f"X{n:03d}"
+        db.execute(text("INSERT INTO metro_lines (line_id, name, code) VALUES (:l, :name, :l) ON CONFLICT DO NOTHING"),
+                   {"l": line_id, "name": f"Synthetic {line_id}"})
+        stations = [f"{line_id}S{i:02d}" for i in range(1, stations_per_line + 1)]
+        db.execute(text("INSERT INTO stations (station_id, name) VALUES (:s, :s) ON CONFLICT DO NOTHING"),
+                   [{"s": s} for s in stations])
+        db.execute(text("""
+            INSERT INTO line_stations (line_id, station_id, distance_km, station_order)
+            VALUES (:l, :s, :d, :o) ON CONFLICT DO NOTHING
+        """), [{"l": line_id, "s": s, "d": i * 1.5, "o": i + 1} for i, s in enumerate(stations)])
+
+        exists = db.execute(text("SELECT count(*) FROM routes WHERE line_id = :l"), {"l": line_id}).scalar()
+        if exists:
+            continue
+        for direction, ordered in ((0, stations), (1, stations[::-1])):
+            route_id = db.execute(text("""
+                INSERT INTO routes (line_id, direction, description) VALUES (:l, :d, :desc) RETURNING route_id
+            """), {"l": line_id, "d": direction, "desc": f"{ordered[0]} -> {ordered[-1]}"}).scalar()
+            db.execute(text("""
+                INSERT INTO route_stations (route_id, station_id, stop_sequenece, travel_time_from_start)
+                VALUES (:r, :s, :seq, :t)
+            """), [{"r": route_id, "s": s, "seq": i + 1, "t": i * hop_secs} for i, s in enumerate(ordered)])
+    db.commit()
+
+
+def write_csv(trips: Iterator[Trip], out) -> int:
+    writer = csv.writer(out)
+    count = 0
+    for trip in trips:
+        writer.writerow(trip.csv_row())
+        count += 1
+    return count
+
+
+def copy_trips(engine, trips: Sequence[Trip], replace_routes: Optional[Sequence[int]] = None) -> int:
+    """
+    COPY `trips` into trip_schedules in one transaction, optionally replacing those
+    routes' trips, and refresh stop_times in the same transaction.
+    """
+    buf = io.StringIO()
+    count = write_csv(iter(trips), buf)
+    buf.seek(0)
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        if replace_routes:
+            cur.execute("DELETE FROM trip_schedules WHERE route_id = ANY(%s)", (list(replace_routes),))
+        cur.copy_expert(
+            f"COPY trip_schedules ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf
+        )
+        cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY stop_times")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from scheduler_service.app.db import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Generate and bulk-load trip_schedules")
+    parser.add_argument("--profile", help="headway profile JSON (default: built-in weekday/weekend profile)")
+    parser.add_argument("--routes", help="comma-separated route ids (default: all routes)")
+    parser.add_argument("--replace", action="store_true", help="delete existing trips of the generated routes first")
+    parser.add_argument("--csv", help="write CSV here (- for stdout) instead of loading")
+    parser.add_argument("--synthetic-lines", type=int, default=0, help="create N synthetic 20-station lines first")
+    args = parser.parse_args()
+
+    profile = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile) as f:
+            profile = {**DEFAULT_PROFILE, **json.load(f)}
+
+    session = SessionLocal()
+    try:
+        if args.synthetic_lines:
+            create_synthetic_network(session, args.synthetic_lines)
+        routes = load_routes(session)
+    finally:
+        session.close()
+    if args.routes:
+        wanted = {int(r) for r in args.routes.split(",")}
+        routes = [r for r in routes if r.route_id in wanted]
+
+    started = time.perf_counter()
+    trips = list(generate(routes, profile))
+    generated = time.perf_counter() - started
+
+    if args.csv:
+        out = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+        try:
+            write_csv(iter(trips), out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"generated {len(trips):,} trips for {len(routes)} routes in {generated:.2f}s", file=sys.stderr)
+    else:
+        started = time.perf_counter()
+        loaded = copy_trips(engine, trips, [r.route_id for r in routes] if args.replace else None)
+        print(f"generated {len(trips):,} trips for {len(routes)} routes in {generated:.2f}s, "
+              f"loaded {loaded:,} in {time.perf_counter() - started:.2f}s")
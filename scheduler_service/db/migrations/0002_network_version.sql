@@ -0,0 +1,31 @@
+-- Network version: bumped by any change to the data fares and routes are derived
+-- from, so consumers holding a copy of the fare table know when to re-fetch it.
+CREATE TABLE IF NOT EXISTS network_version (
+    id          SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version     BIGINT NOT NULL DEFAULT 1,
+    updated_at  TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+INSERT INTO network_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_network_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE network_version SET version = version + 1, updated_at = NOW() WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_metro_lines_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON metro_lines
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
+
+CREATE TRIGGER trg_stations_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON stations
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
+
+CREATE TRIGGER trg_line_stations_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON line_stations
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
+
+CREATE TRIGGER trg_fare_rules_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON fare_rules
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
@@ -0,0 +1,10 @@
+-- Service-day departure time in seconds; unlike departure_time (TIME) it can run
+-- past 24:00 for late trains, which belong to the service day they started on.
+-- days_of_week is a Monday-first mask ('1111100' = Mon-Fri).
+ALTER TABLE trip_schedules ADD COLUMN IF NOT EXISTS departure_secs INT;
+
+UPDATE trip_schedules
+SET departure_secs = CAST(EXTRACT(EPOCH FROM departure_time) AS INT)
+WHERE departure_secs IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_trip_route ON trip_schedules (route_id);
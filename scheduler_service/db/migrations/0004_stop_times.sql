@@ -0,0 +1,23 @@
+-- Precomputed stop times: one row per (trip, station) with the service-day time the
+-- train is at that station (trip departure_secs + route running time, may exceed
+-- 86400 for trips past midnight). Refreshed after timetable loads, see stop_times.py.
+CREATE MATERIALIZED VIEW IF NOT EXISTS stop_times AS
+SELECT
+    ts.trip_id,
+    ts.route_id,
+    r.line_id,
+    rs.station_id,
+    rs.stop_sequenece AS stop_sequence,
+    COALESCE(ts.departure_secs, CAST(EXTRACT(EPOCH FROM ts.departure_time) AS INT))
+        + COALESCE(rs.travel_time_from_start, 0) AS departure_secs,
+    COALESCE(ts.days_of_week, '1111111') AS days_of_week,
+    ts.train_code,
+    rs.stop_sequenece = MAX(rs.stop_sequenece) OVER (PARTITION BY ts.trip_id) AS is_terminal
+FROM trip_schedules ts
+JOIN routes r ON r.route_id = ts.route_id
+JOIN route_stations rs ON rs.route_id = ts.route_id
+WHERE ts.is_active = true;
+
+-- unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stop_times_trip_station ON stop_times (trip_id, station_id);
+CREATE INDEX IF NOT EXISTS idx_stop_times_station_secs ON stop_times (station_id, departure_secs);
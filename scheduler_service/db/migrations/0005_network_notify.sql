@@ -0,0 +1,13 @@
+-- Announce every network version bump on the network_changed channel so
+-- in-memory copies (scheduler's metadata snapshot) reload without polling.
+-- The notification is delivered when the bumping transaction commits.
+CREATE OR REPLACE FUNCTION bump_network_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE network_version SET version = version + 1, updated_at = NOW() WHERE id = 1
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('network_changed', new_version::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
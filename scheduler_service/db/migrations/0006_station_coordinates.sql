@@ -0,0 +1,10 @@
+-- Coordinates for the seeded stations (WGS84), used by /stations/nearby.
+UPDATE stations AS s
+SET lat = c.lat, long = c.long
+FROM (VALUES
+    ('S01', 10.7715, 106.6983),
+    ('S02', 10.7766, 106.7031),
+    ('S03', 10.7862, 106.7070),
+    ('S13', 10.8793, 106.8066)
+) AS c(station_id, lat, long)
+WHERE s.station_id = c.station_id AND s.lat IS NULL;
@@ -0,0 +1,50 @@
+-- Pricing inputs that used to be hardcoded in journey_service. Together with
+-- fare_rules they are compiled into one rule set (scheduler_service/app/pricing.py)
+-- served at /internal/fares/rules; every change bumps the network version.
+CREATE TABLE IF NOT EXISTS passenger_discounts (
+    passenger_type  VARCHAR(20) PRIMARY KEY,
+    multiplier      NUMERIC NOT NULL CHECK (multiplier >= 0)   -- 0.5 = half price
+);
+INSERT INTO passenger_discounts (passenger_type, multiplier) VALUES
+('STANDARD', 1),
+('STUDENT', 0.5),
+('ELDERLY', 0)
+ON CONFLICT (passenger_type) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS pass_products (
+    ticket_type     VARCHAR(20) PRIMARY KEY,
+    price           NUMERIC NOT NULL,
+    max_trips       INT NOT NULL
+);
+INSERT INTO pass_products (ticket_type, price, max_trips) VALUES
+('DAY', 40000, 100),
+('MONTH', 200000, 1000)
+ON CONFLICT (ticket_type) DO NOTHING;
+
+-- SAME_STATION: exit where you entered after grace_minutes
+-- WRONG_STATION: surcharge on top of the fare difference
+CREATE TABLE IF NOT EXISTS penalty_rules (
+    code            VARCHAR(30) PRIMARY KEY,
+    amount          NUMERIC NOT NULL,
+    grace_minutes   INT
+);
+INSERT INTO penalty_rules (code, amount, grace_minutes) VALUES
+('SAME_STATION', 5000, 15),
+('WRONG_STATION', 10000, NULL)
+ON CONFLICT (code) DO NOTHING;
+
+-- fare_rules.max_travel_time / overstay_penalty now drive the overstay penalty;
+-- keep the 240 minutes journey_service has been enforcing
+UPDATE fare_rules SET max_travel_time = 240 WHERE max_travel_time = 120;
+
+CREATE TRIGGER trg_passenger_discounts_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON passenger_discounts
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
+
+CREATE TRIGGER trg_pass_products_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pass_products
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
+
+CREATE TRIGGER trg_penalty_rules_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON penalty_rules
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
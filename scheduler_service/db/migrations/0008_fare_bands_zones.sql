@@ -0,0 +1,37 @@
+-- Time-of-day multipliers and zone fares for the compiled rule set (pricing.py).
+-- Both start empty, which keeps today's flat distance pricing; e.g.
+--   INSERT INTO fare_time_bands (name, start_time, end_time, days_of_week, multiplier)
+--   VALUES ('AM_PEAK', '06:30', '09:00', '1111100', 1.2);
+CREATE TABLE IF NOT EXISTS fare_time_bands (
+    band_id         SERIAL PRIMARY KEY,
+    name            VARCHAR(30) NOT NULL UNIQUE,
+    start_time      TIME NOT NULL,
+    end_time        TIME NOT NULL,             -- exclusive; 00:00 = end of day
+    days_of_week    VARCHAR(7) NOT NULL DEFAULT '1111111',   -- Monday first
+    multiplier      NUMERIC NOT NULL CHECK (multiplier >= 0),
+    priority        INT NOT NULL DEFAULT 0     -- lower wins when bands overlap
+);
+
+-- When both stations of a trip have a zone, the fare is zone_fares[|zone difference|]
+-- (the largest zones_crossed row covers anything further) instead of distance pricing.
+CREATE TABLE IF NOT EXISTS station_zones (
+    station_id      VARCHAR(10) PRIMARY KEY REFERENCES stations(station_id),
+    zone            INT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS zone_fares (
+    zones_crossed   INT PRIMARY KEY CHECK (zones_crossed >= 0),
+    fare            NUMERIC NOT NULL
+);
+
+CREATE TRIGGER trg_fare_time_bands_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON fare_time_bands
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
+
+CREATE TRIGGER trg_station_zones_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON station_zones
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
+
+CREATE TRIGGER trg_zone_fares_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON zone_fares
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();
@@ -0,0 +1,18 @@
+-- Daily / weekly fare caps for pay-per-trip tickets (SINGLE / RETURN), compiled
+-- into the rule set (pricing.py). journey_service refunds whatever a rider's
+-- trips in the local day or Monday-first week cost above the cap, after the
+-- rider's passenger discount is applied to it. No row = no cap for that period.
+CREATE TABLE IF NOT EXISTS fare_caps (
+    period          VARCHAR(10) PRIMARY KEY CHECK (period IN ('DAY', 'WEEK')),
+    amount          NUMERIC NOT NULL CHECK (amount >= 0)
+);
+
+-- a day of single trips never costs more than a DAY pass
+INSERT INTO fare_caps (period, amount) VALUES
+    ('DAY', 40000),
+    ('WEEK', 160000)
+ON CONFLICT (period) DO NOTHING;
+
+CREATE TRIGGER trg_fare_caps_network_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON fare_caps
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_network_version();